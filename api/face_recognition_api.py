@@ -1,4 +1,6 @@
+import asyncio
 import base64
+import json
 import logging
 import os
 from logging.handlers import RotatingFileHandler
@@ -7,18 +9,34 @@ from contextlib import asynccontextmanager
 
 import cv2
 import numpy as np
-from fastapi import FastAPI, File, UploadFile, Form, Request, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse, FileResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from pydantic import BaseModel, Field
 
 # 导入核心算法模块
-from core.face_core import encode_embedding, decode_embedding, cosine_similarity
-from config import config
-from face_process.init_InsightFace import init_face_model, detect_faces_async
+from core.face_core import (
+    encode_embedding, parse_embeddings, versions_compatible, resolve_versions, cosine_similarity
+)
+from core.cpu_pool import run_cpu, loop_monitor
+from core.profiler import tracer, span, sample_stacks
+from core.gallery import gallery
+from core.gallery_store import store
+from core.crop_store import crop_store
+from core.tenant_scheduler import scheduler, resolve_tenant, TenantRejected
+from core.sharding import coordinator, owns, local_shard, check_shards
+from config import config, MODEL_KEYS
+from face_process.init_InsightFace import (
+    init_face_model, reload_face_model, detect_faces_async,
+    registry, load_model, activate_model, buffer_pool, align_face, extract_aligned_async,
+    drain_executors, detect_only_async
+)
+from face_process.reembed import reembed_job
+from face_process.extract_jobs import job_manager, ACTIVE_STATES
+from face_process.motion_gate import motion_gate
 
 """
 ______________________________
@@ -32,13 +50,59 @@ class ExtractRequest(BaseModel):
     """人脸特征提取请求模型"""
     image_type: str = Field(default="base64", description="图片类型：base64 或 file")
     image: str = Field(..., description="base64编码的图片数据")
+    aligned: bool = Field(default=False, description="图片为已对齐的112×112人脸时跳过检测，只提取特征")
+    source_id: Optional[str] = Field(default=None, description="视频源标识（固定机位），开启 motion_gate 时无运动的帧跳过检测")
+    embedding_format: Optional[str] = Field(default=None, description="特征编码格式：raw、float32、float16、int8，默认 embedding.format")
+
+class DetectRequest(BaseModel):
+    """人脸检测请求模型（仅检测，不提取特征）"""
+    image_type: str = Field(default="base64", description="图片类型：base64 或 file")
+    image: str = Field(..., description="base64编码的图片数据")
+    det_size: Optional[int] = Field(default=None, description="检测输入边长（32的倍数），默认 face_detect.det_size")
+    source_id: Optional[str] = Field(default=None, description="视频源标识（固定机位），开启 motion_gate 时无运动的帧跳过检测")
 
 class SimilarityRequest(BaseModel):
     """相似度计算请求模型"""
     current_embedding: str = Field(..., description="当前人脸特征向量")
     known_embeddings: List[str] = Field(..., description="已知人脸特征向量列表")
+    model_version: Optional[str] = Field(None, description="已知特征的模型版本（提取时返回的model_version），用于校验未带版本的特征")
+
+class EnrollRequest(BaseModel):
+    """人脸库注册请求模型"""
+    identity_id: str = Field(..., description="身份ID")
+    embeddings: List[str] = Field(..., description="该身份的特征向量列表（可多张照片）")
+
+class EnrollImageRequest(BaseModel):
+    """人脸库照片注册请求模型（服务端提取特征并保存对齐人脸）"""
+    identity_id: str = Field(..., description="身份ID")
+    image: str = Field(..., description="base64编码的注册照片（需恰好包含一张人脸）")
+
+class SearchRequest(BaseModel):
+    """人脸库检索请求模型"""
+    embedding: str = Field(..., description="待检索的特征向量")
+    top_k: int = Field(default=5, ge=1, le=100, description="返回的身份数")
+    shortlist: Optional[int] = Field(default=None, ge=1, description="模板粗排保留的候选身份数")
+
+class ClusterSearchRequest(SearchRequest):
+    """分片集群检索请求模型"""
+    deadline_ms: Optional[float] = Field(default=None, gt=0, description="等待分片响应的截止时间（毫秒）")
+
+class ReembedRequest(BaseModel):
+    """特征迁移请求模型"""
+    target: Optional[str] = Field(default=None, description="目标模型版本，默认当前主模型")
+
+class ExtractJobRequest(BaseModel):
+    """批量提取任务请求模型（images、path、manifest 三选一）"""
+    images: Optional[List[str]] = Field(default=None, description="base64编码的图片列表")
+    path: Optional[str] = Field(default=None, description="服务器本地图片目录（递归，需在 jobs.allowed_roots 内）")
+    manifest: Optional[str] = Field(default=None, description="服务器本地清单文件，每行一个图片路径")
+    output: str = Field(default="jsonl", description="结果格式：jsonl（特征字符串）或 binary（float32 特征矩阵）")
+
+class ModelRequest(BaseModel):
+    """模型管理请求模型"""
+    name: Optional[str] = Field(default=None, description="模型包名称，如 buffalo_l、buffalo_s、antelopev2（加载/切换时必填，影子评分为空时关闭）")
+    sample_rate: float = Field(default=0.1, description="影子评分采样比例（0~1）")
 
-# -------------------------- 日志配置 --------------------------
 # -------------------------- 日志配置 --------------------------
 log_level = config.get("log.level", "INFO")
 log_file_rel = config.get("log.file", "log/face_recognition.log")
@@ -70,17 +134,170 @@ file_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 logger.addHandler(file_handler)
 
+# -------------------------- 配置热加载 --------------------------
+THRESHOLD = config.get("face_model.threshold", 0.5)
+
+
+def _on_config_changed(changed, old_config, new_config):
+    """应用可在运行时生效的配置项（阈值、日志级别；限流在每次请求时读取）"""
+    global THRESHOLD
+    if "face_model.threshold" in changed:
+        THRESHOLD = config.get("face_model.threshold", 0.5)
+    if "log.level" in changed:
+        logger.setLevel(logging.getLevelName(config.get("log.level", "INFO").upper()))
+    if "profiling.sample_rate" in changed:
+        tracer.sample_rate = config.get("profiling.sample_rate", 0.0)
+
+
+config.subscribe(_on_config_changed)
+
+
+# 后台模型重建任务（保留引用，避免任务被垃圾回收且异常无人处理）
+model_reload_task: Optional[asyncio.Task] = None
+
+
+def _on_model_reloaded(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("模型重建失败，继续使用旧模型", exc_info=task.exception())
+
+
+async def apply_config_reload():
+    """重新加载配置；如涉及模型参数则在后台构建新模型后切换"""
+    global model_reload_task
+    changed = await run_cpu(config.reload)
+    model_reload = any(k in changed for k in MODEL_KEYS)
+    if model_reload:
+        logger.info("🔄 模型相关配置已变更，后台重建模型...")
+        model_reload_task = asyncio.get_running_loop().create_task(reload_face_model())
+        model_reload_task.add_done_callback(_on_model_reloaded)
+    return changed, model_reload
+
+
+async def watch_config():
+    """定期检查配置文件修改时间，变更时自动热加载"""
+    while True:
+        await asyncio.sleep(config.get("config_watch.interval", 5) or 5)
+        if not config.get("config_watch.enabled", True) or not config.is_modified():
+            continue
+        try:
+            await apply_config_reload()
+        except Exception:
+            logger.error("配置热加载失败，继续使用旧配置", exc_info=True)
+
+
+# -------------------------- 人脸库持久化 --------------------------
+async def snapshot_gallery():
+    """定期将人脸库写为快照并清理已覆盖的WAL段"""
+    while True:
+        await asyncio.sleep(config.get("gallery.persist.snapshot_interval", 300))
+        if store.pending_records() < config.get("gallery.persist.snapshot_min_records", 1000):
+            continue
+        try:
+            # 使用默认线程池，快照写盘不占用CPU线程池
+            await asyncio.get_running_loop().run_in_executor(None, store.snapshot)
+        except Exception:
+            logger.error("人脸库快照失败", exc_info=True)
+
+
+async def enroll_embedding(identity_id: str, embedding, version: Optional[str] = None) -> int:
+    """注册特征；启用持久化时等待WAL组提交落盘后返回"""
+    if store is None:
+        return await run_cpu(gallery.enroll, identity_id, embedding, version)
+    count, future = await run_cpu(store.enroll, identity_id, embedding, version)
+    await asyncio.wrap_future(future)
+    return count
+
+
+async def enroll_embeddings(identity_id: str, embeddings) -> int:
+    """批量注册 (模型版本, 特征) 序列：全部校验通过才写入（任一不合法时返回400且人脸库不变），
+    全部记录作为一个WAL队列项写入，一次fsync后返回
+    """
+    if store is None:
+        return await run_cpu(gallery.enroll_many, identity_id, embeddings)
+    count, future = await run_cpu(store.enroll_many, identity_id, embeddings)
+    await asyncio.wrap_future(future)
+    return count
+
+
+async def remove_identity(identity_id: str) -> bool:
+    """删除身份；启用持久化时等待WAL落盘后返回"""
+    if crop_store is not None:
+        await run_cpu(crop_store.remove, identity_id)
+    if store is None:
+        return await run_cpu(gallery.remove, identity_id)
+    future = await run_cpu(store.remove, identity_id)
+    if future is None:
+        return False
+    await asyncio.wrap_future(future)
+    return True
+
+
+def notify_supervisor_ready():
+    """由进程管理器启动时，初始化完成后通过管道通知其可以切换流量"""
+    ready_fd = os.environ.pop("FACE_SUPERVISOR_READY_FD", None)
+    if ready_fd is not None:
+        try:
+            os.write(int(ready_fd), b"1")
+            os.close(int(ready_fd))
+        except OSError:
+            logger.warning("通知进程管理器失败", exc_info=True)
+
+
 # -------------------------- 应用生命周期管理 --------------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用启动和关闭时的生命周期管理"""
+    # 分片拓扑不一致时在加载模型前失败，避免按不同分片数路由和存储
+    check_shards()
     # 启动时初始化模型
     logger.info("🚀 正在初始化人脸识别模型...")
     await init_face_model()
     logger.info("✅ 模型初始化完成")
+    loop_monitor.start()
+    config_task = asyncio.get_running_loop().create_task(watch_config())
+    grpc_server = None
+    if config.get("grpc.enabled", False):
+        # 按需导入，未启用gRPC时无需安装grpcio
+        from api.face_recognition_grpc import start_grpc_server
+        grpc_server = await start_grpc_server()
+    shm_server = None
+    if config.get("shm.enabled", False):
+        from api.face_recognition_shm import start_shm_server
+        shm_server = await start_shm_server()
+    snapshot_task = None
+    if store is not None:
+        await run_cpu(store.recover)
+        store.start()
+        snapshot_task = asyncio.get_running_loop().create_task(snapshot_gallery())
+    if config.get("jobs.enabled", True):
+        await job_manager.start()
+    notify_supervisor_ready()
     yield
     # 关闭时清理资源
     logger.info("🔄 应用关闭，清理资源...")
+    if grpc_server is not None:
+        await grpc_server.stop(grace=config.get("grpc.shutdown_grace", 5))
+    if shm_server is not None:
+        # 只停止接受新连接；已连接客户端的在途帧随推理线程池一起结束
+        shm_server.close()
+    if reembed_job.running:
+        await reembed_job.stop()
+    # 运行中的批量任务保持 running 状态，重启后从断点继续
+    if config.get("jobs.enabled", True):
+        await job_manager.stop()
+    config_task.cancel()
+    await loop_monitor.stop()
+    await coordinator.close()
+    # 等待推理线程池中的在途任务完成后再落盘关闭（进程管理器优雅退出）
+    drained = await asyncio.get_running_loop().run_in_executor(
+        None, drain_executors, config.get("supervisor.drain_timeout", 30)
+    )
+    logger.info(f"✅ 推理线程池已排空（{'完成' if drained else '超时'}）")
+    if store is not None:
+        snapshot_task.cancel()
+        await run_cpu(store.close)
+    if crop_store is not None:
+        crop_store.close()
 
 # -------------------------- FastAPI 应用初始化 --------------------------
 app = FastAPI(
@@ -99,41 +316,188 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 请求追踪采样（仅业务接口）
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    trace, token = tracer.start_trace(request.url.path)
+    try:
+        return await call_next(request)
+    finally:
+        tracer.finish_trace(trace, token)
+
+def request_tenant(request: Request) -> str:
+    """从请求头中的API Key解析租户"""
+    return resolve_tenant(request.headers.get(config.get("tenants.header", "X-API-Key")))
+
+
+def tenant_key(request: Request) -> str:
+    """限流键：按租户而非来源IP（负载均衡后所有请求共用同一IP）"""
+    try:
+        return f"tenant:{request_tenant(request)}"
+    except TenantRejected:
+        return get_remote_address(request)
+
+
+def tenant_rejected_response(e: TenantRejected) -> JSONResponse:
+    """租户配额拒绝响应"""
+    status = 401 if e.reason == "unauthorized" else 429
+    return JSONResponse(
+        status_code=status,
+        content={"code": status, "msg": str(e), "data": {"retry_interval": 1000}}
+    )
+
+
+def require_tenant(request: Request) -> str:
+    """接口依赖：校验API Key（tenants.require_key 时缺失或未配置的Key返回401）"""
+    return request_tenant(request)
+
+
+def forward_headers(request: Request) -> Optional[dict]:
+    """协调器转发到分片时携带调用方的API Key"""
+    header = config.get("tenants.header", "X-API-Key")
+    api_key = request.headers.get(header)
+    return {header: api_key} if api_key else None
+
+
+async def tenant_rejected_handler(request: Request, e: TenantRejected) -> JSONResponse:
+    logger.warning(f"租户请求被拒绝（租户：{e.tenant}，原因：{e.reason}）")
+    return tenant_rejected_response(e)
+
+
 # 限流配置
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=tenant_key)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(TenantRejected, tenant_rejected_handler)
 
-THRESHOLD = config.get("face_model.threshold", 0.5)
+
+def extract_rate_limit():
+    """特征提取接口限流（每次请求读取，支持热加载）"""
+    return config.get("rate_limit.extract", "10/second")
+
+
+def detect_rate_limit():
+    """人脸检测接口限流（每次请求读取，支持热加载）"""
+    return config.get("rate_limit.detect", "30/second")
+
+
+def calculate_rate_limit():
+    """相似度计算接口限流（每次请求读取，支持热加载）"""
+    return config.get("rate_limit.calculate", "10/second")
+
+
+def gallery_rate_limit():
+    """人脸库检索接口限流（协调器分发到分片时共用同一来源IP，默认较宽松）"""
+    return config.get("rate_limit.gallery", "100/second")
+
+
+def check_admin(request: Request):
+    """校验管理接口令牌（未配置 admin.token 时不校验）"""
+    token = config.get("admin.token")
+    if token and request.headers.get("X-Admin-Token") != token:
+        raise HTTPException(status_code=403, detail="管理令牌无效")
 
 
 # -------------------------- 工具函数 --------------------------
+def _decode_image_bytes(image_data, image_type: str):
+    """解码图片数据（同步版本，在CPU线程池中执行）"""
+    if image_type == "base64":
+        base64_str = image_data.split(",")[-1] if "," in image_data else image_data
+        img_bytes = base64.b64decode(base64_str)
+    else:  # file（已读取的字节）
+        img_bytes = image_data
+
+    np_arr = np.frombuffer(img_bytes, np.uint8)
+    frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("图片解码失败，格式不支持")
+    return frame
+
+
 async def decode_image(image_data, image_type: str):
     """异步解码图片（支持base64和文件流）"""
     try:
-        if image_type == "base64":
-            base64_str = image_data.split(",")[-1] if "," in image_data else image_data
-            img_bytes = base64.b64decode(base64_str)
-        else:  # file
-            img_bytes = await image_data.read()
-
-        np_arr = np.frombuffer(img_bytes, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        if frame is None:
-            raise ValueError("图片解码失败，格式不支持")
-        return frame
+        if image_type != "base64":
+            image_data = await image_data.read()
+        return await run_cpu(_decode_image_bytes, image_data, image_type)
     except Exception as e:
         logger.error(f"图片解码失败（类型：{image_type}）", exc_info=True)
         return None
 
 
+def _export_crops(identity_id: str) -> list:
+    """读取身份的对齐人脸并编码为PNG（同步版本，在CPU线程池中执行）"""
+    crops = []
+    for index in crop_store.indices(identity_id):
+        item = crop_store.get(identity_id, index)
+        if item is None:
+            continue
+        chip, landmarks = item
+        crops.append({
+            "index": index,
+            "landmarks": landmarks.round(2).tolist(),
+            "chip": base64.b64encode(cv2.imencode(".png", chip)[1].tobytes()).decode("utf-8")
+        })
+    return crops
+
+
+async def json_body(request: Request, model):
+    """解析JSON请求体：接口同时声明了表单参数时 FastAPI 按表单解析请求体，JSON 请求的模型参数始终为None，
+    需按 Content-Type 手动解析；字段校验失败时抛出 ValidationError（ValueError 子类）
+    """
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return model(**await request.json())
+    return None
+
+
+def detect_input_size(det_size: Optional[int]):
+    """检测输入尺寸：请求指定的边长，否则取 face_detect.det_size，均未配置时为None（与模型一致）"""
+    if det_size is None:
+        size = config.get("face_detect.det_size")
+        return tuple(size) if size else None
+    if det_size % 32 or not 128 <= det_size <= 1280:
+        raise ValueError("det_size 须为 128~1280 之间 32 的倍数")
+    return det_size, det_size
+
+
+def _decode_job_images(images: List[str]) -> List[bytes]:
+    """解码批量任务上传的base64图片（同步版本，在CPU线程池中执行；图片内容在任务执行时解析）"""
+    return [base64.b64decode(item.split(",")[-1]) for item in images]
+
+
+def owned_job(request: Request, job_id: str):
+    """按租户查找批量任务，其他租户的任务视为不存在"""
+    job = job_manager.get(job_id)
+    if job is None or job.meta["tenant"] != request_tenant(request):
+        return None
+    return job
+
+
+def require_jobs():
+    """接口依赖：未启用批量任务时返回400"""
+    if not config.get("jobs.enabled", True):
+        raise HTTPException(status_code=400, detail="未启用批量任务（jobs.enabled）")
+
+
+def job_not_found() -> JSONResponse:
+    return JSONResponse(
+        status_code=404,
+        content={"code": 404, "msg": "任务不存在", "data": None}
+    )
+
+
 # -------------------------- 核心API接口 --------------------------
 @app.post('/api/face/extract')
-@limiter.limit("10/second")
+@limiter.limit(extract_rate_limit)
 async def extract_face_feature(
     request: Request,
     image_type: Optional[str] = Form(default="file"),
     image: Optional[UploadFile] = File(default=None),
+    aligned: bool = Form(default=False),
+    source_id: Optional[str] = Form(default=None),
+    embedding_format: Optional[str] = Form(default=None),
     body: Optional[ExtractRequest] = None
 ):
     """人脸检测+特征提取接口（给Java调用）
@@ -141,16 +505,25 @@ async def extract_face_feature(
     支持两种调用方式：
     1. JSON格式：{"image_type": "base64", "image": "base64编码的图片"}
     2. 表单格式：multipart/form-data，image_type=file，image为文件
+    aligned=true 时图片须为已对齐的112×112人脸，跳过检测只运行识别模型
+    source_id 为固定机位的视频源标识，开启 motion_gate 时ROI内无运动的帧直接返回201
+    embedding_format 指定返回特征的编码格式（float16/int8 为带头部的紧凑格式）
     """
     client_ip = request.client.host
     logger.info(f"收到人脸特征提取请求（IP：{client_ip}）")
 
     try:
+        tenant = request_tenant(request)
+        body = body or await json_body(request, ExtractRequest)
+
         # 处理不同的请求格式
         if body is not None:
             # JSON 请求
             image_type_val = body.image_type
             image_data = body.image
+            aligned = body.aligned
+            source_id = body.source_id
+            embedding_format = body.embedding_format
         elif image is not None:
             # 表单请求
             image_type_val = image_type
@@ -166,7 +539,8 @@ async def extract_face_feature(
             )
 
         # 解码图片
-        frame = await decode_image(image_data, image_type_val)
+        with span("decode_image"):
+            frame = await decode_image(image_data, image_type_val)
         if frame is None:
             return JSONResponse(
                 status_code=400,
@@ -177,8 +551,18 @@ async def extract_face_feature(
                 }
             )
 
-        # 异步检测人脸并提取特征
-        faces = await detect_faces_async(frame)
+        # 固定机位无运动的帧跳过检测，不占用推理槽位
+        if not aligned and await motion_gate.idle(source_id, frame):
+            faces = []
+        else:
+            # 异步检测人脸并提取特征
+            # 按租户加权公平排队进入推理线程池
+            async with scheduler.slot(tenant):
+                if aligned:
+                    faces = [await extract_aligned_async(frame)]
+                else:
+                    with motion_gate.measure(source_id):
+                        faces = await detect_faces_async(frame)
         if len(faces) == 0:
             return JSONResponse(
                 status_code=200,
@@ -200,19 +584,30 @@ async def extract_face_feature(
 
         # 返回特征向量
         face = faces[0]
-        embedding_str = await encode_embedding(face.embedding)
-        return JSONResponse(
-            status_code=200,
-            content={
-                "code": 200,
-                "msg": "特征提取成功",
-                "data": {
-                    "face_bbox": [int(v) for v in face.bbox],
-                    "embedding": embedding_str
+        with span("encode_embedding"):
+            embedding_str = await encode_embedding(face.embedding, face.model_version, embedding_format)
+        with span("build_response"):
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "code": 200,
+                    "msg": "特征提取成功",
+                    "data": {
+                        "face_bbox": [int(v) for v in face.bbox],
+                        "embedding": embedding_str,
+                        "model_version": face.model_version
+                    }
                 }
-            }
-        )
+            )
 
+    except TenantRejected as e:
+        logger.warning(f"租户请求被拒绝（租户：{e.tenant}，原因：{e.reason}）")
+        return tenant_rejected_response(e)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
     except Exception as e:
         logger.error(f"特征提取异常", exc_info=True)
         return JSONResponse(
@@ -225,8 +620,89 @@ async def extract_face_feature(
         )
 
 
-@app.post('/api/face/calculate')
-@limiter.limit("10/second")
+@app.post('/api/face/detect')
+@limiter.limit(detect_rate_limit)
+async def detect_face(
+    request: Request,
+    image_type: Optional[str] = Form(default="file"),
+    image: Optional[UploadFile] = File(default=None),
+    det_size: Optional[int] = Form(default=None),
+    source_id: Optional[str] = Form(default=None),
+    body: Optional[DetectRequest] = None
+):
+    """人脸检测接口（只运行检测模型，不提取特征），供前端轮询判断画面中是否恰好一张人脸
+
+    返回码与 /api/face/extract 一致：200 一张人脸，201 未检测到人脸，202 多个人脸，均返回全部人脸的框、置信度和关键点
+    det_size 可指定更小的检测输入边长以进一步降低耗时
+    """
+    try:
+        tenant = request_tenant(request)
+        body = body or await json_body(request, DetectRequest)
+        if body is not None:
+            image_type_val, image_data = body.image_type, body.image
+            det_size, source_id = body.det_size, body.source_id
+        elif image is not None:
+            image_type_val, image_data = image_type, image
+        else:
+            return JSONResponse(
+                status_code=400,
+                content={"code": 400, "msg": "未传入图片数据", "data": None}
+            )
+        input_size = detect_input_size(det_size)
+
+        with span("decode_image"):
+            frame = await decode_image(image_data, image_type_val)
+        if frame is None:
+            return JSONResponse(
+                status_code=400,
+                content={"code": 400, "msg": "图片解析失败", "data": {"retry_interval": 1000}}
+            )
+
+        if await motion_gate.idle(source_id, frame):
+            faces = []
+        else:
+            async with scheduler.slot(tenant):
+                with motion_gate.measure(source_id):
+                    faces = await detect_only_async(frame, input_size)
+        code, msg = (200, "检测成功") if len(faces) == 1 else (201, "未检测到人脸") if not faces else (202, "检测到多个人脸")
+        with span("build_response"):
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "code": code,
+                    "msg": msg,
+                    "data": {
+                        "faces": [
+                            {
+                                "bbox": [int(v) for v in face.bbox],
+                                "det_score": round(float(face.det_score), 4),
+                                "landmarks": np.round(face.kps, 2).tolist() if face.kps is not None else None,
+                            }
+                            for face in faces
+                        ],
+                        "retry_interval": None if code == 200 else (800 if code == 201 else 1000)
+                    }
+                }
+            )
+
+    except TenantRejected as e:
+        logger.warning(f"租户请求被拒绝（租户：{e.tenant}，原因：{e.reason}）")
+        return tenant_rejected_response(e)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    except Exception as e:
+        logger.error("人脸检测异常", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"code": 500, "msg": f"检测失败：{str(e)}", "data": None}
+        )
+
+
+@app.post('/api/face/calculate', dependencies=[Depends(require_tenant)])
+@limiter.limit(calculate_rate_limit)
 async def calculate_similarity(request: Request, body: SimilarityRequest):
     """相似度计算接口（给Java调用）"""
     client_ip = request.client.host
@@ -234,23 +710,45 @@ async def calculate_similarity(request: Request, body: SimilarityRequest):
 
     try:
         # 解码特征向量
-        current_embedding = await decode_embedding(body.current_embedding)
-        known_embeddings = [await decode_embedding(emb_str) for emb_str in body.known_embeddings]
+        with span("decode_embedding"):
+            parsed = await parse_embeddings([body.current_embedding] + body.known_embeddings)
+        versions = resolve_versions([v for v, _ in parsed], body.model_version, registry.active)
+        if not versions_compatible(versions):
+            # 不同模型提取的特征不在同一向量空间，相似度没有意义
+            return JSONResponse(
+                status_code=409,
+                content={
+                    "code": 409,
+                    "msg": "特征来自不同模型版本，无法比较",
+                    "data": {"versions": sorted({v for v in versions if v is not None})}
+                }
+            )
+        current_embedding = parsed[0][1]
+        known_embeddings = [emb for _, emb in parsed[1:]]
+        if any(emb.shape != current_embedding.shape for emb in known_embeddings):
+            raise ValueError("特征维度不一致，无法比较")
 
         # 计算相似度
-        similarities = await cosine_similarity(known_embeddings, current_embedding)
+        with span("cosine_similarity", count=len(known_embeddings)):
+            similarities = await cosine_similarity(known_embeddings, current_embedding)
 
-        return JSONResponse(
-            status_code=200,
-            content={
-                "code": 200,
-                "msg": "相似度计算成功",
-                "data": {
-                    "similarities": similarities.tolist()
+        with span("build_response"):
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "code": 200,
+                    "msg": "相似度计算成功",
+                    "data": {
+                        "similarities": similarities.tolist()
+                    }
                 }
-            }
-        )
+            )
 
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": f"特征解析失败：{str(e)}", "data": None}
+        )
     except Exception as e:
         logger.error(f"相似度计算异常", exc_info=True)
         return JSONResponse(
@@ -263,12 +761,548 @@ async def calculate_similarity(request: Request, body: SimilarityRequest):
         )
 
 
+@app.post('/api/gallery/enroll', dependencies=[Depends(require_tenant)])
+@limiter.limit(calculate_rate_limit)
+async def gallery_enroll(request: Request, body: EnrollRequest):
+    """注册身份特征到服务端人脸库（增量更新该身份的聚合模板）"""
+    if not owns(body.identity_id):
+        index, count = local_shard()
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": f"身份不属于本分片（{index}/{count}），请通过 /api/cluster/enroll 注册", "data": None}
+        )
+    try:
+        embeddings = await parse_embeddings(body.embeddings)
+        count = await enroll_embeddings(body.identity_id, embeddings)
+        return {
+            "code": 200,
+            "msg": "注册成功",
+            "data": {"identity_id": body.identity_id, "embedding_count": count}
+        }
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    except Exception as e:
+        logger.error("人脸库注册异常", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"code": 500, "msg": f"注册失败：{str(e)}", "data": None}
+        )
+
+
+@app.post('/api/gallery/enroll_image')
+@limiter.limit(extract_rate_limit)
+async def gallery_enroll_image(request: Request, body: EnrollImageRequest):
+    """上传注册照片：服务端检测并提取特征注册到人脸库，同时保存对齐人脸供模型迁移使用"""
+    if not owns(body.identity_id):
+        index, count = local_shard()
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": f"身份不属于本分片（{index}/{count}）", "data": None}
+        )
+    try:
+        tenant = request_tenant(request)
+        frame = await decode_image(body.image, "base64")
+        if frame is None:
+            return JSONResponse(
+                status_code=400,
+                content={"code": 400, "msg": "图片解析失败", "data": None}
+            )
+        async with scheduler.slot(tenant):
+            faces = await detect_faces_async(frame)
+        if len(faces) != 1:
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "code": 201 if not faces else 202,
+                    "msg": "未检测到人脸" if not faces else "检测到多个人脸",
+                    "data": None
+                }
+            )
+        face = faces[0]
+        chip = await run_cpu(align_face, frame, face) if crop_store is not None else None
+        count = await enroll_embedding(body.identity_id, face.embedding, face.model_version)
+        if chip is not None:
+            await run_cpu(crop_store.put, body.identity_id, count - 1, chip, face.kps)
+        return {
+            "code": 200,
+            "msg": "注册成功",
+            "data": {
+                "identity_id": body.identity_id,
+                "embedding_count": count,
+                "model_version": face.model_version,
+                "crop_saved": chip is not None
+            }
+        }
+    except TenantRejected as e:
+        return tenant_rejected_response(e)
+    except Exception as e:
+        logger.error("人脸库照片注册异常", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"code": 500, "msg": f"注册失败：{str(e)}", "data": None}
+        )
+
+
+@app.get('/api/gallery/{identity_id}/crops', dependencies=[Depends(require_tenant)])
+async def gallery_crops(request: Request, identity_id: str):
+    """导出身份已保存的对齐人脸（PNG base64）及原图5点关键点，用于质量复核和阈值标定"""
+    check_admin(request)
+    if crop_store is None:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": "未启用对齐人脸存储（crop_store.enabled）", "data": None}
+        )
+    crops = await run_cpu(_export_crops, identity_id)
+    if not crops:
+        return JSONResponse(
+            status_code=404,
+            content={"code": 404, "msg": "该身份没有已保存的对齐人脸", "data": None}
+        )
+    return {"code": 200, "msg": "查询成功", "data": {"identity_id": identity_id, "crops": crops}}
+
+
+@app.delete('/api/gallery/{identity_id}', dependencies=[Depends(require_tenant)])
+@limiter.limit(calculate_rate_limit)
+async def gallery_remove(request: Request, identity_id: str):
+    """从人脸库删除身份"""
+    removed = await remove_identity(identity_id)
+    if not removed:
+        return JSONResponse(
+            status_code=404,
+            content={"code": 404, "msg": "身份不存在", "data": None}
+        )
+    return {"code": 200, "msg": "删除成功", "data": {"identity_id": identity_id}}
+
+
+@app.post('/api/gallery/search', dependencies=[Depends(require_tenant)])
+@limiter.limit(gallery_rate_limit)
+async def gallery_search(request: Request, body: SearchRequest):
+    """人脸库检索：先比对身份模板取候选，再用候选身份的全部特征精排"""
+    try:
+        with span("decode_embedding"):
+            (version, probe), = await parse_embeddings([body.embedding])
+        with span("gallery_search"):
+            # 未标记版本的探针来自当前主模型，只与主模型（及未标记版本）的特征比较
+            results = await run_cpu(gallery.search, probe, body.top_k, body.shortlist, version or registry.active)
+        for item in results:
+            item["matched"] = item["score"] >= THRESHOLD
+        return {"code": 200, "msg": "检索成功", "data": {"results": results}}
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    except Exception as e:
+        logger.error("人脸库检索异常", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"code": 500, "msg": f"检索失败：{str(e)}", "data": None}
+        )
+
+
+@app.post('/api/cluster/search', dependencies=[Depends(require_tenant)])
+@limiter.limit(calculate_rate_limit)
+async def cluster_search(request: Request, body: ClusterSearchRequest):
+    """协调器检索：并行分发到所有分片，合并top-k；超时或不可用的分片被跳过"""
+    try:
+        data = await coordinator.search(
+            body.embedding, body.top_k, body.shortlist, body.deadline_ms, forward_headers(request)
+        )
+        for item in data["results"]:
+            item["matched"] = item["score"] >= THRESHOLD
+        return {"code": 200, "msg": "检索成功", "data": data}
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    except Exception as e:
+        logger.error("分片检索异常", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"code": 500, "msg": f"检索失败：{str(e)}", "data": None}
+        )
+
+
+@app.post('/api/cluster/enroll', dependencies=[Depends(require_tenant)])
+@limiter.limit(calculate_rate_limit)
+async def cluster_enroll(request: Request, body: EnrollRequest):
+    """协调器注册：按身份ID哈希转发到所属分片"""
+    try:
+        status, result = await coordinator.route(
+            body.identity_id, "POST", "/api/gallery/enroll", body.dict(), forward_headers(request)
+        )
+        return JSONResponse(status_code=status, content=result)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    except Exception as e:
+        logger.error("分片注册转发异常", exc_info=True)
+        return JSONResponse(
+            status_code=502,
+            content={"code": 502, "msg": f"分片不可用：{str(e)}", "data": None}
+        )
+
+
+@app.delete('/api/cluster/{identity_id}', dependencies=[Depends(require_tenant)])
+@limiter.limit(calculate_rate_limit)
+async def cluster_remove(request: Request, identity_id: str):
+    """协调器删除：转发到身份所属分片"""
+    try:
+        status, result = await coordinator.route(
+            identity_id, "DELETE", f"/api/gallery/{identity_id}", headers=forward_headers(request)
+        )
+        return JSONResponse(status_code=status, content=result)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    except Exception as e:
+        logger.error("分片删除转发异常", exc_info=True)
+        return JSONResponse(
+            status_code=502,
+            content={"code": 502, "msg": f"分片不可用：{str(e)}", "data": None}
+        )
+
+
+@app.post('/api/jobs/extract', dependencies=[Depends(require_jobs)])
+@limiter.limit(extract_rate_limit)
+async def submit_extract_job(request: Request, body: ExtractJobRequest):
+    """提交批量特征提取任务，立即返回任务ID；任务以低优先级在后台执行"""
+    try:
+        tenant = request_tenant(request)
+        images = None
+        if body.images is not None:
+            limit = config.get("jobs.max_inline_images", 500)
+            if len(body.images) > limit:
+                raise ValueError(f"单次上传图片数超过上限（{limit}），请分批提交或使用本地目录")
+            images = await run_cpu(_decode_job_images, body.images)
+        job = await job_manager.submit(tenant, images, body.path, body.manifest, body.output)
+        return {"code": 200, "msg": "任务已提交", "data": job.to_dict()}
+    except TenantRejected as e:
+        return tenant_rejected_response(e)
+    except (ValueError, OSError) as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    except Exception as e:
+        logger.error("批量任务提交异常", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"code": 500, "msg": f"提交失败：{str(e)}", "data": None}
+        )
+
+
+@app.get('/api/jobs', dependencies=[Depends(require_jobs)])
+async def list_jobs(request: Request):
+    """查询本租户的批量任务"""
+    try:
+        return {"code": 200, "msg": "查询成功", "data": job_manager.list(request_tenant(request))}
+    except TenantRejected as e:
+        return tenant_rejected_response(e)
+
+
+@app.get('/api/jobs/{job_id}', dependencies=[Depends(require_jobs)])
+async def get_job(request: Request, job_id: str):
+    """查询批量任务进度"""
+    try:
+        job = owned_job(request, job_id)
+    except TenantRejected as e:
+        return tenant_rejected_response(e)
+    if job is None:
+        return job_not_found()
+    return {"code": 200, "msg": "查询成功", "data": job.to_dict()}
+
+
+@app.get('/api/jobs/{job_id}/events', dependencies=[Depends(require_jobs)])
+async def stream_job(request: Request, job_id: str, interval: float = 1.0):
+    """以 Server-Sent Events 推送任务进度，任务结束后关闭连接"""
+    try:
+        job = owned_job(request, job_id)
+    except TenantRejected as e:
+        return tenant_rejected_response(e)
+    if job is None:
+        return job_not_found()
+
+    async def events():
+        last = None
+        while True:
+            data = job.to_dict()
+            if data != last:
+                last = data
+                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+            if data["status"] not in ACTIVE_STATES or await request.is_disconnected():
+                return
+            await asyncio.sleep(max(interval, 0.2))
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get('/api/jobs/{job_id}/results', dependencies=[Depends(require_jobs)])
+async def job_results(request: Request, job_id: str, file: str = "jsonl"):
+    """下载任务结果（可在任务运行中下载已完成部分）；file=binary 下载 float32 特征矩阵"""
+    try:
+        job = owned_job(request, job_id)
+    except TenantRejected as e:
+        return tenant_rejected_response(e)
+    if job is None:
+        return job_not_found()
+    name = "embeddings.f32" if file == "binary" else "results.jsonl"
+    path = os.path.join(job.dir, name)
+    if not os.path.exists(path):
+        return JSONResponse(
+            status_code=404,
+            content={"code": 404, "msg": "暂无结果", "data": None}
+        )
+    return FileResponse(path, filename=f"{job_id}-{name}")
+
+
+@app.post('/api/jobs/{job_id}/cancel', dependencies=[Depends(require_jobs)])
+async def cancel_job(request: Request, job_id: str):
+    """取消排队中或运行中的任务（已写入的结果保留）"""
+    try:
+        job = owned_job(request, job_id)
+    except TenantRejected as e:
+        return tenant_rejected_response(e)
+    if job is None:
+        return job_not_found()
+    if not job_manager.cancel(job_id):
+        return JSONResponse(
+            status_code=409,
+            content={"code": 409, "msg": "任务已结束", "data": job.to_dict()}
+        )
+    return {"code": 200, "msg": "任务已取消", "data": job.to_dict()}
+
+
+@app.delete('/api/jobs/{job_id}', dependencies=[Depends(require_jobs)])
+async def delete_job(request: Request, job_id: str):
+    """删除已结束的任务及其结果文件"""
+    try:
+        job = owned_job(request, job_id)
+    except TenantRejected as e:
+        return tenant_rejected_response(e)
+    if job is None:
+        return job_not_found()
+    if not job_manager.remove(job_id):
+        return JSONResponse(
+            status_code=409,
+            content={"code": 409, "msg": "任务未结束，请先取消", "data": job.to_dict()}
+        )
+    return {"code": 200, "msg": "删除成功", "data": {"job_id": job_id}}
+
+
 @app.get('/health')
 async def health_check():
     """健康检查接口"""
     return {"status": "healthy", "service": "face-recognition-api"}
 
 
+@app.get('/metrics')
+async def metrics():
+    """运行指标接口（事件循环延迟等）"""
+    index, count = local_shard()
+    return {
+        "event_loop_lag": loop_monitor.stats(),
+        "scheduler": scheduler.stats(),
+        "buffer_pool": buffer_pool.stats(),
+        "gallery": dict(gallery.stats(), shard_index=index, shard_count=count),
+        "crop_store": crop_store.stats() if crop_store is not None else None,
+        "reembed": reembed_job.status(),
+        "motion_gate": motion_gate.stats(),
+        "jobs": {state: sum(1 for j in job_manager.list() if j["status"] == state) for state in ACTIVE_STATES}
+    }
+
+
+# -------------------------- 管理接口 --------------------------
+@app.post('/admin/config/reload')
+async def admin_reload_config(request: Request):
+    """手动触发配置热加载"""
+    check_admin(request)
+    try:
+        changed, model_reload = await apply_config_reload()
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    return {
+        "code": 200,
+        "msg": "配置已重新加载",
+        "data": {
+            "changed": sorted(changed),
+            "model_reload": model_reload
+        }
+    }
+
+
+@app.get('/admin/models')
+async def admin_list_models(request: Request):
+    """查看已加载模型、主模型、影子模型及各模型延迟/一致性统计"""
+    check_admin(request)
+    return {"code": 200, "msg": "查询成功", "data": registry.describe()}
+
+
+def model_name_missing() -> JSONResponse:
+    return JSONResponse(
+        status_code=400,
+        content={"code": 400, "msg": "缺少模型包名称（name）", "data": None}
+    )
+
+
+@app.post('/admin/models/load')
+async def admin_load_model(request: Request, body: ModelRequest):
+    """后台加载并预热模型包（不切换流量）"""
+    check_admin(request)
+    if not body.name:
+        return model_name_missing()
+    try:
+        await load_model(body.name)
+    except Exception as e:
+        logger.error(f"模型加载失败：{body.name}", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"code": 500, "msg": f"模型加载失败：{str(e)}", "data": None}
+        )
+    return {"code": 200, "msg": "模型加载成功", "data": registry.describe()}
+
+
+@app.post('/admin/models/activate')
+async def admin_activate_model(request: Request, body: ModelRequest):
+    """将已加载的模型原子切换为主模型"""
+    check_admin(request)
+    if not body.name:
+        return model_name_missing()
+    try:
+        activate_model(body.name)
+    except KeyError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    if crop_store is not None and config.get("reembed.auto_start", True):
+        # 旧模型的迁移任务会在下一批次前自行结束，等待后按新版本重新开始
+        if reembed_job.running:
+            await reembed_job.stop()
+        reembed_job.start()
+    return {"code": 200, "msg": "主模型已切换", "data": registry.describe()}
+
+
+@app.post('/admin/models/shadow')
+async def admin_shadow_model(request: Request, body: ModelRequest):
+    """设置影子模型及采样比例（name为空时关闭影子评分）"""
+    check_admin(request)
+    try:
+        registry.set_shadow(body.name, body.sample_rate)
+    except (KeyError, ValueError) as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    return {"code": 200, "msg": "影子评分已更新", "data": registry.describe()}
+
+
+@app.delete('/admin/models/{name}')
+async def admin_unload_model(request: Request, name: str):
+    """卸载非主模型，释放内存"""
+    check_admin(request)
+    try:
+        registry.unload(name)
+    except (KeyError, ValueError) as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    return {"code": 200, "msg": "模型已卸载", "data": registry.describe()}
+
+
+@app.get('/admin/profile/traces')
+async def admin_export_traces(request: Request, clear: bool = False):
+    """导出采样的请求追踪（Chrome trace JSON，可在 chrome://tracing 或 Perfetto 打开）"""
+    check_admin(request)
+    data = tracer.export_chrome_trace()
+    if clear:
+        tracer.clear()
+    return data
+
+
+@app.post('/admin/profile/sampling')
+async def admin_set_sampling(request: Request, rate: float):
+    """调整请求追踪采样比例（0关闭，1全量）"""
+    check_admin(request)
+    if not 0 <= rate <= 1:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": "采样比例应在0~1之间", "data": None}
+        )
+    tracer.sample_rate = rate
+    return {"code": 200, "msg": "采样比例已更新", "data": {"sample_rate": rate}}
+
+
+@app.post('/admin/profile/stacks')
+async def admin_sample_stacks(request: Request, seconds: float = 10):
+    """对运行中的服务做N秒全线程栈采样，返回折叠栈文本（可用 flamegraph.pl / speedscope 查看）"""
+    check_admin(request)
+    seconds = min(max(seconds, 0.1), config.get("profiling.max_seconds", 60))
+    loop = asyncio.get_running_loop()
+    # 在默认线程池中采样，不阻塞事件循环
+    stacks = await loop.run_in_executor(None, sample_stacks, seconds)
+    return PlainTextResponse(stacks)
+
+
+@app.get('/admin/reembed')
+async def admin_reembed_status(request: Request):
+    """查看特征迁移进度及人脸库各模型版本的特征数"""
+    check_admin(request)
+    return {"code": 200, "msg": "查询成功", "data": reembed_job.status()}
+
+
+@app.post('/admin/reembed/start')
+async def admin_reembed_start(request: Request, body: ReembedRequest):
+    """启动后台特征迁移（用已保存的对齐人脸重新提取旧版本特征）"""
+    check_admin(request)
+    try:
+        started = reembed_job.start(body.target)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": str(e), "data": None}
+        )
+    if not started:
+        return JSONResponse(
+            status_code=409,
+            content={"code": 409, "msg": "已有迁移任务在运行", "data": reembed_job.status()}
+        )
+    return {"code": 200, "msg": "迁移任务已启动", "data": reembed_job.status()}
+
+
+@app.post('/admin/reembed/stop')
+async def admin_reembed_stop(request: Request):
+    """停止特征迁移（当前批次完成后退出，可再次启动继续迁移剩余特征）"""
+    check_admin(request)
+    await reembed_job.stop()
+    return {"code": 200, "msg": "迁移任务已停止", "data": reembed_job.status()}
+
+
+@app.post('/admin/gallery/snapshot')
+async def admin_snapshot_gallery(request: Request):
+    """立即生成人脸库快照并压缩WAL"""
+    check_admin(request)
+    if store is None:
+        return JSONResponse(
+            status_code=400,
+            content={"code": 400, "msg": "未启用人脸库持久化（gallery.persist.enabled）", "data": None}
+        )
+    data = await asyncio.get_running_loop().run_in_executor(None, store.snapshot)
+    return {"code": 200, "msg": "快照完成", "data": data}
+
+
 # -------------------------- 启动服务 --------------------------
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+
+import cv2
+import grpc
+import numpy as np
+
+from config import config
+from core.cpu_pool import run_cpu
+from core.face_core import cosine_similarity, versions_compatible
+from core.tenant_scheduler import scheduler, resolve_tenant, TenantRejected
+from face_process.init_InsightFace import detect_faces_async, extract_aligned_async
+from face_process.motion_gate import motion_gate
+from api.proto import face_recognition_pb2 as pb2
+from api.proto import face_recognition_pb2_grpc as pb2_grpc
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+# gRPC 服务与 HTTP 服务运行在同一进程，共用模型实例、推理线程池和CPU线程池
+logger = logging.getLogger(__name__)
+
+
+def _decode_frame(image: bytes):
+    """解码图片字节（同步版本，在CPU线程池中执行）"""
+    return cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _to_arrays(current, known):
+    """protobuf浮点数组转numpy（同步版本），无需base64解码；维度不一致时抛出ValueError"""
+    current_arr = np.array(current.values, dtype=np.float32)
+    if any(len(k.values) != len(current_arr) for k in known):
+        raise ValueError("特征维度不一致，无法比较")
+    known_arr = np.array([k.values for k in known], dtype=np.float32)
+    return known_arr, current_arr
+
+
+# 错误返回码对应的 gRPC 状态（一元调用以状态结束，流式调用逐条返回码）
+# 201/202（未检测到人脸/多个人脸）是正常的业务结果，仍以响应返回
+_UNARY_STATUS = {
+    400: grpc.StatusCode.INVALID_ARGUMENT,
+    401: grpc.StatusCode.UNAUTHENTICATED,
+    409: grpc.StatusCode.FAILED_PRECONDITION,
+    429: grpc.StatusCode.RESOURCE_EXHAUSTED,
+    500: grpc.StatusCode.INTERNAL,
+}
+
+
+class FaceRecognitionServicer(pb2_grpc.FaceRecognitionServicer):
+    """人脸识别 gRPC 服务实现"""
+
+    async def _extract(self, request, tenant: str) -> pb2.ExtractResponse:
+        rid = request.request_id
+        try:
+            frame = await run_cpu(_decode_frame, request.image)
+            if frame is None:
+                return pb2.ExtractResponse(request_id=rid, code=400, msg="图片解析失败", retry_interval=1000)
+            if not request.aligned and await motion_gate.idle(request.source_id, frame):
+                faces = []
+            else:
+                async with scheduler.slot(tenant):
+                    if request.aligned:
+                        faces = [await extract_aligned_async(frame)]
+                    else:
+                        with motion_gate.measure(request.source_id):
+                            faces = await detect_faces_async(frame)
+            if len(faces) == 0:
+                return pb2.ExtractResponse(request_id=rid, code=201, msg="未检测到人脸", retry_interval=800)
+            if len(faces) > 1:
+                return pb2.ExtractResponse(request_id=rid, code=202, msg="检测到多个人脸", retry_interval=1000)
+            face = faces[0]
+            return pb2.ExtractResponse(
+                request_id=rid,
+                code=200,
+                msg="特征提取成功",
+                face_bbox=[int(v) for v in face.bbox],
+                embedding=face.embedding.astype(np.float32).tolist(),
+                model_version=face.model_version
+            )
+        except TenantRejected as e:
+            code = 401 if e.reason == "unauthorized" else 429
+            return pb2.ExtractResponse(request_id=rid, code=code, msg=str(e), retry_interval=1000)
+        except ValueError as e:
+            return pb2.ExtractResponse(request_id=rid, code=400, msg=str(e))
+        except Exception as e:
+            logger.error("gRPC特征提取异常", exc_info=True)
+            return pb2.ExtractResponse(request_id=rid, code=500, msg=f"提取失败：{str(e)}")
+
+    async def _calculate(self, request, tenant: str) -> pb2.CalculateResponse:
+        rid = request.request_id
+        try:
+            if not request.known:
+                return pb2.CalculateResponse(request_id=rid, code=200, msg="相似度计算成功")
+            versions = [e.model_version or None for e in [request.current, *request.known]]
+            if not versions_compatible(versions):
+                # 不同模型提取的特征不在同一向量空间，相似度没有意义
+                return pb2.CalculateResponse(
+                    request_id=rid, code=409,
+                    msg=f"特征来自不同模型版本，无法比较：{sorted({v for v in versions if v is not None})}"
+                )
+            known, current = await run_cpu(_to_arrays, request.current, request.known)
+            similarities = await cosine_similarity(known, current)
+            return pb2.CalculateResponse(
+                request_id=rid, code=200, msg="相似度计算成功", similarities=similarities.tolist()
+            )
+        except ValueError as e:
+            return pb2.CalculateResponse(request_id=rid, code=400, msg=str(e))
+        except Exception as e:
+            logger.error("gRPC相似度计算异常", exc_info=True)
+            return pb2.CalculateResponse(request_id=rid, code=500, msg=f"计算失败：{str(e)}")
+
+    async def _stream(self, request_iterator, handler, tenant: str):
+        """双向流：并发处理（受 grpc.stream_concurrency 限制），按完成顺序返回"""
+        semaphore = asyncio.Semaphore(config.get("grpc.stream_concurrency", 8))
+        results = asyncio.Queue()
+        pending = set()
+
+        async def run(req):
+            try:
+                await results.put(await handler(req, tenant))
+            finally:
+                semaphore.release()
+
+        async def consume():
+            # 读取请求流或处理请求出错（如客户端断开）时把异常放入队列，由响应生成器重新抛出，
+            # 无论成功与否都放入结束标记，响应生成器不会一直等待
+            try:
+                async for req in request_iterator:
+                    await semaphore.acquire()
+                    task = asyncio.create_task(run(req))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                if pending:
+                    await asyncio.gather(*list(pending))
+            except Exception as e:
+                results.put_nowait(e)
+            finally:
+                results.put_nowait(None)
+
+        reader = asyncio.create_task(consume())
+        try:
+            while True:
+                item = await results.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            reader.cancel()
+            for task in list(pending):
+                task.cancel()
+
+    @staticmethod
+    async def _tenant(context) -> str:
+        """从调用元数据中的API Key解析租户"""
+        header = config.get("tenants.header", "X-API-Key").lower()
+        api_key = dict(context.invocation_metadata()).get(header)
+        try:
+            return resolve_tenant(api_key)
+        except TenantRejected as e:
+            await context.abort(grpc.StatusCode.UNAUTHENTICATED, str(e))
+
+    @staticmethod
+    async def _unary(response, context):
+        """一元调用：错误返回码以对应的 gRPC 状态结束调用"""
+        status = _UNARY_STATUS.get(response.code)
+        if status is not None:
+            await context.abort(status, response.msg)
+        return response
+
+    async def Extract(self, request, context):
+        return await self._unary(await self._extract(request, await self._tenant(context)), context)
+
+    async def Calculate(self, request, context):
+        return await self._unary(await self._calculate(request, await self._tenant(context)), context)
+
+    async def ExtractStream(self, request_iterator, context):
+        tenant = await self._tenant(context)
+        async for response in self._stream(request_iterator, self._extract, tenant):
+            yield response
+
+    async def CalculateStream(self, request_iterator, context):
+        tenant = await self._tenant(context)
+        async for response in self._stream(request_iterator, self._calculate, tenant):
+            yield response
+
+
+async def start_grpc_server():
+    """启动 gRPC 服务（在 FastAPI 生命周期内调用，与 HTTP 服务同一事件循环）"""
+    max_message = config.get("grpc.max_message_mb", 16) * 1024 * 1024
+    server = grpc.aio.server(options=[
+        ("grpc.max_receive_message_length", max_message),
+        ("grpc.max_send_message_length", max_message),
+    ])
+    pb2_grpc.add_FaceRecognitionServicer_to_server(FaceRecognitionServicer(), server)
+    address = f"{config.get('server.host', '0.0.0.0')}:{config.get('grpc.port', 50051)}"
+    server.add_insecure_port(address)
+    await server.start()
+    logger.info(f"🚀 gRPC 服务已启动（{address}）")
+    return server
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import config
+from core.face_core import encode_embedding
+from core.tenant_scheduler import scheduler, resolve_tenant, TenantRejected
+from face_process.init_InsightFace import detect_faces_async, registry
+from face_process.motion_gate import motion_gate
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+# 同机采集进程的本地接入：Unix域套接字传控制消息，共享内存环形缓冲区传原始BGR帧，
+# 省去客户端JPEG编码/base64和服务端解码。与HTTP服务同一进程，共用模型和推理线程池。
+#
+# 消息格式：4字节小端长度 + UTF-8 JSON
+#   {"op": "open", "slots": 4, "slot_bytes": 6220800, "api_key": "...", "source_id": "gate-1"}
+#       -> {"code": 200, "shm": "<共享内存名>", "slots": 4, "slot_bytes": 6220800}
+#   客户端将帧写入第 slot 个槽位（偏移 slot * slot_bytes，HxWx3 uint8 连续存储）后发送
+#   {"op": "detect", "request_id": "1", "slot": 0, "width": 1920, "height": 1080}
+#       -> {"request_id": "1", "slot": 0, "code": 200, "faces": [{bbox, det_score, kps, embedding}]}
+#   响应中的 slot 表示服务端已释放该槽位；槽位无效、仍在处理中等未接收该帧的拒绝响应不含 slot
+#   （槽位仍归原请求所有，客户端按 request_id 自行处理）
+#   source_id 为固定机位的视频源标识（detect 消息中可逐帧覆盖），开启 motion_gate 时无运动的帧直接返回 201
+#   收到响应前该槽位归服务端所有，客户端不得改写；多个槽位可同时在途，响应按完成顺序返回。
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct("<I")
+
+
+async def _read_message(reader: asyncio.StreamReader):
+    header = await reader.readexactly(_LENGTH.size)
+    (length,) = _LENGTH.unpack(header)
+    return json.loads(await reader.readexactly(length))
+
+
+def _write_message(writer: asyncio.StreamWriter, message: dict):
+    data = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    writer.write(_LENGTH.pack(len(data)) + data)
+
+
+class _Connection:
+    """单个客户端连接：持有共享内存环形缓冲区，并发处理在途帧"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.shm = None
+        self.slots = 0
+        self.slot_bytes = 0
+        self.tenant = None
+        self.source_id = None
+        self.busy = set()
+        self.tasks = set()
+
+    def _open(self, message: dict) -> dict:
+        if self.shm is not None:
+            return {"code": 400, "msg": "共享内存已创建"}
+        try:
+            self.tenant = resolve_tenant(message.get("api_key"))
+        except TenantRejected as e:
+            return {"code": 401, "msg": str(e)}
+        self.source_id = message.get("source_id")
+        max_bytes = int(config.get("shm.max_frame_mb", 8) * 1024 * 1024)
+        self.slots = max(1, min(int(message.get("slots", config.get("shm.slots", 4))), config.get("shm.max_slots", 16)))
+        self.slot_bytes = max(1, min(int(message.get("slot_bytes", max_bytes)), max_bytes))
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        # 默认以0600创建，与套接字一致放开给同组采集进程
+        os.fchmod(self.shm._fd, 0o660)
+        return {"code": 200, "shm": self.shm.name, "slots": self.slots, "slot_bytes": self.slot_bytes}
+
+    def _frame(self, message: dict):
+        """在共享内存上构建帧视图（不复制）"""
+        slot, width, height = int(message["slot"]), int(message["width"]), int(message["height"])
+        if not 0 <= slot < self.slots:
+            raise ValueError(f"槽位编号无效：{slot}")
+        if width <= 0 or height <= 0 or width * height * 3 > self.slot_bytes:
+            raise ValueError(f"帧尺寸无效或超过槽位大小：{width}x{height}")
+        if slot in self.busy:
+            raise ValueError(f"槽位 {slot} 仍在处理中")
+        return slot, np.ndarray((height, width, 3), dtype=np.uint8, buffer=self.shm.buf,
+                                offset=slot * self.slot_bytes)
+
+    async def _detect(self, message: dict):
+        response = {"request_id": message.get("request_id")}
+        slot = None
+        try:
+            slot, frame = self._frame(message)
+            self.busy.add(slot)
+            # 只有服务端占用过的槽位才在响应中回传（客户端据此释放）
+            response["slot"] = slot
+            source_id = message.get("source_id", self.source_id)
+            if await motion_gate.idle(source_id, frame):
+                faces = []
+            else:
+                if registry.shadow is not None:
+                    # 影子评分在响应之后异步读取帧，此时槽位可能已被客户端改写，需复制
+                    frame = frame.copy()
+                async with scheduler.slot(self.tenant):
+                    with motion_gate.measure(source_id):
+                        faces = await detect_faces_async(frame)
+            response["faces"] = [
+                {
+                    "bbox": [int(v) for v in face.bbox],
+                    "det_score": round(float(face.det_score), 4),
+                    "kps": np.round(face.kps, 2).tolist() if face.kps is not None else None,
+                    "embedding": await encode_embedding(face.embedding, face.model_version),
+                }
+                for face in faces
+            ]
+            response.update(code=200 if faces else 201, msg="检测成功" if faces else "未检测到人脸")
+        except TenantRejected as e:
+            response.update(code=429, msg=str(e))
+        except (KeyError, ValueError) as e:
+            response.update(code=400, msg=str(e))
+        except Exception as e:
+            logger.error("共享内存帧处理异常", exc_info=True)
+            response.update(code=500, msg=f"处理失败：{str(e)}")
+        finally:
+            self.busy.discard(slot)
+        try:
+            _write_message(self.writer, response)
+            await self.writer.drain()
+        except ConnectionError:
+            logger.warning("共享内存客户端已断开，丢弃响应")
+
+    async def serve(self):
+        try:
+            while True:
+                message = await _read_message(self.reader)
+                op = message.get("op")
+                if op == "open":
+                    _write_message(self.writer, self._open(message))
+                    await self.writer.drain()
+                elif op == "detect" and self.shm is not None:
+                    task = asyncio.create_task(self._detect(message))
+                    self.tasks.add(task)
+                    task.add_done_callback(self.tasks.discard)
+                else:
+                    _write_message(self.writer, {"request_id": message.get("request_id"), "code": 400,
+                                                 "msg": f"未知操作或未创建共享内存：{op}"})
+                    await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.error("共享内存连接异常", exc_info=True)
+        finally:
+            await self.close()
+
+    async def close(self):
+        # 等待在途帧处理完，再释放共享内存
+        if self.tasks:
+            await asyncio.gather(*list(self.tasks), return_exceptions=True)
+        self.writer.close()
+        if self.shm is not None:
+            self.shm.unlink()
+            try:
+                self.shm.close()
+            except BufferError:
+                # 仍有帧视图未释放，交由垃圾回收关闭映射
+                logger.warning("共享内存仍被引用，延迟关闭")
+            self.shm = None
+
+
+async def start_shm_server():
+    """启动本地共享内存接入服务（在 FastAPI 生命周期内调用，与 HTTP 服务同一事件循环）"""
+    if not hasattr(asyncio, "start_unix_server"):
+        logger.warning("⚠️ 当前平台不支持Unix域套接字，共享内存接入未启动")
+        return None
+    path = config.get("shm.socket_path", "/tmp/face_recognition.sock")
+    if os.path.exists(path):
+        os.remove(path)
+
+    async def handle(reader, writer):
+        await _Connection(reader, writer).serve()
+
+    # 仅属主及同组进程可接入：绑定前设置umask，套接字文件创建即为0660，不存在先宽后收的窗口
+    umask = os.umask(0o117)
+    try:
+        server = await asyncio.start_unix_server(handle, path=path)
+    finally:
+        os.umask(umask)
+    logger.info(f"🚀 共享内存接入已启动（{path}）")
+    return server
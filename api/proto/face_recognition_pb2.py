@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: api/proto/face_recognition.proto
+# Protobuf Python Version: 4.25.0
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n api/proto/face_recognition.proto\x12\x10\x66\x61\x63\x65_recognition\"W\n\x0e\x45xtractRequest\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12\r\n\x05image\x18\x02 \x01(\x0c\x12\x0f\n\x07\x61ligned\x18\x03 \x01(\x08\x12\x11\n\tsource_id\x18\x04 \x01(\t\"\x95\x01\n\x0f\x45xtractResponse\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12\x0c\n\x04\x63ode\x18\x02 \x01(\x05\x12\x0b\n\x03msg\x18\x03 \x01(\t\x12\x11\n\tface_bbox\x18\x04 \x03(\x05\x12\x11\n\tembedding\x18\x05 \x03(\x02\x12\x16\n\x0eretry_interval\x18\x06 \x01(\x05\x12\x15\n\rmodel_version\x18\x07 \x01(\t\"2\n\tEmbedding\x12\x0e\n\x06values\x18\x01 \x03(\x02\x12\x15\n\rmodel_version\x18\x02 \x01(\t\"\x80\x01\n\x10\x43\x61lculateRequest\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12,\n\x07\x63urrent\x18\x02 \x01(\x0b\x32\x1b.face_recognition.Embedding\x12*\n\x05known\x18\x03 \x03(\x0b\x32\x1b.face_recognition.Embedding\"X\n\x11\x43\x61lculateResponse\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12\x0c\n\x04\x63ode\x18\x02 \x01(\x05\x12\x0b\n\x03msg\x18\x03 \x01(\t\x12\x14\n\x0csimilarities\x18\x04 \x03(\x02\x32\xf1\x02\n\x0f\x46\x61\x63\x65Recognition\x12N\n\x07\x45xtract\x12 .face_recognition.ExtractRequest\x1a!.face_recognition.ExtractResponse\x12T\n\tCalculate\x12\".face_recognition.CalculateRequest\x1a#.face_recognition.CalculateResponse\x12X\n\rExtractStream\x12 .face_recognition.ExtractRequest\x1a!.face_recognition.ExtractResponse(\x01\x30\x01\x12^\n\x0f\x43\x61lculateStream\x12\".face_recognition.CalculateRequest\x1a#.face_recognition.CalculateResponse(\x01\x30\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'api.proto.face_recognition_pb2', _globals)
+if _descriptor._USE_C_DESCRIPTORS == False:
+  DESCRIPTOR._options = None
+  _globals['_EXTRACTREQUEST']._serialized_start=54
+  _globals['_EXTRACTREQUEST']._serialized_end=141
+  _globals['_EXTRACTRESPONSE']._serialized_start=144
+  _globals['_EXTRACTRESPONSE']._serialized_end=293
+  _globals['_EMBEDDING']._serialized_start=295
+  _globals['_EMBEDDING']._serialized_end=345
+  _globals['_CALCULATEREQUEST']._serialized_start=348
+  _globals['_CALCULATEREQUEST']._serialized_end=476
+  _globals['_CALCULATERESPONSE']._serialized_start=478
+  _globals['_CALCULATERESPONSE']._serialized_end=566
+  _globals['_FACERECOGNITION']._serialized_start=569
+  _globals['_FACERECOGNITION']._serialized_end=938
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,169 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+
+from api.proto import face_recognition_pb2 as api_dot_proto_dot_face__recognition__pb2
+
+
+class FaceRecognitionStub(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Extract = channel.unary_unary(
+                '/face_recognition.FaceRecognition/Extract',
+                request_serializer=api_dot_proto_dot_face__recognition__pb2.ExtractRequest.SerializeToString,
+                response_deserializer=api_dot_proto_dot_face__recognition__pb2.ExtractResponse.FromString,
+                )
+        self.Calculate = channel.unary_unary(
+                '/face_recognition.FaceRecognition/Calculate',
+                request_serializer=api_dot_proto_dot_face__recognition__pb2.CalculateRequest.SerializeToString,
+                response_deserializer=api_dot_proto_dot_face__recognition__pb2.CalculateResponse.FromString,
+                )
+        self.ExtractStream = channel.stream_stream(
+                '/face_recognition.FaceRecognition/ExtractStream',
+                request_serializer=api_dot_proto_dot_face__recognition__pb2.ExtractRequest.SerializeToString,
+                response_deserializer=api_dot_proto_dot_face__recognition__pb2.ExtractResponse.FromString,
+                )
+        self.CalculateStream = channel.stream_stream(
+                '/face_recognition.FaceRecognition/CalculateStream',
+                request_serializer=api_dot_proto_dot_face__recognition__pb2.CalculateRequest.SerializeToString,
+                response_deserializer=api_dot_proto_dot_face__recognition__pb2.CalculateResponse.FromString,
+                )
+
+
+class FaceRecognitionServicer(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def Extract(self, request, context):
+        """人脸检测 + 特征提取
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Calculate(self, request, context):
+        """相似度计算
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ExtractStream(self, request_iterator, context):
+        """批量特征提取（双向流，响应按完成顺序返回，用 request_id 对应）
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CalculateStream(self, request_iterator, context):
+        """批量相似度计算（双向流）
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_FaceRecognitionServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Extract': grpc.unary_unary_rpc_method_handler(
+                    servicer.Extract,
+                    request_deserializer=api_dot_proto_dot_face__recognition__pb2.ExtractRequest.FromString,
+                    response_serializer=api_dot_proto_dot_face__recognition__pb2.ExtractResponse.SerializeToString,
+            ),
+            'Calculate': grpc.unary_unary_rpc_method_handler(
+                    servicer.Calculate,
+                    request_deserializer=api_dot_proto_dot_face__recognition__pb2.CalculateRequest.FromString,
+                    response_serializer=api_dot_proto_dot_face__recognition__pb2.CalculateResponse.SerializeToString,
+            ),
+            'ExtractStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.ExtractStream,
+                    request_deserializer=api_dot_proto_dot_face__recognition__pb2.ExtractRequest.FromString,
+                    response_serializer=api_dot_proto_dot_face__recognition__pb2.ExtractResponse.SerializeToString,
+            ),
+            'CalculateStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.CalculateStream,
+                    request_deserializer=api_dot_proto_dot_face__recognition__pb2.CalculateRequest.FromString,
+                    response_serializer=api_dot_proto_dot_face__recognition__pb2.CalculateResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'face_recognition.FaceRecognition', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+
+
+ # This class is part of an EXPERIMENTAL API.
+class FaceRecognition(object):
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def Extract(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/face_recognition.FaceRecognition/Extract',
+            api_dot_proto_dot_face__recognition__pb2.ExtractRequest.SerializeToString,
+            api_dot_proto_dot_face__recognition__pb2.ExtractResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def Calculate(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/face_recognition.FaceRecognition/Calculate',
+            api_dot_proto_dot_face__recognition__pb2.CalculateRequest.SerializeToString,
+            api_dot_proto_dot_face__recognition__pb2.CalculateResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def ExtractStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/face_recognition.FaceRecognition/ExtractStream',
+            api_dot_proto_dot_face__recognition__pb2.ExtractRequest.SerializeToString,
+            api_dot_proto_dot_face__recognition__pb2.ExtractResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def CalculateStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/face_recognition.FaceRecognition/CalculateStream',
+            api_dot_proto_dot_face__recognition__pb2.CalculateRequest.SerializeToString,
+            api_dot_proto_dot_face__recognition__pb2.CalculateResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
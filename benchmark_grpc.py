@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+gRPC 与 JSON HTTP 接口性能对比
+需先启动服务并开启 grpc.enabled；对特征提取和相似度计算分别测量吞吐量与延迟
+"""
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import sys
+import time
+
+import aiohttp
+import grpc
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import config
+from api.proto import face_recognition_pb2 as pb2
+from api.proto import face_recognition_pb2_grpc as pb2_grpc
+
+
+def report(name: str, latencies: list, elapsed: float):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if len(latencies) >= 100 else latencies[-1]
+    print(f"{name:<28} {len(latencies) / elapsed:>8.1f} req/s   "
+          f"平均 {statistics.mean(latencies):>7.2f}ms   P99 {p99:>7.2f}ms")
+
+
+async def run_concurrent(func, total: int, concurrency: int):
+    """以固定并发执行 total 次请求，返回 (延迟列表, 总耗时)"""
+    latencies = []
+    counter = iter(range(total))
+
+    async def worker():
+        for _ in counter:
+            start = time.perf_counter()
+            await func()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    begin = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, time.perf_counter() - begin
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="gRPC vs JSON HTTP 基准测试")
+    parser.add_argument("--image", required=True, help="测试图片路径（单人脸）")
+    parser.add_argument("--requests", type=int, default=200, help="每项测试请求数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发数")
+    parser.add_argument("--known", type=int, default=100, help="相似度计算的已知特征数")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
+    rng = np.random.default_rng(0)
+    current = rng.standard_normal(512).astype(np.float32)
+    known = rng.standard_normal((args.known, 512)).astype(np.float32)
+
+    http_url = f"http://{args.host}:{config.get('server.port', 5000)}"
+    grpc_addr = f"{args.host}:{config.get('grpc.port', 50051)}"
+
+    print("=" * 80)
+    print(f"📊 gRPC vs JSON HTTP（{args.requests}次请求，并发{args.concurrency}，已知特征{args.known}条）")
+    print("=" * 80)
+
+    # HTTP（长连接复用）
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency)) as session:
+        extract_payload = {"image_type": "base64", "image": image_b64}
+        calc_payload = {
+            "current_embedding": base64.b64encode(current.tobytes()).decode("utf-8"),
+            "known_embeddings": [base64.b64encode(k.tobytes()).decode("utf-8") for k in known]
+        }
+
+        async def http_extract():
+            async with session.post(f"{http_url}/api/face/extract", json=extract_payload) as resp:
+                await resp.json()
+
+        async def http_calculate():
+            async with session.post(f"{http_url}/api/face/calculate", json=calc_payload) as resp:
+                await resp.json()
+
+        report("HTTP extract", *await run_concurrent(http_extract, args.requests, args.concurrency))
+        report("HTTP calculate", *await run_concurrent(http_calculate, args.requests, args.concurrency))
+
+    # gRPC
+    async with grpc.aio.insecure_channel(grpc_addr) as channel:
+        stub = pb2_grpc.FaceRecognitionStub(channel)
+        extract_req = pb2.ExtractRequest(request_id="bench", image=image_bytes)
+        calc_req = pb2.CalculateRequest(
+            request_id="bench",
+            current=pb2.Embedding(values=current.tolist()),
+            known=[pb2.Embedding(values=k.tolist()) for k in known]
+        )
+
+        async def grpc_extract():
+            await stub.Extract(extract_req)
+
+        async def grpc_calculate():
+            await stub.Calculate(calc_req)
+
+        report("gRPC extract", *await run_concurrent(grpc_extract, args.requests, args.concurrency))
+        report("gRPC calculate", *await run_concurrent(grpc_calculate, args.requests, args.concurrency))
+
+        # 双向流：单连接批量提交，测整体吞吐
+        for name, method, req in (
+            ("gRPC extract (stream)", stub.ExtractStream, extract_req),
+            ("gRPC calculate (stream)", stub.CalculateStream, calc_req),
+        ):
+            sent = {}
+            latencies = []
+
+            async def requests():
+                for i in range(args.requests):
+                    msg = type(req)()
+                    msg.CopyFrom(req)
+                    msg.request_id = str(i)
+                    sent[msg.request_id] = time.perf_counter()
+                    yield msg
+
+            begin = time.perf_counter()
+            async for resp in method(requests()):
+                latencies.append((time.perf_counter() - sent[resp.request_id]) * 1000)
+            report(name, latencies, time.perf_counter() - begin)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,7 @@
+import copy
+import logging
+import os
+import threading
 from pathlib import Path
 
 import yaml
@@ -8,32 +12,169 @@ ______________________________
    Time : 2025-11-01
 ______________________________
 """
+logger = logging.getLogger(__name__)
+
+# 配置项校验规则：键 -> (类型, 校验函数, 说明)
+_SCHEMA = {
+    "face_model.det_size": (list, lambda v: len(v) == 2 and all(isinstance(x, int) and x > 0 for x in v), "两个正整数"),
+    "face_model.name": (str, lambda v: len(v) > 0, "非空字符串"),
+    "face_model.threshold": ((int, float), lambda v: 0 <= v <= 1, "0~1之间的数值"),
+    "face_model.providers": (list, lambda v: len(v) > 0, "非空列表"),
+    "face_model.thread_pool_workers": (int, lambda v: v > 0, "正整数"),
+    "cpu_pool.workers": (int, lambda v: v > 0, "正整数"),
+    "server.port": (int, lambda v: 0 < v < 65536, "合法端口号"),
+    "rate_limit.extract": (str, lambda v: "/" in v, "限流表达式，如 10/second"),
+    "rate_limit.calculate": (str, lambda v: "/" in v, "限流表达式，如 10/second"),
+    "rate_limit.detect": (str, lambda v: "/" in v, "限流表达式，如 30/second"),
+    "rate_limit.gallery": (str, lambda v: "/" in v, "限流表达式，如 100/second"),
+    "reembed.batch_size": (int, lambda v: v > 0, "正整数"),
+    "reembed.interval_ms": ((int, float), lambda v: v >= 0, "非负数值"),
+    "embedding.format": (str, lambda v: v in ("raw", "float32", "float16", "int8"), "raw、float32、float16 或 int8"),
+    "motion_gate.min_area": ((int, float), lambda v: 0 <= v <= 1, "0~1之间的数值"),
+    "motion_gate.alpha": ((int, float), lambda v: 0 < v <= 1, "0~1之间的数值"),
+    "jobs.concurrency": (int, lambda v: v > 0, "正整数"),
+    "jobs.max_retries": (int, lambda v: v >= 0, "非负整数"),
+    "jobs.retry_backoff": ((int, float), lambda v: v > 0, "正数"),
+    "reembed.max_retries": (int, lambda v: v >= 0, "非负整数"),
+    "reembed.retry_backoff": ((int, float), lambda v: v > 0, "正数"),
+    "supervisor.workers": (int, lambda v: v > 0, "正整数"),
+    "supervisor.drain_timeout": ((int, float), lambda v: v >= 0, "非负数值"),
+    "profiling.sample_rate": ((int, float), lambda v: 0 <= v <= 1, "0~1之间的数值"),
+    "log.level": (str, lambda v: v.upper() in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"), "合法日志级别"),
+}
+
+# 需要重建模型才能生效的配置项（后台预热新模型后原子切换）
+MODEL_KEYS = ("face_model.det_size", "face_model.providers")
+# face_model.name 变更不自动切换，请通过 /admin/models/* 接口加载并切换
+# 需要重启服务才能生效的配置项
+RESTART_KEYS = (
+    "server", "cpu_pool.workers", "face_model.thread_pool_workers", "buffer_pool", "crop_store", "shm.enabled",
+    "shm.socket_path", "supervisor", "jobs.enabled", "jobs.data_dir", "jobs.max_running"
+)
+
+
+def _lookup(data, key, default=None):
+    """按点分路径读取嵌套字典"""
+    value = data
+    for k in key.split("."):
+        if isinstance(value, dict) and k in value:
+            value = value[k]
+        else:
+            return default
+    return value
+
+
+def _flatten(data, prefix=""):
+    """将嵌套字典展开为 {'a.b': value} 形式"""
+    items = {}
+    for k, v in (data or {}).items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            items.update(_flatten(v, key + "."))
+        else:
+            items[key] = v
+    return items
+
+
+def validate_config(data):
+    """校验配置内容，不合法时抛出ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError("配置文件格式错误：顶层必须是字典")
+    errors = []
+    for key, (types, check, desc) in _SCHEMA.items():
+        value = _lookup(data, key)
+        if value is None:
+            continue
+        if not isinstance(value, types) or not check(value):
+            errors.append(f"{key}={value!r}（应为{desc}）")
+    if _lookup(data, "crop_store.enabled", False) and not _lookup(data, "gallery.persist.enabled", False):
+        # 对齐人脸按人脸库的 (身份, 特征下标) 存储，人脸库不持久化时重启后会残留与身份对不上的旧数据
+        errors.append("crop_store.enabled 需要同时开启 gallery.persist.enabled")
+    if errors:
+        raise ValueError("配置校验失败：" + "；".join(errors))
+
+
 class Config:
-    """配置管理器，读取config.yaml并提供全局访问"""
+    """配置管理器，读取config.yaml并提供全局访问（支持热加载）"""
     _instance = None
     _config = None
+    _mtime = None
+    _listeners = []
+    _lock = threading.Lock()
+    config_path = Path(__file__).parent / "config.yaml"
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             # 加载配置文件
-            config_path = Path(__file__).parent / "config.yaml"
-            if not config_path.exists():
-                raise FileNotFoundError(f"配置文件不存在：{config_path}")
-            with open(config_path, "r", encoding="utf-8") as f:
-                cls._config = yaml.safe_load(f)
+            if not cls.config_path.exists():
+                raise FileNotFoundError(f"配置文件不存在：{cls.config_path}")
+            cls._config, cls._mtime = cls._load()
         return cls._instance
 
+    @classmethod
+    def _load(cls):
+        mtime = os.path.getmtime(cls.config_path)
+        with open(cls.config_path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f)
+        validate_config(data)
+        return data, mtime
+
     def get(self, key, default=None):
         """获取配置项（支持嵌套，如'mysql.host'）"""
-        keys = key.split(".")
-        value = self._config
-        for k in keys:
-            if isinstance(value, dict) and k in value:
-                value = value[k]
-            else:
-                return default
-        return value
+        return _lookup(self._config, key, default)
+
+    def subscribe(self, callback):
+        """注册配置变更回调，callback(changed: dict, old_config, new_config)"""
+        self._listeners.append(callback)
+
+    def is_modified(self):
+        """配置文件是否在上次加载后被修改"""
+        try:
+            return os.path.getmtime(self.config_path) != self._mtime
+        except OSError:
+            return False
+
+    def reload(self):
+        """重新加载配置文件，校验通过后原子替换并通知订阅者
+
+        返回变更项字典 {key: (旧值, 新值)}；校验失败时抛出ValueError，旧配置保持不变。
+        失败时同样记录该文件的修改时间，文件再次修改前 is_modified 为False（不会每个检查周期重复报错）
+        """
+        with self._lock:
+            try:
+                new_config, mtime = self._load()
+            except Exception:
+                try:
+                    Config._mtime = os.path.getmtime(self.config_path)
+                except OSError:
+                    pass
+                raise
+            old_config = self._config
+            old_flat, new_flat = _flatten(old_config), _flatten(new_config)
+            changed = {
+                k: (old_flat.get(k), new_flat.get(k))
+                for k in set(old_flat) | set(new_flat)
+                if old_flat.get(k) != new_flat.get(k)
+            }
+            Config._config = new_config
+            Config._mtime = mtime
+
+        if changed:
+            logger.info(f"🔄 配置已重新加载，变更项：{sorted(changed)}")
+            restart = [k for k in changed if k.startswith(RESTART_KEYS)]
+            if restart:
+                logger.warning(f"⚠️ 以下配置项需重启服务才能生效：{sorted(restart)}")
+            for callback in list(self._listeners):
+                try:
+                    callback(changed, old_config, new_config)
+                except Exception:
+                    logger.error("配置变更回调执行失败", exc_info=True)
+        return changed
+
+    def snapshot(self):
+        """返回当前配置的深拷贝"""
+        return copy.deepcopy(self._config)
 
 
 # 全局配置实例
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from config import config
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+logger = logging.getLogger(__name__)
+
+# CPU密集型任务线程池（图片解码、特征编解码、相似度计算），与模型推理线程池分离
+cpu_executor = ThreadPoolExecutor(
+    max_workers=config.get("cpu_pool.workers", 4),
+    thread_name_prefix="cpu_pool"
+)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """在CPU线程池中执行同步函数，避免阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, partial(func, *args, **kwargs))
+
+
+class LoopLagMonitor:
+    """事件循环延迟监控：定期sleep，统计实际唤醒时间与预期的偏差"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.total_lag_ms = 0.0
+        self.samples = 0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - start - self.interval) * 1000)
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self.total_lag_ms += lag_ms
+            self.samples += 1
+            if lag_ms > config.get("cpu_pool.lag_warn_ms", 100):
+                logger.warning(f"⚠️ 事件循环延迟过高：{lag_ms:.1f}ms")
+
+    def start(self):
+        """启动监控任务（需在事件循环内调用）"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """停止监控任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        """返回延迟统计（毫秒）"""
+        avg = self.total_lag_ms / self.samples if self.samples else 0.0
+        return {
+            "last_ms": round(self.last_lag_ms, 2),
+            "avg_ms": round(avg, 2),
+            "max_ms": round(self.max_lag_ms, 2),
+            "samples": self.samples
+        }
+
+
+# 全局事件循环延迟监控实例
+loop_monitor = LoopLagMonitor(interval=config.get("cpu_pool.lag_interval", 0.5))
@@ -0,0 +1,219 @@
+import glob
+import logging
+import os
+import struct
+import threading
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from config import config
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+logger = logging.getLogger(__name__)
+
+# 分块文件头：魔数 + 格式版本(u16)
+_MAGIC = b"FCRP"
+_FILE_HEADER = struct.Struct("<4sH")
+_FORMAT_VERSION = 1
+# 记录头：载荷长度(u32) + CRC32(u32)
+_HEADER = struct.Struct("<II")
+# 载荷头：操作(u8) + 身份ID长度(u16) + 特征下标(u32)
+_PAYLOAD = struct.Struct("<BHI")
+# 5点关键点（原图坐标，float32）
+_LANDMARKS = struct.Struct("<10f")
+
+OP_PUT = 1
+OP_DROP = 2
+
+# 对齐人脸尺寸（与ArcFace识别模型输入一致）
+CHIP_SIZE = 112
+_CHIP_BYTES = CHIP_SIZE * CHIP_SIZE * 3
+
+
+def _chunk_path(data_dir: str, chunk: int) -> str:
+    return os.path.join(data_dir, f"chunk-{chunk:06d}.bin")
+
+
+class CropStore:
+    """注册照片的5点关键点与对齐人脸（112×112 BGR）存储，重新处理时无需再次检测
+
+    数据按分块文件追加写（chunk-<编号>.bin，单块超过 chunk_mb 后切换新块），每条记录
+    为 关键点(40字节) + 原始像素(37632字节)，带CRC校验。键为 (身份ID, 人脸库中的特征下标)，
+    启动时扫描各块在内存中建立 (块编号, 偏移) 索引，读取时按偏移直接读取。
+    删除只追加删除记录；从最旧的块开始，全部记录均已失效的块会被删除回收空间。
+    """
+
+    def __init__(self, data_dir: str, chunk_mb: float = 64):
+        self.data_dir = data_dir
+        self.chunk_bytes = int(chunk_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._index = {}
+        self._live = {}
+        self._file = None
+        self._chunk = 0
+        os.makedirs(data_dir, exist_ok=True)
+        self._load_index()
+        self._open_chunk(self._chunk if self._chunk in self._live else self._chunk + 1)
+
+    # -------------------- 索引 --------------------
+    def _chunks(self):
+        return sorted(
+            int(os.path.basename(p)[6:12])
+            for p in glob.glob(os.path.join(self.data_dir, "chunk-*.bin"))
+        )
+
+    def _load_index(self):
+        for chunk in self._chunks():
+            path = _chunk_path(self.data_dir, chunk)
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < _FILE_HEADER.size or _FILE_HEADER.unpack_from(data)[0] != _MAGIC:
+                logger.warning(f"⚠️ 对齐人脸分块文件头无效，已跳过：{path}")
+                continue
+            self._live[chunk] = 0
+            self._chunk = chunk
+            pos = _FILE_HEADER.size
+            while pos + _HEADER.size <= len(data):
+                length, crc = _HEADER.unpack_from(data, pos)
+                start, end = pos + _HEADER.size, pos + _HEADER.size + length
+                if end > len(data) or zlib.crc32(data[start:end]) != crc:
+                    break
+                op, id_len, index = _PAYLOAD.unpack_from(data, start)
+                off = start + _PAYLOAD.size
+                identity_id = data[off:off + id_len].decode("utf-8")
+                if op == OP_PUT:
+                    self._set((identity_id, index), (chunk, off + id_len))
+                else:
+                    self._drop(identity_id)
+                pos = end
+            if pos < len(data):
+                logger.warning(f"⚠️ 对齐人脸分块尾部记录不完整，已截断：{path} @ {pos}")
+                os.truncate(path, pos)
+
+    def _set(self, key, location):
+        old = self._index.get(key)
+        if old is not None:
+            self._live[old[0]] -= 1
+        self._index[key] = location
+        self._live[location[0]] += 1
+
+    def _drop(self, identity_id: str) -> bool:
+        keys = [k for k in self._index if k[0] == identity_id]
+        for key in keys:
+            self._live[self._index.pop(key)[0]] -= 1
+        return bool(keys)
+
+    # -------------------- 写入 --------------------
+    def _open_chunk(self, chunk: int):
+        path = _chunk_path(self.data_dir, chunk)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(_FILE_HEADER.pack(_MAGIC, _FORMAT_VERSION))
+        self._chunk = chunk
+        self._live.setdefault(chunk, 0)
+
+    def _write(self, op: int, identity_id: str, index: int, body: bytes = b""):
+        if self._file.tell() >= self.chunk_bytes:
+            self._file.close()
+            self._open_chunk(self._chunk + 1)
+        id_bytes = identity_id.encode("utf-8")
+        payload = _PAYLOAD.pack(op, len(id_bytes), index) + id_bytes + body
+        offset = self._file.tell() + _HEADER.size + _PAYLOAD.size + len(id_bytes)
+        self._file.write(_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        return self._chunk, offset
+
+    def _reclaim(self):
+        """删除最旧的、记录已全部失效的分块（按顺序删除，保证删除记录的语义不丢失）"""
+        for chunk in sorted(self._live):
+            if chunk == self._chunk or self._live[chunk] > 0:
+                return
+            os.remove(_chunk_path(self.data_dir, chunk))
+            del self._live[chunk]
+
+    def put(self, identity_id: str, index: int, chip: np.ndarray, landmarks: np.ndarray):
+        """保存身份第index张特征对应的对齐人脸及原图5点关键点"""
+        chip = np.ascontiguousarray(chip, dtype=np.uint8)
+        if chip.shape != (CHIP_SIZE, CHIP_SIZE, 3):
+            raise ValueError(f"对齐人脸尺寸应为 {CHIP_SIZE}x{CHIP_SIZE}x3，实际为 {chip.shape}")
+        body = _LANDMARKS.pack(*np.asarray(landmarks, dtype=np.float32).reshape(10)) + chip.tobytes()
+        with self._lock:
+            self._set((identity_id, index), self._write(OP_PUT, identity_id, index, body))
+            self._reclaim()
+
+    def remove(self, identity_id: str):
+        """删除身份的全部对齐人脸"""
+        with self._lock:
+            if self._drop(identity_id):
+                self._write(OP_DROP, identity_id, 0)
+                self._reclaim()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    # -------------------- 读取 --------------------
+    def get(self, identity_id: str, index: int) -> Optional[tuple]:
+        """返回 (对齐人脸, 5点关键点)，不存在时返回None"""
+        with self._lock:
+            location = self._index.get((identity_id, index))
+            if location is None:
+                return None
+        chunk, offset = location
+        try:
+            with open(_chunk_path(self.data_dir, chunk), "rb") as f:
+                f.seek(offset)
+                data = f.read(_LANDMARKS.size + _CHIP_BYTES)
+        except FileNotFoundError:
+            # 读取期间身份被删除且分块已回收
+            return None
+        landmarks = np.array(_LANDMARKS.unpack_from(data), dtype=np.float32).reshape(5, 2)
+        chip = np.frombuffer(data, dtype=np.uint8, offset=_LANDMARKS.size).reshape(CHIP_SIZE, CHIP_SIZE, 3)
+        return chip, landmarks
+
+    def indices(self, identity_id: str) -> list:
+        """身份已保存对齐人脸的特征下标"""
+        with self._lock:
+            return sorted(i for k, i in self._index if k == identity_id)
+
+    def keys(self) -> list:
+        """全部 (身份ID, 特征下标)，供阈值标定等离线工具遍历"""
+        with self._lock:
+            return sorted(self._index)
+
+    def stats(self) -> dict:
+        with self._lock:
+            chunks = list(self._live)
+            chips = len(self._index)
+        size = sum(os.path.getsize(_chunk_path(self.data_dir, c)) for c in chunks)
+        return {
+            "chips": chips,
+            "chunks": len(chunks),
+            "file_mb": round(size / 1024 / 1024, 2),
+        }
+
+
+def _create_crop_store():
+    """按配置创建全局对齐人脸存储（未启用时为None）"""
+    if not config.get("crop_store.enabled", False):
+        return None
+    data_dir = config.get("crop_store.data_dir", "data/crops")
+    if not os.path.isabs(data_dir):
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        data_dir = os.path.join(project_root, data_dir)
+    # 分片部署时每个分片使用独立目录
+    shard_index = os.environ.get("FACE_SHARD_INDEX")
+    if shard_index is not None:
+        data_dir = os.path.join(data_dir, f"shard-{shard_index}")
+    return CropStore(data_dir, chunk_mb=config.get("crop_store.chunk_mb", 64))
+
+
+# 全局对齐人脸存储
+crop_store = _create_crop_store()
@@ -1,8 +1,12 @@
 import base64
 import logging
-from typing import List
+import struct
+from typing import List, Optional, Tuple
 import numpy as np
 import torch
+
+from config import config
+from core.cpu_pool import run_cpu
 """
 ______________________________
   Author: wen_l
@@ -12,28 +16,125 @@ ______________________________
 logger = logging.getLogger(__name__)
 
 # 特征向量编解码（供Java端存储使用）
-async def encode_embedding(embedding: np.ndarray) -> str:
-    """将numpy特征向量转为base64字符串（供Java存储）"""
+# 旧格式：base64(float32原始字节)，带模型版本时为 "<模型版本>:<base64>"（':' 不在base64字符集中，可与旧格式区分）
+# 紧凑格式：base64(头部 + 载荷)，头部为 魔数 "FEMB" | 格式版本 | 数据类型 | 维度 | 模型ID长度 | 模型ID，
+#   int8 载荷前附 float32 缩放系数（按向量最大绝对值对称量化）；模型ID即模型版本，无需再加前缀
+_MAGIC = b"FEMB"
+_WIRE_VERSION = 1
+_HEADER = struct.Struct("<4sBBHB")
+_SCALE = struct.Struct("<f")
+_DTYPES = {"float32": 0, "float16": 1, "int8": 2}
+_DTYPE_CODES = {0: np.float32, 1: np.float16, 2: np.int8}
+
+def _pack_embedding(embedding: np.ndarray, dtype: str, version: Optional[str]) -> bytes:
+    """按紧凑格式打包特征向量（头部 + 载荷）"""
+    vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    model_id = (version or "").encode("utf-8")
+    if len(model_id) > 255:
+        raise ValueError(f"模型ID过长：{version}")
+    header = _HEADER.pack(_MAGIC, _WIRE_VERSION, _DTYPES[dtype], vec.shape[0], len(model_id)) + model_id
+    if dtype == "int8":
+        scale = float(np.abs(vec).max()) / 127.0 or 1.0
+        payload = np.round(vec / scale).clip(-127, 127).astype(np.int8)
+        return header + _SCALE.pack(scale) + payload.tobytes()
+    return header + vec.astype(_DTYPE_CODES[_DTYPES[dtype]]).tobytes()
+
+def _unpack_embedding(raw: bytes) -> Optional[Tuple[Optional[str], np.ndarray]]:
+    """解析紧凑格式，返回 (模型ID, float32特征向量)；不是紧凑格式（旧版无头部）时返回None"""
+    if len(raw) < _HEADER.size or raw[:4] != _MAGIC:
+        return None
+    _, wire_version, code, dim, id_len = _HEADER.unpack_from(raw)
+    if code not in _DTYPE_CODES:
+        return None
+    offset = _HEADER.size + id_len
+    scaled = code == _DTYPES["int8"]
+    item_size = np.dtype(_DTYPE_CODES[code]).itemsize
+    # 长度与头部声明不一致时按旧格式处理（float32原始字节恰好以魔数开头的情况）
+    if len(raw) != offset + (_SCALE.size if scaled else 0) + dim * item_size:
+        return None
+    if wire_version != _WIRE_VERSION:
+        raise ValueError(f"不支持的特征格式版本：{wire_version}")
+    model_id = raw[_HEADER.size:offset].decode("utf-8") or None
+    if scaled:
+        (scale,) = _SCALE.unpack_from(raw, offset)
+        offset += _SCALE.size
+        vec = np.frombuffer(raw, dtype=np.int8, offset=offset).astype(np.float32) * scale
+    else:
+        vec = np.frombuffer(raw, dtype=_DTYPE_CODES[code], offset=offset).astype(np.float32)
+    return model_id, vec
+
+def _encode_embedding(embedding: np.ndarray, version: Optional[str] = None, wire_format: Optional[str] = None) -> str:
+    """将numpy特征向量转为base64字符串（同步版本）
+
+    wire_format 默认取 embedding.format：raw 为旧格式（纯base64，仅 embedding.version_tag 开启时附加模型版本前缀），
+    float32 / float16 / int8 为带头部的紧凑格式（模型版本始终写入头部）
+    """
+    wire_format = wire_format or config.get("embedding.format", "raw")
+    if wire_format == "raw":
+        encoded = base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("utf-8")
+        return f"{version}:{encoded}" if version and config.get("embedding.version_tag", False) else encoded
+    if wire_format not in _DTYPES:
+        raise ValueError(f"不支持的特征格式：{wire_format}")
+    return base64.b64encode(_pack_embedding(embedding, wire_format, version)).decode("utf-8")
+
+def _parse_embedding(embedding_str: str) -> Tuple[Optional[str], np.ndarray]:
+    """解析特征字符串，返回 (模型版本, float32特征向量)；自动识别紧凑格式与旧格式，旧格式无版本前缀时版本为None"""
+    version, sep, encoded = embedding_str.rpartition(":")
+    version = (version or None) if sep else None
+    raw = base64.b64decode(encoded)
+    packed = _unpack_embedding(raw)
+    if packed is not None:
+        return packed[0] or version, packed[1]
+    if len(raw) % 4:
+        raise ValueError("特征数据长度无效")
+    return version, np.frombuffer(raw, dtype=np.float32)
+
+def _parse_embeddings(embedding_strs: List[str]) -> List[Tuple[Optional[str], np.ndarray]]:
+    """批量解析特征字符串（同步版本）"""
+    return [_parse_embedding(s) for s in embedding_strs]
+
+def _cosine_similarity(known_encodings: List[np.ndarray], current_encoding: np.ndarray) -> np.ndarray:
+    """计算余弦相似度（同步版本）"""
+    with torch.no_grad():
+        known = torch.from_numpy(np.asarray(known_encodings, dtype=np.float32))
+        current = torch.from_numpy(np.asarray(current_encoding, dtype=np.float32))
+        known_norm = torch.linalg.norm(known, dim=1)
+        current_norm = torch.linalg.norm(current)
+        return (torch.matmul(known, current) / (known_norm * current_norm)).numpy()
+
+async def encode_embedding(embedding: np.ndarray, version: Optional[str] = None,
+                           wire_format: Optional[str] = None) -> str:
+    """将numpy特征向量转为base64字符串（供Java存储），version 为产生特征的模型版本"""
     try:
-        return base64.b64encode(embedding.tobytes()).decode("utf-8")
+        return await run_cpu(_encode_embedding, embedding, version, wire_format)
     except Exception as e:
         logger.error("特征向量编码失败", exc_info=True)
         raise
 
-async def decode_embedding(embedding_str: str) -> np.ndarray:
-    """将base64字符串转回numpy特征向量（用于相似度计算）"""
+async def parse_embeddings(embedding_strs: List[str]) -> List[Tuple[Optional[str], np.ndarray]]:
+    """批量解析特征字符串，返回 (模型版本, 特征向量) 列表"""
     try:
-        return np.frombuffer(base64.b64decode(embedding_str), dtype=np.float32)
+        return await run_cpu(_parse_embeddings, embedding_strs)
     except Exception as e:
         logger.error("特征向量解码失败", exc_info=True)
         raise
 
+def versions_compatible(versions) -> bool:
+    """一组特征的模型版本是否可以相互比较（未带版本的旧特征不参与判断）"""
+    return len({v for v in versions if v is not None}) <= 1
+
+def resolve_versions(versions: List[Optional[str]], declared: Optional[str], active: str) -> List[Optional[str]]:
+    """补全相似度计算请求中未带版本的特征（versions[0] 为当前特征，其余为已知特征）
+
+    默认的纯base64特征不带版本，versions_compatible 无从判断；请求声明了 model_version
+    （已知特征由哪个模型提取，即提取接口返回的 model_version）时，未带版本的已知特征视为该版本，
+    未带版本的当前特征视为当前主模型刚提取的特征。未声明时保持旧行为，不参与校验
+    """
+    if not declared:
+        return list(versions)
+    return [versions[0] or active] + [v or declared for v in versions[1:]]
+
 # 相似度计算核心逻辑
 async def cosine_similarity(known_encodings: List[np.ndarray], current_encoding: np.ndarray) -> np.ndarray:
-    """计算余弦相似度（CPU版）"""
-    with torch.no_grad():
-        known = torch.tensor(known_encodings, dtype=torch.float32)
-        current = torch.tensor(current_encoding, dtype=torch.float32)
-        known_norm = torch.linalg.norm(known, dim=1)
-        current_norm = torch.linalg.norm(current)
-        return (torch.matmul(known, current) / (known_norm * current_norm)).numpy()
\ No newline at end of file
+    """计算余弦相似度（CPU版，在CPU线程池中执行）"""
+    return await run_cpu(_cosine_similarity, known_encodings, current_encoding)
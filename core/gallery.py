@@ -0,0 +1,400 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import config
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vec: np.ndarray) -> np.ndarray:
+    vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        raise ValueError("特征向量为零向量")
+    return vec / norm
+
+
+def _medoids(embeddings: np.ndarray, k: int) -> np.ndarray:
+    """贪心选取k个代表样本：先取最接近整体中心的样本，再依次取与已选样本最不相似的样本"""
+    if len(embeddings) <= k:
+        return embeddings
+    sims = embeddings @ embeddings.T
+    chosen = [int(np.argmax(sims.mean(axis=1)))]
+    while len(chosen) < k:
+        # 与已选样本的最大相似度越小越好（覆盖更多姿态/光照）
+        coverage = sims[:, chosen].max(axis=1)
+        coverage[chosen] = np.inf
+        chosen.append(int(np.argmin(coverage)))
+    return embeddings[chosen]
+
+
+def _compatible(a: Optional[str], b: Optional[str]) -> bool:
+    """模型版本是否可比较（未标记版本的旧特征视为兼容）"""
+    return a is None or b is None or a == b
+
+
+class _Identity:
+    """单个身份的全部注册特征及对应模型版本，sums/counts 为各版本特征的累加和与数量（增量更新均值模板）
+
+    generation 在身份创建时分配（人脸库内单调递增），身份删除后重新注册会得到新的值，
+    用于识别按 (身份, 下标) 记录的特征是否已失效
+    """
+    __slots__ = ("embeddings", "versions", "sums", "counts", "generation")
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.embeddings: List[np.ndarray] = []
+        self.versions: List[Optional[str]] = []
+        self.sums: Dict[Optional[str], np.ndarray] = {}
+        self.counts: Dict[Optional[str], int] = {}
+
+    def add(self, vec: np.ndarray, version: Optional[str]):
+        self.embeddings.append(vec)
+        self.versions.append(version)
+        self._accumulate(vec, version, 1)
+
+    def set(self, index: int, vec: np.ndarray, version: Optional[str]) -> Optional[str]:
+        """替换第index张特征，返回原模型版本"""
+        old = self.versions[index]
+        self._accumulate(self.embeddings[index], old, -1)
+        self._accumulate(vec, version, 1)
+        self.embeddings[index] = vec
+        self.versions[index] = version
+        return old
+
+    def _accumulate(self, vec: np.ndarray, version: Optional[str], sign: int):
+        total = self.sums.get(version)
+        self.sums[version] = vec * sign if total is None else total + vec * sign
+        self.counts[version] = self.counts.get(version, 0) + sign
+
+
+class _TemplateTable:
+    """同一模型版本的模板矩阵，形状为 (容量, 1 + exemplars, dim)，owners 为各行所属身份的全局编号"""
+
+    def __init__(self, width: int, dim: int):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.templates = np.zeros((16, width, dim), dtype=np.float32)
+        self.owners = np.zeros(16, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def put_centroid(self, identity_id: str, owner: int, centroid: np.ndarray):
+        """更新身份的均值模板；新加入的行用均值模板填充代表样本槽位，等待延迟计算"""
+        idx = self.index.get(identity_id)
+        if idx is None:
+            self.put(identity_id, owner, np.broadcast_to(centroid, self.templates.shape[1:]))
+        else:
+            self.templates[idx, 0] = centroid
+
+    def put(self, identity_id: str, owner: int, row: np.ndarray):
+        idx = self.index.get(identity_id)
+        if idx is None:
+            idx = len(self.ids)
+            if idx >= len(self.templates):
+                grown = np.zeros((len(self.templates) * 2,) + self.templates.shape[1:], dtype=np.float32)
+                grown[:idx] = self.templates[:idx]
+                self.templates = grown
+                self.owners = np.resize(self.owners, len(grown))
+            self.ids.append(identity_id)
+            self.index[identity_id] = idx
+        self.templates[idx] = row
+        self.owners[idx] = owner
+
+    def drop(self, identity_id: str):
+        """删除身份的模板行（与末尾行交换后收缩）"""
+        idx = self.index.pop(identity_id)
+        last = len(self.ids) - 1
+        if idx != last:
+            moved = self.ids[last]
+            self.templates[idx] = self.templates[last]
+            self.owners[idx] = self.owners[last]
+            self.ids[idx] = moved
+            self.index[moved] = idx
+        self.ids.pop()
+        self.templates[last] = 0
+
+
+class Gallery:
+    """人脸库：维护每个身份的聚合模板，先比模板再对候选身份逐一重排
+
+    模板按模型版本分表构建（不同模型的特征不在同一向量空间，不能平均），每行形状为
+    (1 + exemplars, dim)，第0个槽位为归一化均值模板，其余槽位为代表样本（不足时以均值模板填充）。
+    模型迁移期间同一身份可能同时出现在新旧两个版本的表中。
+
+    均值模板由每个 (身份, 版本) 的特征累加和增量更新，注册一张特征为 O(dim)；代表样本选取
+    为 O(n²) 且只影响粗排，注册时只标记为待更新，在下一次检索前统一重算。
+    """
+
+    def __init__(self, dim: int = 512, exemplars: int = 2, shortlist: int = 20):
+        self.dim = dim
+        self.exemplars = exemplars
+        self.shortlist = shortlist
+        self._lock = threading.RLock()
+        self._identities: Dict[str, _Identity] = {}
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._tables: Dict[Optional[str], _TemplateTable] = {}
+        self._dirty = set()  # 代表样本待重算的 (identity_id, version)
+        self._generation = 0
+
+    def _identity(self, identity_id: str) -> _Identity:
+        """取身份，不存在时创建（需持有锁）"""
+        ident = self._identities.get(identity_id)
+        if ident is None:
+            self._generation += 1
+            ident = self._identities[identity_id] = _Identity(self._generation)
+        return ident
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def embedding_count(self) -> int:
+        with self._lock:
+            return sum(len(ident.embeddings) for ident in self._identities.values())
+
+    def _slot(self, identity_id: str) -> int:
+        idx = self._index.get(identity_id)
+        if idx is None:
+            idx = len(self._ids)
+            self._ids.append(identity_id)
+            self._index[identity_id] = idx
+        return idx
+
+    def _refresh_template(self, identity_id: str, versions):
+        """用累加和更新该身份在指定版本上的均值模板（O(dim)），代表样本标记为待重算；
+        已没有该版本特征时从对应的表中移除
+        """
+        ident = self._identities[identity_id]
+        owner = self._slot(identity_id)
+        for version in set(versions):
+            if not ident.counts.get(version):
+                ident.sums.pop(version, None)
+                ident.counts.pop(version, None)
+                self._dirty.discard((identity_id, version))
+                self._drop_table_row(version, identity_id)
+                continue
+            table = self._tables.get(version)
+            if table is None:
+                table = self._tables[version] = _TemplateTable(1 + self.exemplars, self.dim)
+            table.put_centroid(identity_id, owner, _normalize(ident.sums[version]))
+            if self.exemplars > 0:
+                self._dirty.add((identity_id, version))
+
+    def _refresh_exemplars(self):
+        """重算待更新身份的代表样本（检索前调用，需持有锁）"""
+        for identity_id, version in self._dirty:
+            ident = self._identities.get(identity_id)
+            table = self._tables.get(version)
+            if ident is None or table is None or identity_id not in table.index:
+                continue
+            vecs = np.stack([vec for vec, v in zip(ident.embeddings, ident.versions) if v == version])
+            exemplars = _medoids(vecs, self.exemplars)
+            row = table.templates[table.index[identity_id]]
+            row[1:] = row[0]
+            row[1:1 + len(exemplars)] = exemplars
+        self._dirty.clear()
+
+    def _drop_table_row(self, version: Optional[str], identity_id: str):
+        table = self._tables.get(version)
+        if table is not None and identity_id in table.index:
+            table.drop(identity_id)
+            if not len(table):
+                del self._tables[version]
+
+    def _drop_templates(self, identity_id: str):
+        for version in list(self._tables):
+            self._drop_table_row(version, identity_id)
+            self._dirty.discard((identity_id, version))
+
+    def _check(self, embedding: np.ndarray) -> np.ndarray:
+        vec = _normalize(embedding)
+        if vec.shape[0] != self.dim:
+            raise ValueError(f"特征维度不匹配：{vec.shape[0]}，应为{self.dim}")
+        return vec
+
+    def enroll(self, identity_id: str, embedding: np.ndarray, version: Optional[str] = None) -> int:
+        """为身份追加一张注册特征，增量更新模板，返回该身份的特征数"""
+        vec = self._check(embedding)
+        with self._lock:
+            ident = self._identity(identity_id)
+            ident.add(vec, version)
+            self._refresh_template(identity_id, [version])
+            return len(ident.embeddings)
+
+    def enroll_many(self, identity_id: str, embeddings) -> int:
+        """批量注册 (模型版本, 特征) 序列：先校验全部特征（维度、零向量），任一不合法时抛出ValueError
+        且不修改人脸库；返回该身份的特征数
+        """
+        items = [(version, self._check(embedding)) for version, embedding in embeddings]
+        with self._lock:
+            ident = self._identity(identity_id)
+            for version, vec in items:
+                ident.add(vec, version)
+            self._refresh_template(identity_id, [version for version, _ in items])
+            return len(ident.embeddings)
+
+    def replace(self, identity_id: str, index: int, embedding: np.ndarray, version: Optional[str],
+                expected_generation: Optional[int] = None) -> bool:
+        """替换身份的第index张特征（重新提取后更新版本），返回是否成功
+
+        expected_generation 非空时，身份已被删除并重新注册（generation 不同）则不替换
+        """
+        vec = self._check(embedding)
+        with self._lock:
+            if not self.replaceable(identity_id, index, expected_generation):
+                return False
+            old = self._identities[identity_id].set(index, vec, version)
+            self._refresh_template(identity_id, [old, version])
+            return True
+
+    def replaceable(self, identity_id: str, index: int, expected_generation: Optional[int] = None) -> bool:
+        """身份的第index张特征是否存在，且身份未在 expected_generation 之后被重新创建"""
+        with self._lock:
+            ident = self._identities.get(identity_id)
+            if ident is None or index >= len(ident.embeddings):
+                return False
+            return expected_generation is None or ident.generation == expected_generation
+
+    def remove(self, identity_id: str) -> bool:
+        """删除身份（与末尾槽位交换后收缩）"""
+        with self._lock:
+            if identity_id not in self._identities:
+                return False
+            del self._identities[identity_id]
+            self._drop_templates(identity_id)
+            idx = self._index.pop(identity_id)
+            last = len(self._ids) - 1
+            if idx != last:
+                moved = self._ids[last]
+                self._ids[idx] = moved
+                self._index[moved] = idx
+                for table in self._tables.values():
+                    row = table.index.get(moved)
+                    if row is not None:
+                        table.owners[row] = idx
+            self._ids.pop()
+            return True
+
+    def load(self, records):
+        """批量加载 (identity_id, embedding, version) 序列，每个身份只构建一次模板（用于启动恢复）"""
+        with self._lock:
+            touched = set()
+            for identity_id, embedding, version in records:
+                vec = _normalize(embedding)
+                ident = self._identity(identity_id)
+                ident.add(vec, version)
+                touched.add(identity_id)
+            for identity_id in touched:
+                self._refresh_template(identity_id, self._identities[identity_id].counts)
+
+    def items(self):
+        """按身份展开全部特征，返回 (身份ID列表, 特征矩阵, 模型版本列表)"""
+        with self._lock:
+            ids, rows, versions = [], [], []
+            for identity_id, ident in self._identities.items():
+                ids.extend([identity_id] * len(ident.embeddings))
+                rows.extend(ident.embeddings)
+                versions.extend(ident.versions)
+        matrix = np.stack(rows) if rows else np.zeros((0, self.dim), dtype=np.float32)
+        return ids, matrix, versions
+
+    def stale(self, version: str) -> List[tuple]:
+        """列出模型版本不等于 version 的特征 (identity_id, index, generation)"""
+        with self._lock:
+            return [
+                (identity_id, i, ident.generation)
+                for identity_id, ident in self._identities.items()
+                for i, v in enumerate(ident.versions)
+                if v != version
+            ]
+
+    def version_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for ident in self._identities.values():
+                for v in ident.versions:
+                    key = v or "unknown"
+                    counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def get(self, identity_id: str) -> Optional[List[np.ndarray]]:
+        with self._lock:
+            ident = self._identities.get(identity_id)
+            return list(ident.embeddings) if ident is not None else None
+
+    def search(self, probe: np.ndarray, top_k: int = 5, shortlist: Optional[int] = None,
+               version: Optional[str] = None) -> List[dict]:
+        """两阶段检索：模板粗排取候选身份，再用各自全部特征精排（取最大相似度）
+
+        version 非空时粗排只用同版本（及未标记版本）的模板表，精排只比较同版本的特征
+        （模型迁移期间旧特征不参与打分）；同一身份出现在多个表中时取最高模板分。
+        version 为空时比较全部版本，接口层对未标记版本的探针传入当前主模型版本
+        """
+        query = _normalize(probe)
+        shortlist = max(shortlist or self.shortlist, top_k)
+        with self._lock:
+            if self._dirty:
+                self._refresh_exemplars()
+            n = len(self._ids)
+            tables = [t for v, t in self._tables.items() if _compatible(version, v)]
+            if n == 0 or not tables:
+                return []
+            template_scores = np.full(n, -np.inf, dtype=np.float32)
+            for table in tables:
+                m = len(table)
+                np.maximum.at(template_scores, table.owners[:m], (table.templates[:m] @ query).max(axis=1))
+            n = int(np.isfinite(template_scores).sum())
+            if n == 0:
+                return []
+            if n > shortlist:
+                candidates = np.argpartition(-template_scores, shortlist - 1)[:shortlist]
+            else:
+                candidates = np.flatnonzero(np.isfinite(template_scores))
+            results = []
+            for idx in candidates:
+                identity_id = self._ids[idx]
+                ident = self._identities[identity_id]
+                usable = [i for i, v in enumerate(ident.versions) if _compatible(version, v)]
+                if not usable:
+                    continue
+                scores = np.stack([ident.embeddings[i] for i in usable]) @ query
+                pos = int(np.argmax(scores))
+                best = usable[pos]
+                results.append({
+                    "identity_id": identity_id,
+                    "score": float(scores[pos]),
+                    "template_score": float(template_scores[idx]),
+                    "best_index": best,
+                })
+        results.sort(key=lambda r: r["score"], reverse=True)
+        return results[:top_k]
+
+    def stats(self) -> dict:
+        n = len(self)
+        count = self.embedding_count
+        return {
+            "identities": n,
+            "embeddings": count,
+            "avg_per_identity": round(count / n, 2) if n else 0.0,
+            "model_versions": self.version_counts(),
+        }
+
+
+# 全局人脸库实例
+gallery = Gallery(
+    dim=config.get("gallery.dim", 512),
+    exemplars=config.get("gallery.exemplars", 2),
+    shortlist=config.get("gallery.shortlist", 20)
+)
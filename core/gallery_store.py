@@ -0,0 +1,330 @@
+import glob
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+import numpy as np
+
+from config import config
+from core.gallery import gallery
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+logger = logging.getLogger(__name__)
+
+# 记录头：载荷长度(u32) + CRC32(u32)
+_HEADER = struct.Struct("<II")
+# 载荷头：序号(u64) + 操作(u8) + 身份ID长度(u16) + 特征维度(u32)
+_PAYLOAD = struct.Struct("<QBHI")
+
+# 带模型版本的记录附加尾部：特征下标(u32) + 版本长度(u16) + 版本字符串
+_EXTRA = struct.Struct("<IH")
+
+OP_ENROLL = 1
+OP_REMOVE = 2
+OP_ENROLL_V = 3
+OP_REPLACE = 4
+
+# 段切换标记（由写线程处理，保证与普通记录顺序一致）
+_ROTATE = object()
+
+
+def _encode_record(seq: int, op: int, identity_id: str, embedding=None, index: int = 0, version=None) -> bytes:
+    id_bytes = identity_id.encode("utf-8")
+    emb_bytes = b"" if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes()
+    payload = _PAYLOAD.pack(seq, op, len(id_bytes), len(emb_bytes) // 4) + id_bytes + emb_bytes
+    if op in (OP_ENROLL_V, OP_REPLACE):
+        ver_bytes = (version or "").encode("utf-8")
+        payload += _EXTRA.pack(index, len(ver_bytes)) + ver_bytes
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_records(path: str):
+    """逐条读取WAL段，遇到不完整或校验失败的尾部记录即停止（崩溃时的半写记录）
+
+    产出 (序号, 操作, 身份ID, 特征, 特征下标, 模型版本, 记录结束偏移)；
+    旧格式记录（OP_ENROLL）的特征下标为0、模型版本为None
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + _HEADER.size <= len(data):
+        length, crc = _HEADER.unpack_from(data, pos)
+        start, end = pos + _HEADER.size, pos + _HEADER.size + length
+        if end > len(data) or zlib.crc32(data[start:end]) != crc:
+            logger.warning(f"⚠️ WAL尾部记录不完整，已忽略：{path} @ {pos}")
+            return
+        seq, op, id_len, dim = _PAYLOAD.unpack_from(data, start)
+        off = start + _PAYLOAD.size
+        identity_id = data[off:off + id_len].decode("utf-8")
+        off += id_len
+        embedding = np.frombuffer(data, dtype=np.float32, count=dim, offset=off) if dim else None
+        off += dim * 4
+        index, version = 0, None
+        if op in (OP_ENROLL_V, OP_REPLACE):
+            index, ver_len = _EXTRA.unpack_from(data, off)
+            off += _EXTRA.size
+            version = data[off:off + ver_len].decode("utf-8") or None
+        yield seq, op, identity_id, embedding, index, version, end
+        pos = end
+
+
+class GalleryStore:
+    """人脸库持久化：追加写WAL（组提交fsync）+ 定期快照压缩 + 启动时快照加WAL尾部回放
+
+    目录结构：
+      snapshot.npz              身份ID数组、特征矩阵、模型版本数组、快照对应的序号
+      wal-<起始序号>.log         WAL段，快照后切换新段并删除已覆盖的旧段
+    """
+
+    def __init__(self, gallery, data_dir: str, group_commit_ms: float = 5, max_batch: int = 1024):
+        self.gallery = gallery
+        self.data_dir = data_dir
+        self.group_commit = group_commit_ms / 1000
+        self.max_batch = max_batch
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._file = None
+        self._writer = None
+        os.makedirs(data_dir, exist_ok=True)
+
+    # -------------------- 恢复 --------------------
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.data_dir, "wal-*.log")))
+
+    def recover(self) -> dict:
+        """加载快照并回放其后的WAL记录，返回恢复统计"""
+        start = time.perf_counter()
+        snapshot_path = os.path.join(self.data_dir, "snapshot.npz")
+        loaded = replayed = 0
+        if os.path.exists(snapshot_path):
+            with np.load(snapshot_path, allow_pickle=False) as snap:
+                ids, matrix = snap["ids"].tolist(), snap["embeddings"]
+                self.snapshot_seq = int(snap["seq"])
+                # 旧快照没有版本数组，按未知版本加载
+                versions = snap["versions"].tolist() if "versions" in snap.files else [""] * len(ids)
+            self.gallery.load(zip(ids, matrix, [v or None for v in versions]))
+            loaded = len(ids)
+        self.seq = self.snapshot_seq
+
+        pending = []
+        for path in self._segments():
+            valid_end = 0
+            for seq, op, identity_id, embedding, index, version, valid_end in _read_records(path):
+                if seq <= self.snapshot_seq:
+                    continue
+                if op in (OP_ENROLL, OP_ENROLL_V):
+                    pending.append((identity_id, embedding, version))
+                else:
+                    # 删除/替换前先批量加载已累积的注册记录，保证顺序语义
+                    if pending:
+                        self.gallery.load(pending)
+                        pending = []
+                    if op == OP_REPLACE:
+                        self.gallery.replace(identity_id, index, embedding, version)
+                    else:
+                        self.gallery.remove(identity_id)
+                self.seq = seq
+                replayed += 1
+            if valid_end < os.path.getsize(path):
+                # 截掉半写的尾部记录，避免后续追加的记录无法被读取
+                os.truncate(path, valid_end)
+        if pending:
+            self.gallery.load(pending)
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"✅ 人脸库恢复完成：快照{loaded}条，WAL回放{replayed}条，耗时{elapsed * 1000:.1f}ms")
+        return {"snapshot_records": loaded, "wal_records": replayed, "elapsed_ms": round(elapsed * 1000, 2)}
+
+    # -------------------- 写入 --------------------
+    def _open_segment(self, first_seq: int):
+        path = os.path.join(self.data_dir, f"wal-{first_seq:020d}.log")
+        self._file = open(path, "ab")
+
+    def start(self):
+        """启动WAL写线程（需在 recover 之后调用）"""
+        if self._writer is None:
+            self._open_segment(self.seq + 1)
+            self._writer = threading.Thread(target=self._write_loop, name="gallery_wal", daemon=True)
+            self._writer.start()
+
+    def close(self):
+        """停止写线程，刷盘并关闭当前段"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # 组提交：合并已排队的记录为一次fsync，队列取空即刷盘（不空等）；
+            # 持续写入时单批最多收集 group_commit 窗口或 max_batch 条，限制首条记录的等待时间
+            deadline = time.perf_counter() + self.group_commit
+            while len(batch) < self.max_batch and time.perf_counter() < deadline:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._queue.put(None)
+                    break
+                batch.append(nxt)
+            self._flush(batch)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def _flush(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            for record, future in batch:
+                if record is _ROTATE:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._file.close()
+                    self._open_segment(future.first_seq)
+                else:
+                    self._file.write(record)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            logger.error("❌ WAL写入失败", exc_info=True)
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future in futures:
+            future.set_result(True)
+
+    def _append(self, op: int, identity_id: str, embedding, apply, index: int = 0, version=None):
+        # 在同一把锁内修改内存、分配序号和入队，保证内存状态与WAL顺序一致
+        future = Future()
+        with self._lock:
+            result = apply()
+            self.seq += 1
+            record = _encode_record(self.seq, op, identity_id, embedding, index, version)
+            self._queue.put((record, future))
+        return result, future
+
+    def enroll(self, identity_id: str, embedding, version=None):
+        """注册特征：更新内存并追加WAL，返回 (该身份特征数, fsync后完成的Future)"""
+        return self._append(
+            OP_ENROLL if version is None else OP_ENROLL_V, identity_id, embedding,
+            apply=lambda: self.gallery.enroll(identity_id, embedding, version),
+            version=version
+        )
+
+    def enroll_many(self, identity_id: str, embeddings):
+        """批量注册 (模型版本, 特征) 序列：同一把锁内更新内存并编码全部记录，作为一个队列项写入，
+        共用一次写入和fsync（崩溃后不会只恢复出其中一部分）；返回 (该身份特征数, fsync后完成的Future)
+        """
+        embeddings = list(embeddings)
+        future = Future()
+        with self._lock:
+            # 人脸库先校验全部特征，任一不合法时不修改内存也不写WAL
+            count = self.gallery.enroll_many(identity_id, embeddings)
+            records = []
+            for version, embedding in embeddings:
+                self.seq += 1
+                op = OP_ENROLL if version is None else OP_ENROLL_V
+                records.append(_encode_record(self.seq, op, identity_id, embedding, version=version))
+            self._queue.put((b"".join(records), future))
+        return count, future
+
+    def replace(self, identity_id: str, index: int, embedding, version, expected_generation=None):
+        """替换身份的第index张特征（模型迁移重新提取）；身份或特征已不存在、或身份已被删除后
+        重新注册（generation 与 expected_generation 不同）时返回None
+        """
+        with self._lock:
+            if not self.gallery.replaceable(identity_id, index, expected_generation):
+                return None
+            _, future = self._append(
+                OP_REPLACE, identity_id, embedding,
+                apply=lambda: self.gallery.replace(identity_id, index, embedding, version),
+                index=index, version=version
+            )
+            return future
+
+    def remove(self, identity_id: str):
+        """删除身份；不存在时返回None，否则返回fsync后完成的Future"""
+        with self._lock:
+            if self.gallery.get(identity_id) is None:
+                return None
+            _, future = self._append(OP_REMOVE, identity_id, None, apply=lambda: self.gallery.remove(identity_id))
+            return future
+
+    # -------------------- 快照 --------------------
+    def snapshot(self) -> dict:
+        """将当前人脸库写为快照，并删除被快照覆盖的WAL段"""
+        with self._snapshot_lock:
+            start = time.perf_counter()
+            future = Future()
+            with self._lock:
+                ids, matrix, versions = self.gallery.items()
+                seq = self.seq
+                # 新段从 seq+1 开始，旧段全部被本次快照覆盖
+                future.first_seq = seq + 1
+                self._queue.put((_ROTATE, future))
+            future.result()
+
+            tmp_path = os.path.join(self.data_dir, "snapshot.tmp.npz")
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f, ids=np.array(ids, dtype=str), embeddings=matrix,
+                    versions=np.array([v or "" for v in versions], dtype=str), seq=np.int64(seq)
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.data_dir, "snapshot.npz"))
+            self.snapshot_seq = seq
+
+            current = os.path.join(self.data_dir, f"wal-{seq + 1:020d}.log")
+            for path in self._segments():
+                if path < current:
+                    os.remove(path)
+            elapsed = time.perf_counter() - start
+            logger.info(f"💾 人脸库快照完成：{len(ids)}条特征，序号{seq}，耗时{elapsed * 1000:.1f}ms")
+            return {"records": len(ids), "seq": seq, "elapsed_ms": round(elapsed * 1000, 2)}
+
+    def pending_records(self) -> int:
+        """自上次快照以来的WAL记录数"""
+        return self.seq - self.snapshot_seq
+
+
+def _create_store():
+    """按配置创建全局持久化实例（未启用时为None，人脸库仅存内存）"""
+    if not config.get("gallery.persist.enabled", False):
+        return None
+    data_dir = config.get("gallery.persist.data_dir", "data/gallery")
+    if not os.path.isabs(data_dir):
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        data_dir = os.path.join(project_root, data_dir)
+    # 分片部署时每个分片使用独立目录
+    shard_index = os.environ.get("FACE_SHARD_INDEX")
+    if shard_index is not None:
+        data_dir = os.path.join(data_dir, f"shard-{shard_index}")
+    return GalleryStore(
+        gallery,
+        data_dir,
+        group_commit_ms=config.get("gallery.persist.group_commit_ms", 5),
+        max_batch=config.get("gallery.persist.max_batch", 1024)
+    )
+
+
+# 全局持久化实例
+store = _create_store()
@@ -0,0 +1,132 @@
+import collections
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import config
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+# 当前请求的追踪对象（仅在事件循环侧有效，线程池中需显式传递）
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """单个请求的追踪记录，包含多个阶段耗时（span）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = f"{time.time_ns():x}"
+        self.start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, end: float, **args):
+        with self._lock:
+            self.spans.append((name, start, end, threading.get_ident(), args))
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter(), **args)
+
+    def to_events(self) -> list:
+        """转为Chrome trace事件（ph=X，时间单位微秒）"""
+        pid = os.getpid()
+        return [
+            {
+                "name": name,
+                "cat": self.name,
+                "ph": "X",
+                "ts": round(start * 1e6, 1),
+                "dur": round((end - start) * 1e6, 1),
+                "pid": pid,
+                "tid": tid,
+                "args": dict(args, trace_id=self.trace_id),
+            }
+            for name, start, end, tid, args in self.spans
+        ]
+
+
+class Tracer:
+    """请求追踪采样器：按比例采样请求，保留最近N条追踪"""
+
+    def __init__(self):
+        self.sample_rate = config.get("profiling.sample_rate", 0.0)
+        self.traces = collections.deque(maxlen=config.get("profiling.max_traces", 200))
+
+    def start_trace(self, name: str):
+        """按采样比例开始追踪，返回 (trace, token)；未采样时 trace 为 None"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None, None
+        trace = Trace(name)
+        return trace, _current_trace.set(trace)
+
+    def finish_trace(self, trace, token):
+        if trace is None:
+            return
+        _current_trace.reset(token)
+        trace.add_span("request", trace.start, time.perf_counter())
+        self.traces.append(trace)
+
+    def export_chrome_trace(self) -> dict:
+        """导出为Chrome trace格式（chrome://tracing 或 Perfetto 打开）"""
+        events = []
+        for trace in list(self.traces):
+            events.extend(trace.to_events())
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def clear(self):
+        self.traces.clear()
+
+
+def current_trace():
+    """获取当前请求的追踪对象（未采样时为None）"""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, trace=None, **args):
+    """记录一个阶段耗时；未采样的请求无额外开销"""
+    trace = trace or _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **args):
+        yield
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """对所有线程做栈采样（类似py-spy），返回折叠栈格式文本，可直接生成火焰图"""
+    counts = collections.Counter()
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(tid, str(tid)))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {n}" for stack, n in counts.most_common())
+
+
+# 全局追踪器实例
+tracer = Tracer()
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import List, Optional
+
+import aiohttp
+
+from config import config
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+logger = logging.getLogger(__name__)
+
+
+def shard_of(identity_id: str, shard_count: int) -> int:
+    """按身份ID哈希计算所属分片（稳定哈希，跨进程一致）"""
+    digest = hashlib.md5(identity_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def local_shard() -> tuple:
+    """当前实例的分片编号和分片总数（环境变量优先，便于单机多进程测试）"""
+    index = int(os.environ.get("FACE_SHARD_INDEX", config.get("shard.index", 0)))
+    count = int(os.environ.get("FACE_SHARD_COUNT", config.get("shard.count", 1)))
+    return index, count
+
+
+def owns(identity_id: str) -> bool:
+    """身份是否归属当前实例的分片"""
+    index, count = local_shard()
+    return count <= 1 or shard_of(identity_id, count) == index
+
+
+def shard_nodes() -> List[str]:
+    """各分片实例的地址列表，下标即分片编号"""
+    nodes = os.environ.get("FACE_SHARD_NODES")
+    if nodes:
+        return [n.strip() for n in nodes.split(",") if n.strip()]
+    return config.get("shard.nodes", []) or []
+
+
+def check_shards():
+    """校验分片拓扑（启动时调用，不一致时抛出ValueError）：分片编号在范围内，
+    配置了分片地址时数量须等于分片总数，否则协调器转发与分片归属判断使用不同的分片数
+    """
+    index, count = local_shard()
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片编号无效：index={index}，count={count}")
+    nodes = shard_nodes()
+    if nodes and len(nodes) != count:
+        raise ValueError(f"分片地址数量（{len(nodes)}）与分片总数 shard.count（{count}）不一致")
+
+
+class ShardCoordinator:
+    """协调器：将检索请求并行分发到所有分片，在截止时间内合并top-k结果"""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            # 长连接复用，避免每次分发重新建立TCP连接
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=config.get("shard.max_connections", 100))
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _post(self, node: str, path: str, payload: dict, timeout: float, headers: Optional[dict] = None):
+        session = await self._get_session()
+        async with session.post(
+            node.rstrip("/") + path,
+            json=payload,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as resp:
+            return resp.status, await resp.json()
+
+    async def _search_one(self, index: int, node: str, payload: dict, timeout: float,
+                          headers: Optional[dict] = None) -> dict:
+        start = time.perf_counter()
+        status = {"shard": index, "node": node}
+        try:
+            http_status, body = await self._post(node, "/api/gallery/search", payload, timeout, headers)
+            if http_status != 200 or body.get("code") != 200:
+                status.update(status="error", error=body.get("msg"))
+            else:
+                status.update(status="ok", results=body["data"]["results"])
+        except asyncio.TimeoutError:
+            status.update(status="timeout")
+        except Exception as e:
+            status.update(status="error", error=str(e))
+        status["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return status
+
+    @staticmethod
+    def _nodes() -> List[str]:
+        nodes = shard_nodes()
+        if not nodes:
+            raise ValueError("未配置分片节点（shard.nodes）")
+        check_shards()
+        return nodes
+
+    async def search(self, embedding: str, top_k: int = 5, shortlist: Optional[int] = None,
+                     deadline_ms: Optional[float] = None, headers: Optional[dict] = None) -> dict:
+        """分散-聚合检索；慢分片或不可用分片在截止时间后被忽略，结果标记为 partial
+
+        headers 为转发给分片的请求头（调用方的API Key，分片按同一租户鉴权和限流）
+        """
+        nodes = self._nodes()
+        timeout = (deadline_ms or config.get("shard.deadline_ms", 500)) / 1000
+        payload = {"embedding": embedding, "top_k": top_k}
+        if shortlist is not None:
+            payload["shortlist"] = shortlist
+
+        shards = await asyncio.gather(*[
+            self._search_one(i, node, payload, timeout, headers) for i, node in enumerate(nodes)
+        ])
+        merged = []
+        for shard in shards:
+            for item in shard.pop("results", []):
+                item["shard"] = shard["shard"]
+                merged.append(item)
+        merged.sort(key=lambda r: r["score"], reverse=True)
+        return {
+            "results": merged[:top_k],
+            "partial": any(s["status"] != "ok" for s in shards),
+            "shards": shards,
+        }
+
+    async def route(self, identity_id: str, method: str, path: str, payload: Optional[dict] = None,
+                    headers: Optional[dict] = None):
+        """将注册/删除请求转发到身份所属分片"""
+        # 与 owns() 使用同一分片总数，_nodes() 已校验地址数量与之一致
+        node = self._nodes()[shard_of(identity_id, local_shard()[1])]
+        session = await self._get_session()
+        async with session.request(
+            method,
+            node.rstrip("/") + path,
+            json=payload,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=config.get("server.timeout", 30))
+        ) as resp:
+            return resp.status, await resp.json()
+
+
+# 全局协调器实例
+coordinator = ShardCoordinator()
@@ -0,0 +1,200 @@
+import asyncio
+import collections
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from config import config
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+DEFAULT_TENANT = "default"
+
+
+class TenantRejected(Exception):
+    """租户请求被拒绝（reason: rate / queue / timeout / unauthorized）"""
+
+    def __init__(self, tenant: str, reason: str, msg: str):
+        super().__init__(msg)
+        self.tenant = tenant
+        self.reason = reason
+
+
+def resolve_tenant(api_key: Optional[str]) -> str:
+    """根据API Key解析租户；未配置的Key归入默认租户（tenants.require_key 时拒绝）"""
+    tenant = (config.get("tenants.keys", {}) or {}).get(api_key) if api_key else None
+    if tenant is None:
+        if config.get("tenants.require_key", False):
+            raise TenantRejected(DEFAULT_TENANT, "unauthorized", "API Key无效或缺失")
+        return DEFAULT_TENANT
+    return tenant
+
+
+def tenant_quota(tenant: str) -> dict:
+    """租户配额：默认配额与租户单独配置合并（每次读取，支持热加载）"""
+    quota = {"weight": 1, "max_concurrency": 4, "rate": 0, "burst": 0}
+    quota.update(config.get("tenants.default", {}) or {})
+    quota.update((config.get("tenants.quotas", {}) or {}).get(tenant, {}) or {})
+    return quota
+
+
+class _TenantState:
+    """单个租户的排队、令牌桶和统计状态"""
+
+    def __init__(self):
+        self.waiters = collections.deque()
+        self.active = 0
+        self.vtime = 0.0
+        self.tokens = None
+        self.refill_at = time.monotonic()
+        self.requests = 0
+        self.completed = 0
+        self.rejected = collections.Counter()
+        self.wait_ms_total = 0.0
+        self.latencies = collections.deque(maxlen=1000)
+
+    def take_token(self, quota: dict) -> bool:
+        """令牌桶限流；rate<=0 表示不限速"""
+        rate = quota.get("rate", 0)
+        if rate <= 0:
+            return True
+        burst = max(quota.get("burst", 0), rate)
+        now = time.monotonic()
+        if self.tokens is None:
+            self.tokens = burst
+        self.tokens = min(burst, self.tokens + (now - self.refill_at) * rate)
+        self.refill_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class TenantScheduler:
+    """按租户加权公平排队（WFQ）进入推理线程池
+
+    全局推理槽位数等于推理线程数；槽位空闲时，在有排队请求且未达并发上限的租户中
+    选虚拟时间最小者放行，每放行一次虚拟时间增加 1/weight，空闲租户不能积累额度。
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.busy = 0
+        self.vclock = 0.0
+        self._tenants = collections.defaultdict(_TenantState)
+
+    def _grant(self, tenant: str, state: _TenantState):
+        self.busy += 1
+        state.active += 1
+        start = max(state.vtime, self.vclock)
+        self.vclock = start
+        state.vtime = start + 1.0 / max(tenant_quota(tenant).get("weight", 1), 1e-6)
+
+    def _dispatch(self):
+        while self.busy < self.slots:
+            best, best_state = None, None
+            for tenant, state in self._tenants.items():
+                while state.waiters and state.waiters[0].done():
+                    state.waiters.popleft()
+                if not state.waiters or state.active >= tenant_quota(tenant)["max_concurrency"]:
+                    continue
+                if best_state is None or max(state.vtime, self.vclock) < max(best_state.vtime, self.vclock):
+                    best, best_state = tenant, state
+            if best is None:
+                return
+            self._grant(best, best_state)
+            best_state.waiters.popleft().set_result(None)
+
+    async def acquire(self, tenant: str) -> float:
+        """获取推理槽位，返回排队等待时间（毫秒）；超限时抛出 TenantRejected"""
+        state = self._tenants[tenant]
+        quota = tenant_quota(tenant)
+        state.requests += 1
+        if not state.take_token(quota):
+            state.rejected["rate"] += 1
+            raise TenantRejected(tenant, "rate", "请求频率超过租户配额")
+
+        start = time.perf_counter()
+        if self.busy < self.slots and state.active < quota["max_concurrency"] and not state.waiters:
+            self._grant(tenant, state)
+            return 0.0
+        if len(state.waiters) >= config.get("tenants.max_queue", 100):
+            state.rejected["queue"] += 1
+            raise TenantRejected(tenant, "queue", "租户排队请求过多")
+
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), config.get("tenants.queue_timeout", 10))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # 已被放行但调用方放弃，归还槽位
+                self.release(tenant, None)
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                state.rejected["timeout"] += 1
+                raise TenantRejected(tenant, "timeout", "排队超时")
+            raise
+        wait_ms = (time.perf_counter() - start) * 1000
+        state.wait_ms_total += wait_ms
+        return wait_ms
+
+    def release(self, tenant: str, latency_ms: Optional[float]):
+        state = self._tenants[tenant]
+        self.busy -= 1
+        state.active -= 1
+        if latency_ms is not None:
+            state.completed += 1
+            state.latencies.append(latency_ms)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tenant: str):
+        """async with scheduler.slot(tenant): 在槽位内执行推理"""
+        wait_ms = await self.acquire(tenant)
+        start = time.perf_counter()
+        try:
+            yield wait_ms
+        finally:
+            self.release(tenant, (time.perf_counter() - start) * 1000 + wait_ms)
+
+    async def run(self, tenant: str, func, *args, retries: int = 0, backoff: float = 1.0, backoff_max: float = 30.0):
+        """在槽位内执行 await func(*args)（后台任务使用）：被拒绝时等待 backoff 秒后重试，
+        等待时间逐次翻倍（不超过 backoff_max），重试 retries 次后仍被拒绝则抛出 TenantRejected
+        """
+        delay = backoff
+        for attempt in range(retries + 1):
+            try:
+                async with self.slot(tenant):
+                    return await func(*args)
+            except TenantRejected:
+                if attempt == retries:
+                    raise
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, backoff_max)
+
+    def stats(self) -> dict:
+        data = {}
+        for tenant, state in list(self._tenants.items()):
+            latencies = sorted(state.latencies)
+            data[tenant] = {
+                "requests": state.requests,
+                "completed": state.completed,
+                "rejected": dict(state.rejected),
+                "active": state.active,
+                "queued": sum(1 for f in state.waiters if not f.done()),
+                "avg_wait_ms": round(state.wait_ms_total / state.completed, 2) if state.completed else 0.0,
+                "avg_latency_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "p99_latency_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2) if len(latencies) >= 100
+                else (round(latencies[-1], 2) if latencies else 0.0),
+            }
+        return {"slots": self.slots, "busy": self.busy, "tenants": data}
+
+
+# 全局租户调度器（槽位数与推理线程数一致）
+scheduler = TenantScheduler(slots=config.get("face_model.thread_pool_workers", 4))
@@ -101,10 +101,12 @@ echo ""
 echo "1. 前台启动（测试用）:"
 echo "   python start_server.py"
 echo ""
-echo "2. 后台启动（推荐）:"
-echo "   nohup python start_server.py > server.log 2>&1 &"
+echo "2. 后台启动（推荐，进程管理器）:"
+echo "   python start_daemon.py"
+echo "   python supervisor.py status / restart"
+echo "   python stop_server.py"
 echo ""
-echo "3. 使用 screen（推荐）:"
+echo "3. 使用 screen（调试）:"
 echo "   screen -S face_api"
 echo "   python start_server.py"
 echo "   # 按 Ctrl+A 然后 D 退出"
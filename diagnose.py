@@ -5,7 +5,6 @@
 """
 import sys
 import os
-import subprocess
 
 def print_section(title):
     """打印分隔线"""
@@ -93,8 +92,8 @@ def check_models():
         print(f"⚠️  模型目录不存在，首次启动会自动下载")
 
 def check_port():
-    """检查端口占用"""
-    print_section("端口检查")
+    """检查服务进程和端口占用"""
+    print_section("进程与端口检查")
     
     try:
         from config import config
@@ -102,25 +101,19 @@ def check_port():
     except:
         port = 5000
     
-    result = subprocess.run(
-        f"lsof -ti:{port}",
-        shell=True,
-        capture_output=True,
-        text=True
-    )
+    try:
+        import supervisor
+        if supervisor.read_pid() is not None:
+            supervisor.status()
+            return
+    except Exception as e:
+        print(f"⚠️  读取进程管理器状态失败: {e}")
     
-    if result.stdout.strip():
-        print(f"⚠️  端口 {port} 已被占用")
-        print(f"   进程ID: {result.stdout.strip()}")
-        
-        # 获取进程信息
-        ps_result = subprocess.run(
-            f"ps -p {result.stdout.strip()} -o pid,cmd",
-            shell=True,
-            capture_output=True,
-            text=True
-        )
-        print(f"   进程信息:\n{ps_result.stdout}")
+    import socket
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        in_use = sock.connect_ex(("127.0.0.1", port)) == 0
+    if in_use:
+        print(f"⚠️  端口 {port} 已被占用（非进程管理器启动的进程）")
     else:
         print(f"✅ 端口 {port} 可用")
 
@@ -226,9 +219,9 @@ def main():
     print("=" * 60)
     print("\n建议:")
     print("  1. 如果依赖未安装，运行: pip install -r requirements.txt")
-    print("  2. 如果端口被占用，运行: kill -9 $(lsof -ti:5000)")
+    print("  2. 如果服务在运行，停止: python supervisor.py stop")
     print("  3. 如果模型未下载，首次启动需要等待几分钟")
-    print("  4. 查看详细日志: tail -f server.log")
+    print("  4. 查看详细日志: tail -f log/server.log")
     print("  5. 前台运行测试: python start_server.py")
     print()
 
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+比对阈值标定与识别准确率评估（离线工具）
+用当前推理流程处理本地标注数据集（每个子目录为一个身份），计算同人/异人相似度分布、
+ROC、TAR@FAR、EER 以及处理吞吐量，用于评估 det_size、模型包、特征量化等性能改动对准确率的影响
+
+数据集目录结构：
+  dataset/
+    张三/ 1.jpg 2.jpg ...
+    李四/ 1.jpg ...
+
+示例：
+  python evaluate_threshold.py --data dataset
+  python evaluate_threshold.py --data dataset --det-size 320 320 --quantize int8 --output report.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import config
+from face_process.init_InsightFace import _build_face_model, _analyze
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+FAR_TARGETS = (1e-1, 1e-2, 1e-3, 1e-4, 1e-5)
+
+
+def load_dataset(root: str, max_per_identity: int):
+    """返回 [(身份, 图片路径)]，少于2张照片的身份只参与异人比对"""
+    samples = []
+    for identity in sorted(os.listdir(root)):
+        folder = os.path.join(root, identity)
+        if not os.path.isdir(folder):
+            continue
+        files = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTS))
+        if max_per_identity:
+            files = files[:max_per_identity]
+        samples.extend((identity, os.path.join(folder, f)) for f in files)
+    return samples
+
+
+def quantize(embeddings: np.ndarray, mode: str) -> np.ndarray:
+    """模拟特征量化后的精度损失（float16 / int8 按向量最大绝对值对称量化）"""
+    if mode == "float16":
+        return embeddings.astype(np.float16).astype(np.float32)
+    if mode == "int8":
+        scale = np.abs(embeddings).max(axis=1, keepdims=True) / 127.0
+        scale[scale == 0] = 1.0
+        return np.round(embeddings / scale).clip(-127, 127).astype(np.int8).astype(np.float32) * scale
+    return embeddings
+
+
+def extract_all(model, samples, workers: int):
+    """提取全部样本特征；多人脸时取面积最大的人脸。返回 (身份列表, 特征矩阵, 单张耗时列表, 失败统计, 总耗时)"""
+    def process(item):
+        identity, path = item
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is None:
+            return identity, None, 0.0, "decode"
+        start = time.perf_counter()
+        faces = _analyze(model, frame)
+        elapsed = (time.perf_counter() - start) * 1000
+        if not faces:
+            return identity, None, elapsed, "no_face"
+        face = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
+        return identity, face.embedding.copy(), elapsed, "multi_face" if len(faces) > 1 else None
+
+    labels, embeddings, latencies = [], [], []
+    failures = {"decode": 0, "no_face": 0, "multi_face": 0}
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, (identity, embedding, elapsed, issue) in enumerate(pool.map(process, samples), 1):
+            if issue:
+                failures[issue] += 1
+            if elapsed:
+                latencies.append(elapsed)
+            if embedding is not None:
+                labels.append(identity)
+                embeddings.append(embedding)
+            if i % 100 == 0:
+                print(f"  已处理 {i}/{len(samples)}")
+    total = time.perf_counter() - begin
+    matrix = np.stack(embeddings).astype(np.float32) if embeddings else np.zeros((0, 512), np.float32)
+    return labels, matrix, latencies, failures, total
+
+
+def pair_scores(labels, embeddings: np.ndarray, block: int = 1024):
+    """计算全部样本两两余弦相似度，按是否同一身份拆分为同人/异人分数
+
+    按 block 行分块计算上三角，不构建完整的 n×n 相似度矩阵
+    """
+    normed = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    ids = np.array(labels)
+    genuine, impostor = [], []
+    for start in range(0, len(normed), block):
+        stop = min(start + block, len(normed))
+        scores = normed[start:stop] @ normed[start:].T
+        # 块内第 r 行只取列 > 全局行号的部分（上三角，不含对角线）
+        upper = np.arange(scores.shape[1])[None, :] > np.arange(stop - start)[:, None]
+        same = ids[start:stop, None] == ids[None, start:]
+        genuine.append(scores[upper & same])
+        impostor.append(scores[upper & ~same])
+    return np.concatenate(genuine), np.concatenate(impostor)
+
+
+def roc(genuine: np.ndarray, impostor: np.ndarray, points: int = 200):
+    """按阈值扫描计算 (阈值, FAR, TAR) 曲线"""
+    thresholds = np.linspace(-1.0, 1.0, points + 1)
+    impostor_sorted, genuine_sorted = np.sort(impostor), np.sort(genuine)
+    far = 1 - np.searchsorted(impostor_sorted, thresholds, side="left") / max(len(impostor), 1)
+    tar = 1 - np.searchsorted(genuine_sorted, thresholds, side="left") / max(len(genuine), 1)
+    return thresholds, far, tar
+
+
+def tar_at_far(genuine: np.ndarray, impostor: np.ndarray, far: float):
+    """给定误识率下的通过率及对应阈值（异人分数的 1-far 分位数）；样本不足时返回None
+
+    与服务端判定一致，分数 >= 阈值视为同一人（roc、eer、当前阈值统计同样使用 >=）
+    """
+    if len(impostor) * far < 1:
+        return None
+    threshold = float(np.quantile(impostor, 1 - far))
+    return float((genuine >= threshold).mean()), threshold
+
+
+def eer(genuine: np.ndarray, impostor: np.ndarray):
+    """等错误率：FAR 与 FRR 相等处"""
+    thresholds = np.unique(np.concatenate([genuine, impostor]))
+    if len(thresholds) > 2000:
+        thresholds = np.quantile(thresholds, np.linspace(0, 1, 2000))
+    far = np.array([(impostor >= t).mean() for t in thresholds])
+    frr = np.array([(genuine < t).mean() for t in thresholds])
+    i = int(np.argmin(np.abs(far - frr)))
+    return float((far[i] + frr[i]) / 2), float(thresholds[i])
+
+
+def describe(scores: np.ndarray) -> dict:
+    if len(scores) == 0:
+        return {"count": 0}
+    return {
+        "count": int(len(scores)),
+        "mean": round(float(scores.mean()), 4),
+        "std": round(float(scores.std()), 4),
+        "min": round(float(scores.min()), 4),
+        "max": round(float(scores.max()), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比对阈值标定与准确率评估")
+    parser.add_argument("--data", required=True, help="标注数据集目录（每个子目录为一个身份）")
+    parser.add_argument("--model", default=None, help="模型包名称，默认 face_model.name")
+    parser.add_argument("--det-size", type=int, nargs=2, default=None, metavar=("W", "H"),
+                        help="检测输入尺寸，默认 face_model.det_size")
+    parser.add_argument("--quantize", choices=("none", "float16", "int8"), default="none",
+                        help="模拟特征量化后再比对")
+    parser.add_argument("--workers", type=int, default=config.get("face_model.thread_pool_workers", 4),
+                        help="并发推理线程数（与服务推理线程池一致）")
+    parser.add_argument("--max-per-identity", type=int, default=0, help="每个身份最多使用的照片数（0不限）")
+    parser.add_argument("--target-far", type=float, default=1e-3, help="推荐阈值对应的目标误识率")
+    parser.add_argument("--output", default=None, help="输出JSON报告路径（含ROC曲线）")
+    parser.add_argument("--save-scores", default=None, help="保存同人/异人分数到 .npz，便于对比不同配置")
+    args = parser.parse_args()
+
+    samples = load_dataset(args.data, args.max_per_identity)
+    identities = len({s[0] for s in samples})
+    if identities < 2:
+        print("❌ 数据集至少需要两个身份")
+        return 1
+
+    name = args.model or config.get("face_model.name", "buffalo_l")
+    det_size = args.det_size or config.get("face_model.det_size")
+    print("=" * 80)
+    print(f"📊 阈值标定：{identities}个身份，{len(samples)}张照片，模型 {name}，检测尺寸 {tuple(det_size)}，"
+          f"量化 {args.quantize}")
+    print("=" * 80)
+
+    model = _build_face_model(name, det_size)
+    labels, embeddings, latencies, failures, total = extract_all(model, samples, args.workers)
+    embeddings = quantize(embeddings, args.quantize)
+    genuine, impostor = pair_scores(labels, embeddings)
+    if len(genuine) == 0:
+        print("❌ 没有可用的同人样本对（每个身份至少需要两张可检测到人脸的照片）")
+        return 1
+
+    current = config.get("face_model.threshold", 0.5)
+    eer_value, eer_threshold = eer(genuine, impostor)
+    report = {
+        "model": name,
+        "det_size": list(det_size),
+        "quantize": args.quantize,
+        "images": len(samples),
+        "identities": identities,
+        "failures": failures,
+        "throughput": {
+            "images_per_second": round(len(samples) / total, 2),
+            "workers": args.workers,
+            "avg_ms": round(statistics.mean(latencies), 2) if latencies else 0.0,
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2) if latencies else 0.0,
+        },
+        "genuine": describe(genuine),
+        "impostor": describe(impostor),
+        "eer": {"value": round(eer_value, 5), "threshold": round(eer_threshold, 4)},
+        "current_threshold": {
+            "threshold": current,
+            "tar": round(float((genuine >= current).mean()), 5),
+            "far": round(float((impostor >= current).mean()), 6),
+        },
+        "tar_at_far": {},
+    }
+    for far in FAR_TARGETS:
+        result = tar_at_far(genuine, impostor, far)
+        if result is not None:
+            report["tar_at_far"][f"{far:g}"] = {"tar": round(result[0], 5), "threshold": round(result[1], 4)}
+    recommended = tar_at_far(genuine, impostor, args.target_far)
+
+    print(f"\n⏱  吞吐量：{report['throughput']['images_per_second']} 张/秒（{args.workers}线程），"
+          f"单张平均 {report['throughput']['avg_ms']}ms，P99 {report['throughput']['p99_ms']}ms")
+    print(f"⚠️  失败：解码 {failures['decode']}，未检测到人脸 {failures['no_face']}，多人脸（取最大）{failures['multi_face']}")
+    print(f"\n同人分数：{report['genuine']}")
+    print(f"异人分数：{report['impostor']}")
+    print(f"\n{'FAR':>10} {'TAR':>10} {'阈值':>10}")
+    for far, item in report["tar_at_far"].items():
+        print(f"{far:>10} {item['tar']:>10.4f} {item['threshold']:>10.4f}")
+    print(f"\nEER：{eer_value:.4%}（阈值 {eer_threshold:.4f}）")
+    print(f"当前阈值 {current}：TAR {report['current_threshold']['tar']:.4f}，FAR {report['current_threshold']['far']:.6f}")
+    if recommended is not None:
+        print(f"💡 目标 FAR={args.target_far:g} 时建议阈值 {recommended[1]:.4f}（TAR {recommended[0]:.4f}）")
+    else:
+        print(f"💡 异人样本对不足，无法估计 FAR={args.target_far:g} 的阈值")
+
+    if args.output:
+        thresholds, far, tar = roc(genuine, impostor)
+        report["roc"] = [
+            {"threshold": round(float(t), 3), "far": float(f), "tar": float(r)}
+            for t, f, r in zip(thresholds, far, tar)
+        ]
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📝 报告已保存：{args.output}")
+    if args.save_scores:
+        np.savez(args.save_scores, genuine=genuine, impostor=impostor)
+        print(f"📝 分数已保存：{args.save_scores}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
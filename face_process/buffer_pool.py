@@ -0,0 +1,104 @@
+import collections
+import threading
+
+import numpy as np
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+class BufferPool:
+    """线程本地的可复用数组池，按 (用途, 形状, dtype) 缓存
+
+    推理线程池中每个线程独立持有一组缓冲区，无需加锁；每个线程最多缓存
+    max_entries 个缓冲区，超过后按最近最少使用淘汰（输入尺寸频繁变化时避免无限增长）。
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def _cache(self) -> collections.OrderedDict:
+        cache = getattr(self._local, "cache", None)
+        if cache is None:
+            cache = self._local.cache = collections.OrderedDict()
+        return cache
+
+    def get(self, name: str, shape, dtype=np.float32) -> np.ndarray:
+        """取得指定形状的缓冲区（内容未初始化，调用方负责覆盖写入）"""
+        cache = self._cache()
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        buf = cache.get(key)
+        if buf is not None:
+            cache.move_to_end(key)
+            self.hits += 1
+            return buf
+        buf = np.empty(shape, dtype=dtype)
+        cache[key] = buf
+        with self._lock:
+            self.misses += 1
+            self.bytes += buf.nbytes
+            while len(cache) > self.max_entries:
+                _, evicted = cache.popitem(last=False)
+                self.bytes -= evicted.nbytes
+        return buf
+
+    def stats(self) -> dict:
+        """命中统计（命中计数未加锁，为近似值）"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "allocated_mb": round(self.bytes / 1024 / 1024, 2),
+        }
+
+
+class PooledSession:
+    """ONNX Runtime 会话代理：通过IO Binding把输出直接写入池化缓冲区，避免每次分配输出数组
+
+    首次遇到某个输入形状时按普通方式运行并记录输出形状，之后同形状的输入走IO Binding。
+    返回的数组会被同一线程的下一次调用覆盖，调用方需在下一次推理前用完（InsightFace 的
+    后处理均会复制所需数据）。
+    """
+
+    def __init__(self, session, pool: BufferPool, name: str):
+        self._session = session
+        self._pool = pool
+        self._name = name
+        self._output_shapes = {}
+        self._all_outputs = [o.name for o in session.get_outputs()]
+
+    def __getattr__(self, item):
+        return getattr(self._session, item)
+
+    def run(self, output_names, input_feed, run_options=None):
+        if len(input_feed) != 1 or run_options is not None:
+            return self._session.run(output_names, input_feed, run_options)
+        (input_name, array), = input_feed.items()
+        array = np.ascontiguousarray(array)
+        names = list(output_names or self._all_outputs)
+        key = (input_name, array.shape, tuple(names))
+        shapes = self._output_shapes.get(key)
+        if shapes is None:
+            outputs = self._session.run(names, {input_name: array})
+            self._output_shapes[key] = [(o.shape, o.dtype) for o in outputs]
+            return outputs
+
+        binding = self._session.io_binding()
+        binding.bind_cpu_input(input_name, array)
+        outputs = []
+        for out_name, (shape, dtype) in zip(names, shapes):
+            buf = self._pool.get(f"{self._name}:{out_name}", shape, dtype)
+            binding.bind_output(out_name, "cpu", 0, dtype, shape, buf.ctypes.data)
+            outputs.append(buf)
+        self._session.run_with_iobinding(binding)
+        return outputs
@@ -0,0 +1,395 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import cv2
+import numpy as np
+
+from config import config
+from core.cpu_pool import run_cpu
+from core.face_core import encode_embedding
+from core.tenant_scheduler import scheduler, TenantRejected
+from face_process.init_InsightFace import detect_faces_async
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+# 未结束的任务状态（服务重启后自动恢复）
+ACTIVE_STATES = ("queued", "running")
+
+
+def _resolve_path(path: str) -> str:
+    """相对路径按项目根目录解析"""
+    if os.path.isabs(path):
+        return path
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, path)
+
+
+def _check_allowed(path: str) -> str:
+    """本地路径必须位于 jobs.allowed_roots 之内，防止读取任意文件"""
+    real = os.path.realpath(path)
+    roots = [os.path.realpath(_resolve_path(r)) for r in config.get("jobs.allowed_roots", []) or []]
+    if not any(real == root or real.startswith(root + os.sep) for root in roots):
+        raise ValueError(f"路径不在允许的目录内（jobs.allowed_roots）：{path}")
+    return real
+
+
+def _list_sources(path: Optional[str], manifest: Optional[str]) -> List[str]:
+    """展开本地目录（递归）或清单文件（每行一个图片路径）为图片路径列表（同步版本）"""
+    if path is not None:
+        root = _check_allowed(path)
+        sources = []
+        for dirpath, _, files in os.walk(root):
+            # 目录内的符号链接可能指向允许目录之外，逐个校验
+            sources.extend(
+                _check_allowed(os.path.join(dirpath, f)) for f in files if f.lower().endswith(IMAGE_EXTS)
+            )
+        return sorted(sources)
+    with open(_check_allowed(manifest), "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    base = os.path.dirname(os.path.realpath(manifest))
+    return [_check_allowed(p if os.path.isabs(p) else os.path.join(base, p)) for p in lines]
+
+
+def _read_frame(source: str):
+    """读取并解码图片（同步版本，在CPU线程池中执行）"""
+    data = np.fromfile(source, dtype=np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+class ExtractJob:
+    """批量特征提取任务：任务目录保存元数据、输入清单和增量写入的结果
+
+    目录结构：
+      job.json          任务元数据与进度
+      sources.txt       图片路径清单（提交时确定，按行号编号）
+      inputs/           直接上传的图片
+      results.jsonl     每张图片一行结果（完成顺序，按 index 对应清单）
+      embeddings.f32    binary 输出时的特征矩阵（float32 行，results.jsonl 中的 row 为行号）
+    """
+
+    def __init__(self, job_dir: str, meta: dict):
+        self.dir = job_dir
+        self.meta = meta
+        self.sources: List[str] = []
+        self.completed = set()
+        self.cancelled = False
+
+    @property
+    def id(self) -> str:
+        return self.meta["job_id"]
+
+    def save(self):
+        tmp = os.path.join(self.dir, "job.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.dir, "job.json"))
+
+    def load_progress(self):
+        """读取清单和已有结果（恢复时跳过已完成的图片，忽略半写的最后一行）"""
+        with open(os.path.join(self.dir, "sources.txt"), "r", encoding="utf-8") as f:
+            self.sources = f.read().splitlines()
+        self.completed = set()
+        codes = {}
+        rows = 0
+        path = os.path.join(self.dir, "results.jsonl")
+        if os.path.exists(path):
+            valid = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        break
+                    valid += len(line)
+                    self.completed.add(item["index"])
+                    if item.get("row") is not None:
+                        rows = max(rows, item["row"] + 1)
+                    codes[str(item["code"])] = codes.get(str(item["code"]), 0) + 1
+            os.truncate(path, valid)
+        binary = os.path.join(self.dir, "embeddings.f32")
+        if self.meta.get("dim") and os.path.exists(binary):
+            # 丢弃未被结果行引用的特征行（含半写的行）
+            os.truncate(binary, rows * self.meta["dim"] * 4)
+        self.meta.update(total=len(self.sources), done=len(self.completed), codes=codes)
+
+    def to_dict(self) -> dict:
+        data = dict(self.meta)
+        total = data.get("total") or 0
+        data["progress"] = round(data.get("done", 0) / total, 4) if total else 0.0
+        return data
+
+
+class JobManager:
+    """批量提取任务管理：排队、低优先级执行（jobs.tenant 租户进入推理调度）、重启后恢复"""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self._lock_file = None
+        self._jobs = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._runners = []
+        self._running = {}
+
+    # -------------------- 生命周期 --------------------
+    async def start(self):
+        """启动任务执行协程并恢复未完成的任务（在 FastAPI 生命周期内调用）"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._lock_data_dir()
+        self._queue = asyncio.Queue()
+        for _ in range(config.get("jobs.max_running", 1)):
+            self._runners.append(asyncio.create_task(self._runner()))
+        resumed = 0
+        for job_id in sorted(os.listdir(self.data_dir)):
+            meta_path = os.path.join(self.data_dir, job_id, "job.json")
+            if not os.path.exists(meta_path):
+                continue
+            with open(meta_path, "r", encoding="utf-8") as f:
+                job = ExtractJob(os.path.join(self.data_dir, job_id), json.load(f))
+            self._jobs[job.id] = job
+            if job.meta["status"] in ACTIVE_STATES:
+                job.meta["status"] = "queued"
+                job.save()
+                self._queue.put_nowait(job)
+                resumed += 1
+        if resumed:
+            logger.info(f"🔄 已恢复 {resumed} 个未完成的批量提取任务")
+
+    async def stop(self):
+        """停止执行；运行中的任务保持 running 状态，下次启动时从断点继续"""
+        for task in self._runners:
+            task.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _lock_data_dir(self):
+        """独占任务目录：同一目录只允许一个进程恢复和执行任务，否则同一任务会被两个进程同时追加结果"""
+        if fcntl is None:
+            # Windows 下仅支持单进程前台运行，不加锁
+            return
+        self._lock_file = open(os.path.join(self.data_dir, ".lock"), "a")
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"批量任务目录已被其他进程占用：{self.data_dir}（多个工作进程或新旧进程同时运行）")
+
+    # -------------------- 提交与查询 --------------------
+    async def submit(self, tenant: str, images: Optional[List[bytes]] = None, path: Optional[str] = None,
+                     manifest: Optional[str] = None, output: str = "jsonl") -> ExtractJob:
+        if sum(x is not None for x in (images, path, manifest)) != 1:
+            raise ValueError("images、path、manifest 需且仅需指定一项")
+        if output not in ("jsonl", "binary"):
+            raise ValueError("output 仅支持 jsonl 或 binary")
+        # 先校验输入再创建任务目录，校验失败不留下空目录
+        if images is None:
+            sources = await run_cpu(_list_sources, path, manifest)
+            total = len(sources)
+        else:
+            total = len(images)
+        if not total:
+            raise ValueError("没有找到待处理的图片")
+        if total > config.get("jobs.max_images", 1000000):
+            raise ValueError(f"单个任务图片数超过上限（{config.get('jobs.max_images', 1000000)}）")
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.data_dir, job_id)
+        os.makedirs(job_dir)
+        try:
+            if images is not None:
+                sources = await run_cpu(self._save_images, job_dir, images)
+            with open(os.path.join(job_dir, "sources.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(sources))
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        job = ExtractJob(job_dir, {
+            "job_id": job_id,
+            "tenant": tenant,
+            "status": "queued",
+            "output": output,
+            "inline": images is not None,
+            "total": len(sources),
+            "done": 0,
+            "codes": {},
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        })
+        job.save()
+        self._jobs[job_id] = job
+        self._queue.put_nowait(job)
+        logger.info(f"📥 批量提取任务已提交：{job_id}（{len(sources)}张，租户{tenant}）")
+        return job
+
+    @staticmethod
+    def _save_images(job_dir: str, images: List[bytes]) -> List[str]:
+        """保存直接上传的图片，任务可在重启后继续处理（同步版本）"""
+        input_dir = os.path.join(job_dir, "inputs")
+        os.makedirs(input_dir)
+        sources = []
+        for i, data in enumerate(images):
+            path = os.path.join(input_dir, f"{i:08d}.img")
+            with open(path, "wb") as f:
+                f.write(data)
+            sources.append(path)
+        return sources
+
+    def get(self, job_id: str) -> Optional[ExtractJob]:
+        return self._jobs.get(job_id)
+
+    def list(self, tenant: Optional[str] = None) -> list:
+        return [
+            job.to_dict() for job in sorted(self._jobs.values(), key=lambda j: j.meta["created_at"], reverse=True)
+            if tenant is None or job.meta["tenant"] == tenant
+        ]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.meta["status"] not in ACTIVE_STATES:
+            return False
+        job.cancelled = True
+        if job.meta["status"] == "queued":
+            job.meta.update(status="cancelled", finished_at=time.time())
+            job.save()
+        return True
+
+    def remove(self, job_id: str) -> bool:
+        """删除已结束任务的目录（含结果文件）"""
+        job = self._jobs.get(job_id)
+        if job is None or job.meta["status"] in ACTIVE_STATES:
+            return False
+        shutil.rmtree(job.dir, ignore_errors=True)
+        del self._jobs[job_id]
+        return True
+
+    # -------------------- 执行 --------------------
+    async def _runner(self):
+        while True:
+            job = await self._queue.get()
+            if job.cancelled:
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ 批量提取任务失败：{job.id}", exc_info=True)
+                job.meta.update(status="failed", error=str(e), finished_at=time.time())
+                job.save()
+
+    async def _run(self, job: ExtractJob):
+        await run_cpu(job.load_progress)
+        job.meta.update(status="running", started_at=job.meta["started_at"] or time.time())
+        job.save()
+        pending = asyncio.Queue()
+        for index in range(len(job.sources)):
+            if index not in job.completed:
+                pending.put_nowait(index)
+        results = open(os.path.join(job.dir, "results.jsonl"), "ab")
+        binary = open(os.path.join(job.dir, "embeddings.f32"), "ab") if job.meta["output"] == "binary" else None
+        last_save = time.monotonic()
+
+        async def worker():
+            nonlocal last_save
+            while not job.cancelled:
+                try:
+                    index = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                item = await self._process(job, index)
+                if binary is not None and "embedding" in item:
+                    # 先写特征行再写结果行，中断时多出的特征行不被引用
+                    embedding = item.pop("embedding")
+                    if not job.meta.get("dim"):
+                        job.meta["dim"] = embedding.size
+                        job.save()
+                    item["row"] = binary.tell() // embedding.nbytes
+                    binary.write(embedding.tobytes())
+                    binary.flush()
+                elif "embedding" in item:
+                    item["embedding"] = await encode_embedding(item["embedding"], item.get("model_version"))
+                results.write((json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8"))
+                results.flush()
+                job.meta["done"] += 1
+                code = str(item["code"])
+                job.meta["codes"][code] = job.meta["codes"].get(code, 0) + 1
+                if time.monotonic() - last_save > 1:
+                    last_save = time.monotonic()
+                    job.save()
+
+        workers = [asyncio.create_task(worker()) for _ in range(config.get("jobs.concurrency", 2))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # 某个图片失败导致任务失败时，停止其余在途图片后再关闭结果文件
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            results.close()
+            if binary is not None:
+                binary.close()
+            job.save()
+        if job.cancelled:
+            job.meta.update(status="cancelled", finished_at=time.time())
+        else:
+            job.meta.update(status="completed", finished_at=time.time())
+            logger.info(f"✅ 批量提取任务完成：{job.id}（{job.meta['done']}张，返回码{job.meta['codes']}）")
+        job.save()
+
+    async def _process(self, job: ExtractJob, index: int) -> dict:
+        """处理单张图片，结果码与 /api/face/extract 一致
+
+        推理调度持续拒绝（重试 jobs.max_retries 次后）时抛出 TenantRejected，整个任务标记为失败
+        """
+        source = job.sources[index]
+        item = {"index": index, "source": os.path.basename(source) if job.meta.get("inline") else source}
+        try:
+            frame = await run_cpu(_read_frame, source)
+            if frame is None:
+                return dict(item, code=400, msg="图片解析失败")
+            # 以低权重租户进入推理调度，交互请求优先；排队已满或超时按退避重试，不计为单张失败
+            faces = await scheduler.run(
+                config.get("jobs.tenant", "batch"), detect_faces_async, frame,
+                retries=config.get("jobs.max_retries", 10),
+                backoff=config.get("jobs.retry_backoff", 1.0),
+            )
+        except TenantRejected:
+            raise
+        except Exception as e:
+            logger.error(f"批量提取处理失败：{source}", exc_info=True)
+            return dict(item, code=500, msg=f"提取失败：{str(e)}")
+        if not faces:
+            return dict(item, code=201, msg="未检测到人脸")
+        if len(faces) > 1:
+            return dict(item, code=202, msg="检测到多个人脸")
+        face = faces[0]
+        return dict(
+            item, code=200, msg="特征提取成功", face_bbox=[int(v) for v in face.bbox],
+            embedding=face.embedding.astype(np.float32), model_version=face.model_version
+        )
+
+
+# 全局任务管理器
+job_manager = JobManager(_resolve_path(config.get("jobs.data_dir", "data/jobs")))
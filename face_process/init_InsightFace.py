@@ -1,8 +1,17 @@
 import logging
 import asyncio
+import threading
+import time
+import cv2
+import numpy as np
 from concurrent.futures import ThreadPoolExecutor
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
 from config import config
+from core.profiler import current_trace, span
+from face_process.model_registry import ModelRegistry
+from face_process.buffer_pool import BufferPool, PooledSession
 """
 ______________________________
   Author: wen_l
@@ -12,39 +21,285 @@ ______________________________
 # 初始化日志
 logger = logging.getLogger(__name__)
 
-# 全局模型实例
+# 全局模型实例（始终指向注册表中的主模型）
 face_model = None
-# 线程池用于执行CPU密集型任务
-executor = ThreadPoolExecutor(max_workers=4)
+# 线程池用于执行模型推理任务（解码/编码等CPU任务见 core.cpu_pool）
+executor = ThreadPoolExecutor(
+    max_workers=config.get("face_model.thread_pool_workers", 4),
+    thread_name_prefix="inference"
+)
+# 影子评分线程池（单线程，避免候选模型挤占主模型推理资源）
+shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+# 排队中的影子任务数，超过上限时丢弃采样
+_shadow_pending = 0
+# 预处理及ONNX输出缓冲区池（推理线程本地复用）
+buffer_pool = BufferPool(max_entries=config.get("buffer_pool.max_entries", 32))
+use_buffer_pool = config.get("buffer_pool.enabled", True)
+
+def _build_face_model(name=None, det_size=None):
+    """按当前配置构建并预热一个新的InsightFace模型实例（det_size 可覆盖配置，供离线评估使用）"""
+    # 从配置读取模型参数
+    name = name or config.get("face_model.name", "buffalo_l")
+    det_size = tuple(det_size or config.get("face_model.det_size"))
+    providers = config.get("face_model.providers")
+
+    # 初始化模型
+    model = FaceAnalysis(name=name, providers=providers)
+    model.prepare(ctx_id=0, det_size=det_size)
+    if use_buffer_pool:
+        # ONNX输出通过IO Binding写入池化缓冲区
+        for taskname, task_model in model.models.items():
+            task_model.session = PooledSession(task_model.session, buffer_pool, f"{name}:{taskname}")
+    # 预热：用空白图跑一次推理，避免切换后首个请求承担初始化开销
+    model.get(np.zeros((det_size[1], det_size[0], 3), dtype=np.uint8))
+    logger.info(f"✅ 人脸模型初始化成功（模型：{name}，检测尺寸：{det_size}，计算后端：{providers}）")
+    return model
+
+# 模型注册表
+registry = ModelRegistry(builder=_build_face_model)
+
+def _sync_active():
+    """同步全局 face_model 为注册表中的主模型"""
+    global face_model
+    face_model = registry.get()
+    return face_model
 
 def _init_face_model():
     """初始化InsightFace模型（单例模式）- 同步版本"""
-    global face_model
     if face_model is None:
         try:
-            # 从配置读取模型参数
-            det_size = tuple(config.get("face_model.det_size"))
-            providers = config.get("face_model.providers")
-
-            # 初始化模型
-            face_model = FaceAnalysis(providers=providers)
-            face_model.prepare(ctx_id=0, det_size=det_size)
-            logger.info(f"✅ 人脸模型初始化成功（检测尺寸：{det_size}，计算后端：{providers}）")
+            registry.load(config.get("face_model.name", "buffalo_l"))
+            _sync_active()
         except Exception as e:
             logger.error("❌ 人脸模型初始化失败", exc_info=True)
             raise
     return face_model
 
+def _reload_face_model():
+    """后台构建新模型并原子替换全局实例（旧模型上的请求继续执行完毕）"""
+    try:
+        registry.load(registry.active, replace=True)
+    except Exception as e:
+        logger.error("❌ 新模型构建失败，继续使用旧模型", exc_info=True)
+        return False
+    _sync_active()
+    logger.info("🔄 人脸模型已切换为新实例")
+    return True
+
 async def init_face_model():
     """异步初始化人脸模型"""
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(executor, _init_face_model)
 
+async def reload_face_model():
+    """异步重建人脸模型（配置变更后零停机切换）"""
+    loop = asyncio.get_event_loop()
+    # 使用默认线程池构建，不占用推理线程
+    return await loop.run_in_executor(None, _reload_face_model)
+
+async def load_model(name: str):
+    """后台加载额外的模型包（如 buffalo_s、antelopev2），不影响当前流量"""
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, registry.load, name)
+
+def activate_model(name: str):
+    """原子切换主模型"""
+    registry.activate(name)
+    _sync_active()
+
+def drain_executors(timeout: float) -> bool:
+    """停止接收新推理任务并等待在途任务完成；超时后取消仍在排队的任务，返回是否在超时前完成"""
+    shadow_executor.shutdown(wait=False, cancel_futures=True)
+    waiter = threading.Thread(target=executor.shutdown, kwargs={"wait": True}, daemon=True)
+    waiter.start()
+    waiter.join(timeout)
+    if waiter.is_alive():
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning(f"⚠️ 推理任务未在{timeout}秒内完成，已取消排队中的任务")
+        return False
+    return True
+
 def get_face_model():
     """获取已初始化的模型实例"""
     return face_model
 
+def _detect_pooled(det_model, frame, input_size=None):
+    """等价于 RetinaFace.detect，缩放和填充使用池化缓冲区（input_size 可覆盖检测输入尺寸）"""
+    input_w, input_h = input_size or det_model.input_size
+    im_ratio = float(frame.shape[0]) / frame.shape[1]
+    if im_ratio > float(input_h) / input_w:
+        new_height = input_h
+        new_width = int(new_height / im_ratio)
+    else:
+        new_width = input_w
+        new_height = int(new_width * im_ratio)
+    det_scale = float(new_height) / frame.shape[0]
+
+    resized = buffer_pool.get("det_resized", (new_height, new_width, 3), np.uint8)
+    cv2.resize(frame, (new_width, new_height), dst=resized)
+    det_img = buffer_pool.get("det_img", (input_h, input_w, 3), np.uint8)
+    det_img[:new_height, :new_width] = resized
+    det_img[new_height:] = 0
+    det_img[:new_height, new_width:] = 0
+
+    scores_list, bboxes_list, kpss_list = det_model.forward(det_img, det_model.det_thresh)
+    scores = np.vstack(scores_list)
+    order = scores.ravel().argsort()[::-1]
+    bboxes = np.vstack(bboxes_list) / det_scale
+    pre_det = np.hstack((bboxes, scores)).astype(np.float32, copy=False)[order, :]
+    keep = det_model.nms(pre_det)
+    det = pre_det[keep, :]
+    kpss = None
+    if det_model.use_kps:
+        kpss = (np.vstack(kpss_list) / det_scale)[order][keep]
+    return det, kpss
+
+def _recognize_pooled(rec_model, frame, faces):
+    """等价于 ArcFaceONNX.get，对齐裁剪和输入张量使用池化缓冲区，多张人脸合并为一个批次"""
+    size = rec_model.input_size[0]
+    n = len(faces)
+    crops = buffer_pool.get("rec_crops", (n, size, size, 3), np.uint8)
+    for i, face in enumerate(faces):
+        M = face_align.estimate_norm(face.kps, size)
+        cv2.warpAffine(frame, M, (size, size), dst=crops[i], borderValue=0.0)
+    embeddings = _embed_crops_pooled(rec_model, crops)
+    for i, face in enumerate(faces):
+        face.embedding = embeddings[i].copy()
+
+def _embed_crops_pooled(rec_model, crops):
+    """对已对齐的人脸批次 (N, H, W, 3) 运行识别模型，输入张量使用池化缓冲区"""
+    n, size = crops.shape[0], crops.shape[1]
+    # 与 cv2.dnn.blobFromImages 一致：BGR->RGB、HWC->NCHW、减均值后除以标准差
+    blob = buffer_pool.get("rec_blob", (n, 3, size, size), np.float32)
+    np.subtract(crops[..., ::-1].transpose(0, 3, 1, 2), rec_model.input_mean, out=blob, casting="unsafe")
+    blob *= 1.0 / rec_model.input_std
+    return rec_model.session.run(rec_model.output_names, {rec_model.input_name: blob})[0]
+
+def align_face(frame, face):
+    """按5点关键点裁剪对齐人脸（与识别模型输入一致的112×112）"""
+    return face_align.norm_crop(frame, face.kps, 112)
+
+def _embed_chips(name, chips):
+    """仅运行识别模型，为已对齐的人脸批次提取特征（跳过检测）"""
+    model = registry.get(name)
+    if model is None:
+        raise ValueError(f"模型 {name} 未加载")
+    rec_model = model.models["recognition"]
+    chips = np.ascontiguousarray(np.stack(chips), dtype=np.uint8)
+    if use_buffer_pool:
+        # 池化输出会被下一次推理覆盖，返回前复制
+        return _embed_crops_pooled(rec_model, chips).copy()
+    return rec_model.get_feat(list(chips))
+
+def _analyze(model, frame, trace=None, stats=None):
+    """等价于 FaceAnalysis.get，拆分记录检测与识别阶段耗时；启用缓冲池时走池化预处理"""
+    start = time.perf_counter()
+    with span("detection", trace):
+        if use_buffer_pool:
+            bboxes, kpss = _detect_pooled(model.det_model, frame)
+        else:
+            bboxes, kpss = model.det_model.detect(frame, max_num=0, metric="default")
+    if stats is not None:
+        stats.record_detect((time.perf_counter() - start) * 1000)
+    faces = []
+    with span("recognition", trace, faces=int(bboxes.shape[0])):
+        for i in range(bboxes.shape[0]):
+            kps = kpss[i] if kpss is not None else None
+            face = Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4])
+            for taskname, task_model in model.models.items():
+                if taskname == "detection" or (use_buffer_pool and taskname == "recognition"):
+                    continue
+                task_model.get(frame, face)
+            faces.append(face)
+        if use_buffer_pool and faces and "recognition" in model.models:
+            _recognize_pooled(model.models["recognition"], frame, faces)
+    return faces
+
+def _detect_only(name, frame, det_size=None, trace=None):
+    """仅运行检测模型，返回带框、置信度和5点关键点的Face（不提取特征）"""
+    model = registry.get(name)
+    if model is None:
+        raise ValueError(f"模型 {name} 未加载")
+    start = time.perf_counter()
+    with span("detection", trace):
+        if use_buffer_pool:
+            bboxes, kpss = _detect_pooled(model.det_model, frame, det_size)
+        else:
+            bboxes, kpss = model.det_model.detect(frame, input_size=det_size, max_num=0, metric="default")
+    registry.stats(name).record_detect((time.perf_counter() - start) * 1000)
+    return [
+        Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None, det_score=bboxes[i, 4])
+        for i in range(bboxes.shape[0])
+    ]
+
+def _timed_get(name, model, frame, trace=None, submitted=None):
+    start = time.perf_counter()
+    if trace is not None:
+        trace.add_span("executor_queue", submitted, start)
+    stats = registry.stats(name)
+    # 始终拆分检测与识别阶段（单独记录检测耗时）
+    faces = _analyze(model, frame, trace, stats)
+    stats.record_latency((time.perf_counter() - start) * 1000)
+    return faces
+
+def _run_shadow(name, frame, primary, primary_faces):
+    """在影子模型上重放请求并记录延迟与判定一致性"""
+    try:
+        model = registry.get(name)
+        if model is not None:
+            shadow_faces = _timed_get(name, model, frame)
+            registry.stats(name).record_agreement(primary_faces, shadow_faces, primary, name)
+    except Exception:
+        logger.error(f"影子模型 {name} 评分失败", exc_info=True)
+
+def _shadow_done(future):
+    global _shadow_pending
+    _shadow_pending -= 1
+
 async def detect_faces_async(frame):
     """异步人脸检测"""
+    global _shadow_pending
+    loop = asyncio.get_event_loop()
+    name = registry.active
+    trace = current_trace()
+    faces = await loop.run_in_executor(
+        executor, _timed_get, name, registry.get(name), frame, trace, time.perf_counter()
+    )
+
+    shadow = registry.pick_shadow()
+    if shadow is not None and _shadow_pending < config.get("model_registry.shadow_max_pending", 8):
+        # 镜像到影子模型，不等待结果，不影响本次响应
+        _shadow_pending += 1
+        future = loop.run_in_executor(shadow_executor, _run_shadow, shadow, frame, name, faces)
+        future.add_done_callback(_shadow_done)
+    # 记录产生特征的模型版本（模型迁移与版本校验使用）
+    for face in faces:
+        face.model_version = name
+    return faces
+
+async def detect_only_async(frame, det_size=None):
+    """异步人脸检测（仅检测模型，不运行识别），det_size 为 (宽, 高)，默认与模型一致"""
+    loop = asyncio.get_event_loop()
+    name = registry.active
+    faces = await loop.run_in_executor(executor, _detect_only, name, frame, det_size, current_trace())
+    for face in faces:
+        face.model_version = name
+    return faces
+
+async def extract_aligned_async(chip):
+    """对齐人脸提取模式：输入112×112对齐人脸，只运行识别模型，返回带特征和模型版本的Face"""
+    if chip.shape[:2] != (112, 112):
+        raise ValueError(f"对齐人脸尺寸应为112×112，实际为{chip.shape[1]}×{chip.shape[0]}")
+    with span("recognition", faces=1):
+        embeddings, name = await embed_chips_async([chip])
+    face = Face(bbox=np.array([0, 0, 112, 112], dtype=np.float32), kps=None, det_score=1.0)
+    face.embedding = embeddings[0]
+    face.model_version = name
+    return face
+
+async def embed_chips_async(chips, name=None):
+    """异步为对齐人脸批次提取特征，返回 (特征矩阵, 模型版本)"""
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, face_model.get, frame)
\ No newline at end of file
+    name = name or registry.active
+    embeddings = await loop.run_in_executor(executor, _embed_chips, name, chips)
+    return embeddings, name
@@ -0,0 +1,210 @@
+import collections
+import logging
+import random
+import threading
+
+import numpy as np
+
+from config import config
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+logger = logging.getLogger(__name__)
+
+
+def model_threshold(name: str) -> float:
+    """模型自身的比对阈值（model_registry.thresholds 未单独配置时使用 face_model.threshold）"""
+    thresholds = config.get("model_registry.thresholds", {}) or {}
+    return thresholds.get(name, config.get("face_model.threshold", 0.5))
+
+
+def _unit(vec) -> np.ndarray:
+    vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+    return vec / (np.linalg.norm(vec) + 1e-12)
+
+
+class ModelStats:
+    """单个模型的延迟统计及与主模型的判定一致性统计"""
+
+    def __init__(self, window: int = 64):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        # 仅检测阶段的耗时（运动门控按此估算跳过检测节省的时间）
+        self.detect_calls = 0
+        self.detect_total_ms = 0.0
+        # 影子评分：与主模型对比的次数、人脸数一致次数
+        self.shadow_compared = 0
+        self.face_count_agree = 0
+        # 比对判定一致性：最近配对人脸 (主模型名, 主模型特征, 影子特征)，新人脸与其逐一组成样本对，
+        # 两个模型各自在自己的特征空间内按自己的阈值判定是否同一人（不同模型的特征空间不对齐，不能直接比较特征）
+        self._recent = collections.deque(maxlen=window)
+        self.decision_pairs = 0
+        self.decision_agree = 0
+        self.primary_matches = 0
+        self.shadow_matches = 0
+
+    def record_latency(self, ms: float):
+        with self._lock:
+            self.calls += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def record_detect(self, ms: float):
+        with self._lock:
+            self.detect_calls += 1
+            self.detect_total_ms += ms
+
+    def record_agreement(self, primary_faces, shadow_faces, primary: str, shadow: str):
+        """按人脸框IoU配对两个模型的人脸，统计人脸数一致率及各自阈值下同人/异人判定的一致率"""
+        primary_threshold, shadow_threshold = model_threshold(primary), model_threshold(shadow)
+        with self._lock:
+            self.shadow_compared += 1
+            if len(primary_faces) == len(shadow_faces):
+                self.face_count_agree += 1
+            for face in primary_faces:
+                match = _best_match(face, shadow_faces)
+                if match is None or face.embedding is None or match.embedding is None:
+                    continue
+                p, s = _unit(face.embedding), _unit(match.embedding)
+                for name, rp, rs in self._recent:
+                    if name != primary or rp.shape != p.shape:
+                        continue
+                    primary_same = float(np.dot(p, rp)) >= primary_threshold
+                    shadow_same = float(np.dot(s, rs)) >= shadow_threshold
+                    self.decision_pairs += 1
+                    self.decision_agree += primary_same == shadow_same
+                    self.primary_matches += primary_same
+                    self.shadow_matches += shadow_same
+                self._recent.append((primary, p, s))
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            data = {
+                "calls": self.calls,
+                "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+                "max_ms": round(self.max_ms, 2),
+                "detect_avg_ms": round(self.detect_total_ms / self.detect_calls, 2) if self.detect_calls else 0.0,
+            }
+            if self.shadow_compared:
+                pairs = self.decision_pairs
+                data["shadow"] = {
+                    "compared": self.shadow_compared,
+                    "face_count_agree_rate": round(self.face_count_agree / self.shadow_compared, 4),
+                    "decision_pairs": pairs,
+                    "decision_agree_rate": round(self.decision_agree / pairs, 4) if pairs else None,
+                    "primary_match_rate": round(self.primary_matches / pairs, 4) if pairs else None,
+                    "shadow_match_rate": round(self.shadow_matches / pairs, 4) if pairs else None,
+                }
+            return data
+
+
+def _iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _best_match(face, candidates, min_iou: float = 0.5):
+    best, best_iou = None, min_iou
+    for cand in candidates:
+        iou = _iou(face.bbox, cand.bbox)
+        if iou >= best_iou:
+            best, best_iou = cand, iou
+    return best
+
+
+class ModelRegistry:
+    """模型注册表：管理多个已加载的模型包，支持原子切换主模型和影子流量采样"""
+
+    def __init__(self, builder):
+        # builder(name) -> 已预热的模型实例
+        self._builder = builder
+        self._lock = threading.Lock()
+        self._models = {}
+        self._stats = {}
+        self.active = None
+        self.shadow = None
+        self.shadow_rate = 0.0
+
+    def load(self, name: str, replace: bool = False):
+        """构建并注册模型（同步，耗时操作，应在线程池中调用）"""
+        if not name:
+            raise ValueError("模型包名称不能为空")
+        if not replace and name in self._models:
+            return self._models[name]
+        model = self._builder(name)
+        with self._lock:
+            self._models[name] = model
+            self.stats(name)
+            if self.active is None:
+                self.active = name
+        logger.info(f"✅ 模型已注册：{name}")
+        return model
+
+    def unload(self, name: str):
+        """卸载模型（不能卸载当前主模型）"""
+        with self._lock:
+            if name == self.active:
+                raise ValueError(f"不能卸载当前主模型：{name}")
+            if name not in self._models:
+                raise KeyError(f"模型未加载：{name}")
+            del self._models[name]
+            if self.shadow == name:
+                self.shadow, self.shadow_rate = None, 0.0
+        logger.info(f"🗑️ 模型已卸载：{name}")
+
+    def activate(self, name: str):
+        """原子切换主模型"""
+        with self._lock:
+            if name not in self._models:
+                raise KeyError(f"模型未加载：{name}")
+            self.active = name
+            if self.shadow == name:
+                self.shadow, self.shadow_rate = None, 0.0
+        logger.info(f"🔄 主模型已切换为：{name}")
+
+    def set_shadow(self, name, rate: float):
+        """设置影子模型及采样比例（name为None时关闭）"""
+        with self._lock:
+            if name is not None:
+                if name not in self._models:
+                    raise KeyError(f"模型未加载：{name}")
+                if name == self.active:
+                    raise ValueError("影子模型不能与主模型相同")
+                if not 0 <= rate <= 1:
+                    raise ValueError("采样比例应在0~1之间")
+            self.shadow = name
+            self.shadow_rate = rate if name is not None else 0.0
+
+    def get(self, name=None):
+        """获取模型实例（默认主模型）"""
+        return self._models.get(name or self.active)
+
+    def pick_shadow(self):
+        """按采样比例决定本次请求是否镜像到影子模型，返回影子模型名或None"""
+        name, rate = self.shadow, self.shadow_rate
+        if name is not None and rate > 0 and random.random() < rate:
+            return name
+        return None
+
+    def stats(self, name: str) -> ModelStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats.setdefault(name, ModelStats(config.get("model_registry.agreement_window", 64)))
+        return stats
+
+    def describe(self) -> dict:
+        return {
+            "active": self.active,
+            "shadow": self.shadow,
+            "shadow_rate": self.shadow_rate,
+            "models": {name: self.stats(name).to_dict() for name in list(self._models)},
+        }
@@ -0,0 +1,175 @@
+import collections
+import contextlib
+import threading
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from config import config
+from core.cpu_pool import run_cpu
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+class _SourceState:
+    """单个视频源的背景模型、ROI掩码及计数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.background = None
+        self.mask = None
+        self.mask_pixels = 0
+        self.roi = None
+        self.last_motion = 0.0
+        self.last_detect = 0.0
+        self.frames = 0
+        self.skipped = 0
+        self.gate_ms = 0.0
+        self.detected = 0
+        self.detect_ms = 0.0
+
+
+class MotionGate:
+    """固定机位的运动门控：在检测前用缩小的灰度帧与背景模型做差分，ROI内无运动的帧跳过检测
+
+    背景为滑动平均（motion_gate.alpha），差分超过 pixel_threshold 的像素占 ROI 比例达到
+    min_area 即视为有运动。运动结束后 hold_seconds 内仍做检测（人停下后被背景吸收前），
+    每 force_interval 秒强制检测一次，避免静止的人长期漏检。
+    未携带视频源标识的请求不经过门控。
+    """
+
+    def __init__(self, max_sources: int = 256):
+        self.max_sources = max_sources
+        self._sources = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return config.get("motion_gate.enabled", False)
+
+    def _state(self, source: str) -> _SourceState:
+        with self._lock:
+            state = self._sources.get(source)
+            if state is None:
+                state = self._sources[source] = _SourceState()
+                if len(self._sources) > self.max_sources:
+                    self._sources.popitem(last=False)
+            else:
+                self._sources.move_to_end(source)
+            return state
+
+    @staticmethod
+    def _roi_mask(roi, shape) -> Optional[np.ndarray]:
+        """按归一化多边形坐标生成ROI掩码，未配置ROI时为None（整帧）"""
+        if not roi:
+            return None
+        height, width = shape
+        mask = np.zeros(shape, dtype=np.uint8)
+        polygons = [np.round(np.asarray(p, dtype=np.float32) * (width, height)).astype(np.int32) for p in roi]
+        cv2.fillPoly(mask, polygons, 1)
+        return mask.astype(bool)
+
+    def check(self, source: str, frame: np.ndarray) -> bool:
+        """判断该帧是否需要检测（同步版本，在CPU线程池中执行）"""
+        start = time.perf_counter()
+        state = self._state(source)
+        width = config.get("motion_gate.width", 160)
+        height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+        small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        roi = (config.get("motion_gate.sources", {}) or {}).get(source, {}).get("roi")
+        now = time.monotonic()
+        with state.lock:
+            state.frames += 1
+            if state.background is None or state.background.shape != gray.shape or state.roi != roi:
+                # 首帧、分辨率或ROI变化：重建背景，本帧照常检测
+                state.background = gray.astype(np.float32)
+                state.roi = roi
+                state.mask = self._roi_mask(roi, gray.shape)
+                state.mask_pixels = int(state.mask.sum()) if state.mask is not None else gray.size
+                moving = True
+            else:
+                changed = cv2.absdiff(gray, cv2.convertScaleAbs(state.background)) > \
+                    config.get("motion_gate.pixel_threshold", 25)
+                if state.mask is not None:
+                    changed &= state.mask
+                moving = int(changed.sum()) >= config.get("motion_gate.min_area", 0.002) * max(state.mask_pixels, 1)
+                cv2.accumulateWeighted(gray, state.background, config.get("motion_gate.alpha", 0.05))
+            if moving:
+                state.last_motion = now
+            detect = (
+                now - state.last_motion <= config.get("motion_gate.hold_seconds", 2.0)
+                or now - state.last_detect >= config.get("motion_gate.force_interval", 5.0)
+            )
+            if detect:
+                state.last_detect = now
+            else:
+                state.skipped += 1
+            state.gate_ms += (time.perf_counter() - start) * 1000
+        return detect
+
+    async def idle(self, source: Optional[str], frame: np.ndarray) -> bool:
+        """帧可以跳过检测时返回True（门控关闭或未携带视频源时始终为False）"""
+        if not source or not self.enabled:
+            return False
+        return not await run_cpu(self.check, source, frame)
+
+    @contextlib.contextmanager
+    def measure(self, source: Optional[str]):
+        """统计通过门控的帧的检测耗时（调用方用它包住检测调用），用于估算跳过帧节省的时间
+
+        按视频源记录调用方实际执行的检测（各接口的检测内容、输入尺寸不同），检测失败时不计入
+        """
+        start = time.perf_counter()
+        yield
+        if not source or not self.enabled:
+            return
+        with self._lock:
+            state = self._sources.get(source)
+        if state is not None:
+            with state.lock:
+                state.detected += 1
+                state.detect_ms += (time.perf_counter() - start) * 1000
+
+    def stats(self) -> dict:
+        """各视频源帧数、跳过数；按该视频源通过门控的帧的平均检测耗时估算节省的推理时间"""
+        with self._lock:
+            states = list(self._sources.items())
+        sources = {}
+        frames = skipped = 0
+        gate_ms = saved_ms = 0.0
+        for source, state in states:
+            with state.lock:
+                detect_avg_ms = state.detect_ms / state.detected if state.detected else 0.0
+                sources[source] = {
+                    "frames": state.frames,
+                    "skipped": state.skipped,
+                    "skip_rate": round(state.skipped / state.frames, 4) if state.frames else 0.0,
+                    "gate_avg_ms": round(state.gate_ms / state.frames, 3) if state.frames else 0.0,
+                    "detect_avg_ms": round(detect_avg_ms, 3),
+                }
+                frames += state.frames
+                skipped += state.skipped
+                gate_ms += state.gate_ms
+                saved_ms += state.skipped * detect_avg_ms
+        return {
+            "enabled": self.enabled,
+            "frames": frames,
+            "skipped": skipped,
+            "skip_rate": round(skipped / frames, 4) if frames else 0.0,
+            # 节省的推理时间 = Σ 各视频源跳过帧数 × 该视频源平均检测耗时 - 门控自身开销
+            "saved_ms": round(saved_ms - gate_ms, 1),
+            "gate_ms": round(gate_ms, 1),
+            "sources": sources,
+        }
+
+
+# 全局运动门控
+motion_gate = MotionGate(max_sources=config.get("motion_gate.max_sources", 256))
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from config import config
+from core.cpu_pool import run_cpu
+from core.crop_store import crop_store
+from core.gallery import gallery
+from core.gallery_store import store
+from core.tenant_scheduler import scheduler
+from face_process.init_InsightFace import registry, embed_chips_async
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+logger = logging.getLogger(__name__)
+
+
+def _load_chips(keys):
+    """读取一批对齐人脸（同步版本，在CPU线程池中执行），返回 (有对齐人脸的键, 对齐人脸)"""
+    found, chips = [], []
+    for identity_id, index, generation in keys:
+        item = crop_store.get(identity_id, index)
+        if item is not None:
+            found.append((identity_id, index, generation))
+            chips.append(item[0])
+    return found, chips
+
+
+class ReembedJob:
+    """模型迁移：用已保存的对齐人脸为旧版本特征重新提取，分批写回人脸库
+
+    每批以 reembed.tenant 租户身份进入推理调度（低权重），批次之间休眠 reembed.interval_ms，
+    保证在线请求优先。目标为主模型时，主模型在迁移中途再次切换则当前任务结束（superseded），
+    由切换接口按新版本重新开始；目标为已加载的候选模型时（预先迁移），不受主模型切换影响。
+    没有对齐人脸的特征（仅通过特征字符串注册）无法迁移，计入 skipped，需客户端重新注册。
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._stop = False
+        self.state = "idle"
+        self.target = None
+        self.total = 0
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, target: Optional[str] = None) -> bool:
+        """启动迁移到 target（默认当前主模型）；已有任务运行时返回False"""
+        if crop_store is None:
+            raise ValueError("未启用对齐人脸存储（crop_store.enabled），无法重新提取特征")
+        if self.running:
+            return False
+        target = target or registry.active
+        if registry.get(target) is None:
+            raise ValueError(f"模型 {target} 未加载")
+        self._stop = False
+        self.target = target
+        # 仅迁移到当时的主模型时，主模型再次切换才视为被取代；迁移到已加载的候选模型不受主模型影响
+        follow_active = target == registry.active
+        self._task = asyncio.get_running_loop().create_task(self._run(target, follow_active))
+        return True
+
+    async def stop(self):
+        """请求停止，当前批次完成后退出"""
+        self._stop = True
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def _run(self, target: str, follow_active: bool):
+        self.state = "running"
+        self.total = self.done = self.skipped = self.failed = 0
+        self.error = None
+        self.started_at, self.finished_at = time.time(), None
+        tenant = config.get("reembed.tenant", "migration")
+        try:
+            stale = await run_cpu(gallery.stale, target)
+            self.total = len(stale)
+            logger.info(f"🔄 开始重新提取特征：目标模型{target}，待迁移{self.total}条")
+            batch_size = config.get("reembed.batch_size", 32)
+            for start in range(0, len(stale), batch_size):
+                if self._stop:
+                    self.state = "stopped"
+                    return
+                if follow_active and registry.active != target:
+                    self.state = "superseded"
+                    return
+                keys, chips = await run_cpu(_load_chips, stale[start:start + batch_size])
+                self.skipped += min(batch_size, len(stale) - start) - len(keys)
+                if chips:
+                    # 排队已满或超时按退避重试，持续被拒绝时迁移失败
+                    embeddings, _ = await scheduler.run(
+                        tenant, embed_chips_async, chips, target,
+                        retries=config.get("reembed.max_retries", 10),
+                        backoff=config.get("reembed.retry_backoff", 1.0),
+                    )
+                    for (identity_id, index, generation), embedding in zip(keys, embeddings):
+                        if await self._replace(identity_id, index, embedding, target, generation):
+                            self.done += 1
+                        else:
+                            # 迁移期间身份被删除（或删除后重新注册），对应的对齐人脸已不是这张特征
+                            self.failed += 1
+                await asyncio.sleep(config.get("reembed.interval_ms", 50) / 1000)
+            self.state = "completed"
+            logger.info(f"✅ 特征迁移完成：{self.done}条已更新，{self.skipped}条缺少对齐人脸")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error("❌ 特征迁移失败", exc_info=True)
+        finally:
+            self.finished_at = time.time()
+
+    @staticmethod
+    async def _replace(identity_id: str, index: int, embedding, version: str, generation: int) -> bool:
+        """写回重新提取的特征（列出待迁移特征后身份被重新创建则跳过）；启用持久化时等待WAL落盘"""
+        if store is None:
+            return await run_cpu(gallery.replace, identity_id, index, embedding, version, generation)
+        future = await run_cpu(store.replace, identity_id, index, embedding, version, generation)
+        if future is None:
+            return False
+        await asyncio.wrap_future(future)
+        return True
+
+    def status(self) -> dict:
+        processed = self.done + self.skipped + self.failed
+        return {
+            "state": self.state,
+            "target": self.target,
+            "total": self.total,
+            "done": self.done,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "progress": round(processed / self.total, 4) if self.total else (1.0 if self.state == "completed" else 0.0),
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "versions": gallery.version_counts(),
+        }
+
+
+# 全局迁移任务
+reembed_job = ReembedJob()
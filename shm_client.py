@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+共享内存接入客户端（同机采集进程使用）
+原始BGR帧写入服务端创建的共享内存槽位，通过Unix域套接字提交，省去JPEG编码、base64和HTTP开销
+需在 config.yaml 中开启 shm.enabled
+
+示例（性能测试）：
+  python shm_client.py --image test_face.jpg --frames 500
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import statistics
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import config
+
+_LENGTH = struct.Struct("<I")
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """连接服务端创建的共享内存；由服务端负责释放，客户端不注册到资源跟踪器"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13 之前没有 track 参数，手动取消注册，避免客户端退出时误删
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class ShmFrameClient:
+    """共享内存帧提交客户端（同步，支持多槽位流水线）"""
+
+    def __init__(self, path=None, slots=4, slot_bytes=None, api_key=None, source_id=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path or config.get("shm.socket_path", "/tmp/face_recognition.sock"))
+        request = {"op": "open", "slots": slots, "api_key": api_key, "source_id": source_id}
+        if slot_bytes:
+            request["slot_bytes"] = slot_bytes
+        self._send(request)
+        reply = self._recv()
+        if reply.get("code") != 200:
+            raise RuntimeError(f"共享内存创建失败：{reply.get('msg')}")
+        self.slots = reply["slots"]
+        self.slot_bytes = reply["slot_bytes"]
+        self.shm = _attach(reply["shm"])
+        self._free = list(range(self.slots))
+        self._pending = {}
+        self._ids = itertools.count()
+
+    def _send(self, message: dict):
+        data = json.dumps(message).encode("utf-8")
+        self.sock.sendall(_LENGTH.pack(len(data)) + data)
+
+    def _recv_exact(self, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("服务端已断开")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def _recv(self) -> dict:
+        (length,) = _LENGTH.unpack(self._recv_exact(_LENGTH.size))
+        return json.loads(self._recv_exact(length))
+
+    def submit(self, frame: np.ndarray) -> str:
+        """写入空闲槽位并提交，返回 request_id；没有空闲槽位时先调用 receive()"""
+        if not self._free:
+            raise RuntimeError("没有空闲槽位，请先接收响应")
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        height, width = frame.shape[:2]
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"帧大小 {frame.nbytes} 超过槽位大小 {self.slot_bytes}")
+        slot = self._free.pop()
+        offset = slot * self.slot_bytes
+        self.shm.buf[offset:offset + frame.nbytes] = frame.reshape(-1)
+        request_id = str(next(self._ids))
+        self._pending[request_id] = slot
+        self._send({"op": "detect", "request_id": request_id, "slot": slot, "width": width, "height": height})
+        return request_id
+
+    def receive(self) -> dict:
+        """接收一条响应并释放其槽位（拒绝响应不含 slot，服务端未接收该帧，按 request_id 释放本请求的槽位）"""
+        reply = self._recv()
+        slot = self._pending.pop(reply.get("request_id"), None)
+        if reply.get("slot") is not None:
+            slot = reply["slot"]
+        if slot is not None and slot not in self._pending.values():
+            self._free.append(slot)
+        return reply
+
+    def detect(self, frame: np.ndarray) -> dict:
+        """提交单帧并等待结果"""
+        self.submit(frame)
+        return self.receive()
+
+    @property
+    def in_flight(self) -> int:
+        return self.slots - len(self._free)
+
+    def close(self):
+        self.shm.close()
+        self.sock.close()
+
+
+def main():
+    import cv2
+
+    parser = argparse.ArgumentParser(description="共享内存接入性能测试")
+    parser.add_argument("--image", required=True, help="测试图片路径")
+    parser.add_argument("--frames", type=int, default=200, help="提交帧数")
+    parser.add_argument("--slots", type=int, default=4, help="槽位数（在途帧数）")
+    args = parser.parse_args()
+
+    frame = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    client = ShmFrameClient(slots=args.slots, slot_bytes=frame.nbytes)
+    sent, latencies, codes = {}, [], {}
+    begin = time.perf_counter()
+    submitted = 0
+    while submitted < args.frames or client.in_flight:
+        if submitted < args.frames and client.in_flight < client.slots:
+            sent[client.submit(frame)] = time.perf_counter()
+            submitted += 1
+            continue
+        reply = client.receive()
+        latencies.append((time.perf_counter() - sent.pop(reply["request_id"])) * 1000)
+        codes[reply["code"]] = codes.get(reply["code"], 0) + 1
+    elapsed = time.perf_counter() - begin
+    client.close()
+
+    latencies.sort()
+    print(f"帧数 {args.frames}，槽位 {args.slots}：{args.frames / elapsed:.1f} 帧/秒，"
+          f"平均 {statistics.mean(latencies):.2f}ms，P99 {latencies[int(len(latencies) * 0.99) - 1]:.2f}ms，"
+          f"返回码 {codes}")
+
+
+if __name__ == "__main__":
+    main()
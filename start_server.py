@@ -29,5 +29,6 @@ if __name__ == "__main__":
         reload=False,
         workers=1,  # 单worker模式（模型全局单例）
         log_level="info",
-        access_log=True
+        access_log=True,
+        timeout_keep_alive=config.get("server.keep_alive", 30)  # 长连接保持时间，减少高频调用方的建连开销
     )
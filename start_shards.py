@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+单机多进程分片启动脚本（本地测试分片检索）
+每个分片一个进程，端口依次递增；协调器接口可在任一实例上调用
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import config
+
+
+def start_shards(count: int, base_port: int):
+    """启动 count 个分片实例，端口 base_port ~ base_port+count-1"""
+    host = "127.0.0.1"
+    nodes = [f"http://{host}:{base_port + i}" for i in range(count)]
+
+    print("=" * 60)
+    print(f"🚀 启动 {count} 个分片实例")
+    print("=" * 60)
+
+    processes = []
+    for i in range(count):
+        env = dict(
+            os.environ,
+            FACE_SHARD_INDEX=str(i),
+            FACE_SHARD_COUNT=str(count),
+            FACE_SHARD_NODES=",".join(nodes)
+        )
+        cmd = [
+            sys.executable, "-m", "uvicorn", "api.face_recognition_api:app",
+            "--host", host, "--port", str(base_port + i), "--workers", "1"
+        ]
+        processes.append(subprocess.Popen(cmd, env=env))
+        print(f"📍 分片 {i}: {nodes[i]}")
+
+    print(f"\n协调器检索: curl -X POST {nodes[0]}/api/cluster/search -H 'Content-Type: application/json' "
+          f"-d '{{\"embedding\": \"...\", \"top_k\": 5}}'")
+    print("按 Ctrl+C 停止所有分片")
+    try:
+        for p in processes:
+            p.wait()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            p.wait()
+        print("\n✨ 所有分片已停止")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="单机多进程分片启动")
+    parser.add_argument("--count", type=int, default=3, help="分片数量")
+    parser.add_argument("--base-port", type=int, default=config.get("server.port", 5000) + 1, help="起始端口")
+    args = parser.parse_args()
+    start_shards(args.count, args.base_port)
@@ -1,61 +1,29 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-停止服务脚本
+停止服务脚本 - 通知进程管理器优雅停止
+工作进程停止接受新请求，等待在途请求和推理任务完成后退出
 """
-import subprocess
+import argparse
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from config import config
+import supervisor
 
-def stop_server():
+def stop_server(force=False):
     """停止服务"""
-    port = config.get("server.port", 5000)
-    
     print("=" * 60)
     print("🛑 停止人脸识别服务")
     print("=" * 60)
     
-    # 查找占用端口的进程
-    check_port = subprocess.run(
-        f"lsof -ti:{port}",
-        shell=True,
-        capture_output=True,
-        text=True
-    )
-    
-    if not check_port.stdout.strip():
-        print(f"ℹ️  端口 {port} 没有运行的服务")
-        return
-    
-    pids = check_port.stdout.strip().split('\n')
-    print(f"📌 找到 {len(pids)} 个进程:")
-    for pid in pids:
-        # 获取进程信息
-        ps_info = subprocess.run(
-            f"ps -p {pid} -o pid,cmd",
-            shell=True,
-            capture_output=True,
-            text=True
-        )
-        print(ps_info.stdout)
-    
-    response = input(f"\n确认停止这些进程？(y/n): ")
-    if response.lower() != 'y':
-        print("❌ 操作取消")
-        return
-    
-    # 停止进程
-    for pid in pids:
-        subprocess.run(f"kill -9 {pid}", shell=True)
-        print(f"✅ 已停止进程 {pid}")
+    supervisor.status()
+    supervisor.stop(force)
     
-    print("\n" + "=" * 60)
-    print("✨ 服务已停止")
     print("=" * 60)
 
 if __name__ == "__main__":
-    stop_server()
+    parser = argparse.ArgumentParser(description="停止人脸识别服务")
+    parser.add_argument("--force", action="store_true", help="优雅停止超时后强制结束")
+    stop_server(parser.parse_args().force)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+服务进程管理器（Linux/macOS）
+主进程持有PID文件和监听套接字，工作进程共享同一套接字运行服务：
+  - SIGTERM/SIGINT：各工作进程停止接受新请求，等待在途请求和推理线程池排空（supervisor.drain_timeout）后退出
+  - SIGHUP：滚动重启，逐个启动新工作进程，初始化完成后再优雅停止旧进程，服务不中断
+  - 工作进程异常退出时自动拉起
+
+用法：
+  python supervisor.py start     # 后台启动
+  python supervisor.py run       # 前台运行（systemd 等外部管理器使用）
+  python supervisor.py stop      # 优雅停止
+  python supervisor.py restart   # 滚动重启
+  python supervisor.py status    # 查看状态
+"""
+import argparse
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+# 添加项目根目录到路径
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, PROJECT_ROOT)
+
+from config import config
+
+
+def _path(key: str, default: str) -> str:
+    path = config.get(key, default)
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+
+PID_FILE = _path("supervisor.pid_file", "run/face_recognition.pid")
+STATE_FILE = os.path.join(os.path.dirname(PID_FILE), "supervisor.json")
+LOG_FILE = _path("supervisor.log_file", "log/server.log")
+
+
+def read_pid():
+    """读取PID文件，进程不存在时返回None"""
+    try:
+        with open(PID_FILE) as f:
+            pid = int(f.read().strip())
+        os.kill(pid, 0)
+        return pid
+    except (OSError, ValueError):
+        return None
+
+
+def read_state() -> dict:
+    try:
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class Supervisor:
+    """主进程：管理共享监听套接字的工作进程"""
+
+    def __init__(self):
+        self.workers = config.get("supervisor.workers", 1)  # 固定为1，见 run()
+        self.drain_timeout = config.get("supervisor.drain_timeout", 30)
+        self.ready_timeout = config.get("supervisor.ready_timeout", 180)
+        self.restart_delay = config.get("supervisor.restart_delay", 2)
+        # 人脸库持久化/对齐人脸存储/批量任务按进程独占数据目录，新旧进程不能同时运行
+        self.exclusive = (
+            config.get("gallery.persist.enabled", False)
+            or config.get("crop_store.enabled", False)
+            or config.get("jobs.enabled", True)
+        )
+        self.procs = {}
+        self.sock = None
+        self._stopping = False
+        self._reload = False
+
+    # -------------------- 工作进程 --------------------
+    def _bind(self):
+        host = config.get("server.host", "0.0.0.0")
+        port = config.get("server.port", 5000)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+        print(f"📍 监听 {host}:{port}")
+
+    def _spawn(self):
+        """启动一个工作进程并等待其初始化完成，失败时返回None"""
+        read_fd, write_fd = os.pipe()
+        env = dict(os.environ, FACE_SUPERVISOR_READY_FD=str(write_fd))
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "worker", "--fd", str(self.sock.fileno())],
+            pass_fds=(self.sock.fileno(), write_fd),
+            env=env,
+            cwd=PROJECT_ROOT,
+        )
+        os.close(write_fd)
+        try:
+            ready, _, _ = select.select([read_fd], [], [], self.ready_timeout)
+            ok = bool(ready) and os.read(read_fd, 1) == b"1"
+        finally:
+            os.close(read_fd)
+        if not ok:
+            print(f"❌ 工作进程 {proc.pid} 未在 {self.ready_timeout} 秒内就绪")
+            self._terminate(proc)
+            return None
+        self.procs[proc.pid] = {"proc": proc, "started_at": time.time()}
+        print(f"✅ 工作进程 {proc.pid} 已就绪")
+        self._write_state()
+        return proc
+
+    def _terminate(self, proc, wait: bool = True):
+        """发送SIGTERM进入优雅退出，超过排空时间仍未退出则强制结束"""
+        if proc.poll() is None:
+            proc.send_signal(signal.SIGTERM)
+        if not wait:
+            return
+        try:
+            # 留出 uvicorn 等待在途请求 + 推理线程池排空 + 落盘的时间
+            proc.wait(self.drain_timeout * 2 + 10)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️ 工作进程 {proc.pid} 优雅退出超时，强制结束")
+            proc.kill()
+            proc.wait()
+        self.procs.pop(proc.pid, None)
+        self._write_state()
+
+    def _rolling_restart(self):
+        print("🔄 滚动重启工作进程...")
+        for pid in list(self.procs):
+            old = self.procs[pid]["proc"]
+            if self.exclusive:
+                # 数据目录独占：先停旧进程再启动新进程（有短暂的容量下降）
+                self._terminate(old)
+                self._spawn()
+            elif self._spawn() is not None:
+                self._terminate(old)
+            else:
+                print(f"⚠️ 新工作进程启动失败，保留旧进程 {pid}")
+            if self._stopping:
+                return
+        print("✅ 滚动重启完成")
+
+    def _write_state(self):
+        state = {
+            "master": os.getpid(),
+            "workers": [{"pid": pid, "started_at": w["started_at"]} for pid, w in self.procs.items()],
+            "updated_at": time.time(),
+        }
+        tmp = STATE_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, STATE_FILE)
+
+    # -------------------- 主循环 --------------------
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def run(self):
+        if read_pid() is not None:
+            print(f"❌ 服务已在运行（PID {read_pid()}）")
+            return 1
+        if self.workers != 1:
+            # 人脸库、租户调度、批量任务、模型注册表等状态都在进程内存中，多个工作进程各持一份：
+            # 注册的人脸只在一个进程可见，租户配额按进程数放大，批量任务/持久化目录互相争用，
+            # 共享内存接入还会互相删除对方的 shm.socket_path，因此只支持单个工作进程
+            print("❌ 人脸库、租户调度和批量任务均为进程内状态，只支持单个工作进程，请将 supervisor.workers 设为1")
+            return 1
+        os.makedirs(os.path.dirname(PID_FILE), exist_ok=True)
+        with open(PID_FILE, "w") as f:
+            f.write(str(os.getpid()))
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        try:
+            self._bind()
+            for _ in range(self.workers):
+                if self._spawn() is None:
+                    print("❌ 工作进程启动失败，请查看日志")
+                    return 1
+            while not self._stopping:
+                time.sleep(0.5)
+                if self._reload:
+                    self._reload = False
+                    self._rolling_restart()
+                for pid, worker in list(self.procs.items()):
+                    code = worker["proc"].poll()
+                    if code is not None:
+                        print(f"⚠️ 工作进程 {pid} 异常退出（返回码 {code}）")
+                        self.procs.pop(pid)
+                        self._write_state()
+                # 补足工作进程（异常退出或滚动重启时新进程启动失败）
+                if len(self.procs) < self.workers and not self._stopping:
+                    time.sleep(self.restart_delay)
+                    self._spawn()
+            print("🛑 正在优雅停止工作进程...")
+            for worker in list(self.procs.values()):
+                self._terminate(worker["proc"], wait=False)
+            for worker in list(self.procs.values()):
+                self._terminate(worker["proc"])
+            print("✨ 服务已停止")
+            return 0
+        finally:
+            for worker in list(self.procs.values()):
+                self._terminate(worker["proc"])
+            if self.sock is not None:
+                self.sock.close()
+            for path in (PID_FILE, STATE_FILE):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+# -------------------- 命令 --------------------
+def run_worker(fd: int):
+    """工作进程：在主进程传入的监听套接字上运行服务"""
+    import uvicorn
+    uvicorn.run(
+        "api.face_recognition_api:app",
+        fd=fd,
+        workers=1,  # 每个工作进程一个模型实例
+        log_level="info",
+        access_log=True,
+        timeout_keep_alive=config.get("server.keep_alive", 30),
+        # SIGTERM 后等待在途请求完成的时间，超时后进入生命周期关闭（排空推理线程池）
+        timeout_graceful_shutdown=config.get("supervisor.drain_timeout", 30),
+    )
+
+
+def start():
+    pid = read_pid()
+    if pid is not None:
+        print(f"ℹ️  服务已在运行（PID {pid}）")
+        return 0
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    with open(LOG_FILE, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "run"],
+            stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+            cwd=PROJECT_ROOT, start_new_session=True,
+        )
+    print("⏳ 等待服务初始化...")
+    deadline = time.time() + config.get("supervisor.ready_timeout", 180) + 5
+    while time.time() < deadline:
+        time.sleep(1)
+        state = read_state()
+        if read_pid() is not None and state.get("workers"):
+            print(f"✅ 服务启动成功（主进程 {state['master']}，工作进程 {[w['pid'] for w in state['workers']]}）")
+            print(f"📝 日志: tail -f {LOG_FILE}")
+            return 0
+    print(f"❌ 服务启动失败或启动时间过长，请查看日志: tail -f {LOG_FILE}")
+    return 1
+
+
+def stop(force: bool = False):
+    pid = read_pid()
+    if pid is None:
+        print("ℹ️  服务未运行")
+        return 0
+    os.kill(pid, signal.SIGTERM)
+    print(f"⏳ 已通知主进程 {pid} 优雅停止，等待在途请求完成...")
+    deadline = time.time() + config.get("supervisor.drain_timeout", 30) * 2 + 30
+    while time.time() < deadline:
+        time.sleep(0.5)
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            print("✨ 服务已停止")
+            return 0
+    if force:
+        os.killpg(os.getpgid(pid), signal.SIGKILL)
+        print("⚠️ 优雅停止超时，已强制结束")
+        return 0
+    print("⚠️ 优雅停止超时，可使用 --force 强制结束")
+    return 1
+
+
+def restart():
+    pid = read_pid()
+    if pid is None:
+        print("ℹ️  服务未运行，直接启动")
+        return start()
+    os.kill(pid, signal.SIGHUP)
+    print(f"🔄 已触发滚动重启（主进程 {pid}），进度见日志: tail -f {LOG_FILE}")
+    return 0
+
+
+def status():
+    pid = read_pid()
+    if pid is None:
+        print("🛑 服务未运行")
+        return 1
+    state = read_state()
+    print(f"✅ 服务运行中（主进程 {pid}）")
+    for worker in state.get("workers", []):
+        uptime = int(time.time() - worker["started_at"])
+        print(f"   工作进程 {worker['pid']}，已运行 {uptime} 秒")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="人脸识别服务进程管理器")
+    parser.add_argument("command", choices=("start", "run", "stop", "restart", "status", "worker"))
+    parser.add_argument("--fd", type=int, help="监听套接字文件描述符（worker 内部使用）")
+    parser.add_argument("--force", action="store_true", help="stop 超时后强制结束")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_worker(args.fd)
+        return 0
+    if args.command == "run":
+        return Supervisor().run()
+    if args.command == "stop":
+        return stop(args.force)
+    return {"start": start, "restart": restart, "status": status}[args.command]()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
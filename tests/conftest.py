@@ -0,0 +1,33 @@
+import copy
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config, Config
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+@pytest.fixture
+def set_config(monkeypatch):
+    """按点分路径临时覆盖配置项，测试结束后恢复原配置"""
+    data = copy.deepcopy(Config._config)
+    monkeypatch.setattr(Config, "_config", data)
+
+    def _set(key, value):
+        node = data
+        *parents, last = key.split(".")
+        for k in parents:
+            node = node.setdefault(k, {})
+        node[last] = value
+
+    return _set
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+import yaml
+
+from config import Config, config, validate_config
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    """把全局配置指向临时文件，测试结束后恢复"""
+    path = tmp_path / "config.yaml"
+    data = {"face_model": {"threshold": 0.5}, "jobs": {"concurrency": 2}}
+    path.write_text(yaml.safe_dump(data), encoding="utf-8")
+    os.utime(path, (1000, 1000))
+    monkeypatch.setattr(Config, "config_path", path)
+    monkeypatch.setattr(Config, "_config", data)
+    monkeypatch.setattr(Config, "_mtime", os.path.getmtime(path))
+    monkeypatch.setattr(Config, "_listeners", [])
+    return path
+
+
+def _write(path, data, mtime):
+    path.write_text(data if isinstance(data, str) else yaml.safe_dump(data), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_reload_applies_changes_and_notifies(config_file):
+    events = []
+    config.subscribe(lambda changed, old, new: events.append(changed))
+    assert not config.is_modified()
+    _write(config_file, {"face_model": {"threshold": 0.6}, "jobs": {"concurrency": 2}}, 2000)
+    assert config.is_modified()
+    changed = config.reload()
+    assert changed == {"face_model.threshold": (0.5, 0.6)}
+    assert events == [changed]
+    assert config.get("face_model.threshold") == 0.6 and not config.is_modified()
+
+
+def test_invalid_reload_keeps_old_config(config_file):
+    events = []
+    config.subscribe(lambda changed, old, new: events.append(changed))
+    _write(config_file, {"face_model": {"threshold": 0.6}, "jobs": {"concurrency": 0}}, 2000)
+    with pytest.raises(ValueError, match="jobs.concurrency"):
+        config.reload()
+    assert config.get("face_model.threshold") == 0.5 and config.get("jobs.concurrency") == 2
+    assert events == []
+    # 失败的文件不再被视为待加载，修改后重新加载成功
+    assert not config.is_modified()
+    _write(config_file, "face_model: [unclosed", 3000)
+    with pytest.raises(yaml.YAMLError):
+        config.reload()
+    assert config.get("face_model.threshold") == 0.5
+    _write(config_file, {"face_model": {"threshold": 0.7}, "jobs": {"concurrency": 2}}, 4000)
+    assert config.reload() == {"face_model.threshold": (0.5, 0.7)}
+
+
+def test_validate_config_cross_checks():
+    with pytest.raises(ValueError, match="crop_store.enabled"):
+        validate_config({"crop_store": {"enabled": True}, "gallery": {"persist": {"enabled": False}}})
+    with pytest.raises(ValueError, match="顶层"):
+        validate_config(["not", "a", "dict"])
+    validate_config({"crop_store": {"enabled": True}, "gallery": {"persist": {"enabled": True}}})
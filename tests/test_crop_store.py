@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+
+from core.crop_store import CHIP_SIZE, CropStore
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+# 每条记录约37KB，块上限0.05MB时每块容纳2条
+CHUNK_MB = 0.05
+
+
+def _chip(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (CHIP_SIZE, CHIP_SIZE, 3), dtype=np.uint8)
+
+
+def _landmarks(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).random((5, 2), dtype=np.float32) * 100
+
+
+def _chunks(data_dir) -> list:
+    return sorted(p for p in os.listdir(data_dir) if p.startswith("chunk-"))
+
+
+def test_put_get_roundtrip_and_reload(tmp_path):
+    store = CropStore(str(tmp_path), chunk_mb=CHUNK_MB)
+    for i in range(3):
+        store.put("alice", i, _chip(i), _landmarks(i))
+    store.close()
+
+    store = CropStore(str(tmp_path), chunk_mb=CHUNK_MB)
+    assert store.indices("alice") == [0, 1, 2]
+    chip, landmarks = store.get("alice", 1)
+    np.testing.assert_array_equal(chip, _chip(1))
+    np.testing.assert_allclose(landmarks, _landmarks(1))
+    assert store.get("alice", 3) is None
+    store.close()
+
+
+def test_fully_dead_old_chunks_are_reclaimed(tmp_path):
+    store = CropStore(str(tmp_path), chunk_mb=CHUNK_MB)
+    for i in range(4):
+        store.put("alice", i, _chip(i), _landmarks(i))
+    for i in range(2):
+        store.put("bob", i, _chip(10 + i), _landmarks(10 + i))
+    assert _chunks(tmp_path) == ["chunk-000001.bin", "chunk-000002.bin", "chunk-000003.bin"]
+
+    store.remove("alice")
+    # alice 占满的前两块全部失效后被回收，bob 所在块保留；删除记录写入新块
+    assert _chunks(tmp_path) == ["chunk-000003.bin", "chunk-000004.bin"]
+    assert store.get("alice", 0) is None
+    np.testing.assert_array_equal(store.get("bob", 1)[0], _chip(11))
+    store.close()
+
+    store = CropStore(str(tmp_path), chunk_mb=CHUNK_MB)
+    assert store.keys() == [("bob", 0), ("bob", 1)]
+    store.close()
+
+
+def test_reclaim_stops_at_first_live_chunk(tmp_path):
+    """只从最旧的块开始回收：中间块即使已失效，也要等更旧的块失效后才删除（保留删除记录的顺序语义）"""
+    store = CropStore(str(tmp_path), chunk_mb=CHUNK_MB)
+    store.put("bob", 0, _chip(0), _landmarks(0))
+    store.put("bob", 1, _chip(1), _landmarks(1))
+    for i in range(2):
+        store.put("alice", i, _chip(10 + i), _landmarks(10 + i))
+    store.put("carol", 0, _chip(20), _landmarks(20))
+    store.remove("alice")
+    assert len(_chunks(tmp_path)) == 3
+
+    store.remove("bob")
+    assert len(_chunks(tmp_path)) == 1
+    assert store.keys() == [("carol", 0)]
+    store.close()
+
+
+def test_overwrite_releases_old_record(tmp_path):
+    store = CropStore(str(tmp_path), chunk_mb=CHUNK_MB)
+    store.put("alice", 0, _chip(0), _landmarks(0))
+    store.put("alice", 1, _chip(1), _landmarks(1))
+    # 重新提取后覆盖同一下标，旧块中的记录全部失效
+    store.put("alice", 0, _chip(2), _landmarks(2))
+    store.put("alice", 1, _chip(3), _landmarks(3))
+    assert len(_chunks(tmp_path)) == 1
+    np.testing.assert_array_equal(store.get("alice", 0)[0], _chip(2))
+    store.close()
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    store = CropStore(str(tmp_path), chunk_mb=CHUNK_MB)
+    store.put("alice", 0, _chip(0), _landmarks(0))
+    store.close()
+    path = os.path.join(tmp_path, _chunks(tmp_path)[-1])
+    valid = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(b"\xff\xff\x00\x00partial")
+
+    store = CropStore(str(tmp_path), chunk_mb=CHUNK_MB)
+    assert os.path.getsize(path) == valid
+    assert store.indices("alice") == [0]
+    store.close()
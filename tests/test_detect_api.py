@@ -0,0 +1,94 @@
+import base64
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("slowapi")
+pytest.importorskip("httpx")
+pytest.importorskip("torch")
+pytest.importorskip("insightface")
+
+from fastapi.testclient import TestClient
+
+import api.face_recognition_api as face_api
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+def _face(x: float):
+    return types.SimpleNamespace(
+        bbox=np.array([x, 10, x + 40, 60], dtype=np.float32),
+        det_score=np.float32(0.987654),
+        kps=np.array([[x + 10, 20], [x + 30, 20], [x + 20, 35], [x + 12, 48], [x + 28, 48]], dtype=np.float32),
+    )
+
+
+def _png() -> bytes:
+    return cv2.imencode(".png", np.full((64, 64, 3), 128, dtype=np.uint8))[1].tobytes()
+
+
+@pytest.fixture
+def client(monkeypatch, set_config):
+    """不启动生命周期（不加载模型），检测函数替换为按 face_count 返回人脸"""
+    set_config("rate_limit.detect", "1000/second")
+    set_config("tenants.require_key", False)
+    set_config("motion_gate.enabled", False)
+    state = types.SimpleNamespace(face_count=1, input_sizes=[])
+
+    async def detect_only(frame, input_size=None):
+        state.input_sizes.append(input_size)
+        return [_face(10 + 50 * i) for i in range(state.face_count)]
+
+    monkeypatch.setattr(face_api, "detect_only_async", detect_only)
+    state.post = lambda **data: TestClient(face_api.app).post(
+        "/api/face/detect", files={"image": ("f.png", _png(), "image/png")}, data=data
+    )
+    return state
+
+
+def test_detect_returns_codes_like_extract(client):
+    for count, code, retry in ((1, 200, None), (0, 201, 800), (2, 202, 1000)):
+        client.face_count = count
+        resp = client.post()
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["code"] == code and body["data"]["retry_interval"] == retry
+        assert len(body["data"]["faces"]) == count
+    client.face_count = 1
+    face, = client.post().json()["data"]["faces"]
+    assert face["bbox"] == [10, 10, 50, 60]
+    assert face["det_score"] == 0.9877
+    assert len(face["landmarks"]) == 5 and face["landmarks"][0] == [20.0, 20.0]
+
+
+def test_detect_input_size(client, set_config):
+    client.post(det_size="320")
+    set_config("face_detect.det_size", [480, 480])
+    client.post()
+    assert client.input_sizes == [(320, 320), (480, 480)]
+    resp = client.post(det_size="300")
+    assert resp.status_code == 400 and "det_size" in resp.json()["msg"]
+
+
+def test_detect_rejects_bad_image(client):
+    resp = TestClient(face_api.app).post(
+        "/api/face/detect", files={"image": ("f.png", b"not an image", "image/png")}
+    )
+    assert resp.status_code == 400 and resp.json()["code"] == 400
+    assert client.input_sizes == []
+
+
+def test_detect_json_body(client):
+    """JSON 请求体（base64 图片）与表单上传走同一检测流程"""
+    image = "data:image/png;base64," + base64.b64encode(_png()).decode()
+    resp = TestClient(face_api.app).post("/api/face/detect", json={"image": image, "det_size": 320})
+    assert resp.status_code == 200 and resp.json()["code"] == 200
+    assert client.input_sizes == [(320, 320)]
@@ -0,0 +1,103 @@
+import base64
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from core.face_core import (
+    _HEADER, _SCALE, _encode_embedding, _pack_embedding, _parse_embedding, resolve_versions,
+    versions_compatible,
+)
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+@pytest.fixture
+def embedding() -> np.ndarray:
+    vec = np.random.default_rng(0).normal(size=512).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def _cosine(a, b) -> float:
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+@pytest.mark.parametrize("wire_format, min_cos, ratio", [
+    ("float32", 1.0 - 1e-7, 1.0),
+    ("float16", 0.9999, 0.5),
+    ("int8", 0.999, 0.25),
+])
+def test_compact_roundtrip(embedding, wire_format, min_cos, ratio):
+    encoded = _encode_embedding(embedding, "buffalo_l", wire_format)
+    version, decoded = _parse_embedding(encoded)
+    assert version == "buffalo_l"
+    assert decoded.dtype == np.float32 and decoded.shape == embedding.shape
+    assert _cosine(decoded, embedding) >= min_cos
+    header = _HEADER.size + len("buffalo_l") + (_SCALE.size if wire_format == "int8" else 0)
+    assert len(base64.b64decode(encoded)) - header == embedding.nbytes * ratio
+
+
+def test_compact_without_version(embedding):
+    version, decoded = _parse_embedding(_encode_embedding(embedding, None, "float16"))
+    assert version is None
+    assert _cosine(decoded, embedding) > 0.9999
+
+
+def test_raw_is_legacy_base64_by_default(embedding, set_config):
+    set_config("embedding.version_tag", False)
+    encoded = _encode_embedding(embedding, "buffalo_l", "raw")
+    assert base64.b64decode(encoded) == embedding.tobytes()
+    assert _parse_embedding(encoded) == (None, pytest.approx(embedding))
+
+
+def test_raw_with_version_tag(embedding, set_config):
+    set_config("embedding.version_tag", True)
+    encoded = _encode_embedding(embedding, "buffalo_l", "raw")
+    assert encoded.startswith("buffalo_l:")
+    version, decoded = _parse_embedding(encoded)
+    assert version == "buffalo_l"
+    np.testing.assert_array_equal(decoded, embedding)
+
+
+def test_legacy_bytes_starting_with_magic_parse_as_raw():
+    """旧格式float32字节恰好以魔数开头时，长度与头部不符，仍按旧格式解析"""
+    vec = np.frombuffer(b"FEMB" + bytes(508), dtype=np.float32)
+    version, decoded = _parse_embedding(base64.b64encode(vec.tobytes()).decode("utf-8"))
+    assert version is None
+    np.testing.assert_array_equal(decoded, vec)
+
+
+def test_unknown_wire_version_is_rejected(embedding):
+    raw = bytearray(_pack_embedding(embedding, "float32", "buffalo_l"))
+    raw[4] = 9
+    with pytest.raises(ValueError):
+        _parse_embedding(base64.b64encode(bytes(raw)).decode("utf-8"))
+
+
+def test_invalid_length_is_rejected():
+    with pytest.raises(ValueError):
+        _parse_embedding(base64.b64encode(b"\x00" * 6).decode("utf-8"))
+
+
+def test_versions_compatible():
+    assert versions_compatible(["a", None, "a"])
+    assert not versions_compatible(["a", "b"])
+
+
+def test_declared_model_version_refuses_untagged_mismatch(embedding, set_config):
+    """默认的纯base64特征不带版本：声明已知特征来自旧模型后，与主模型提取的当前特征比较被拒绝"""
+    set_config("embedding.version_tag", False)
+    current, known = _encode_embedding(embedding, "buffalo_l", "raw"), _encode_embedding(embedding, "buffalo_s", "raw")
+    versions = [_parse_embedding(current)[0], _parse_embedding(known)[0]]
+    assert versions == [None, None] and versions_compatible(versions)
+    assert not versions_compatible(resolve_versions(versions, "buffalo_s", "buffalo_l"))
+    assert versions_compatible(resolve_versions(versions, "buffalo_l", "buffalo_l"))
+    # 带版本的特征以自身版本为准
+    assert not versions_compatible(resolve_versions(["buffalo_s", None], "buffalo_l", "buffalo_l"))
+    assert resolve_versions([None, "buffalo_s"], None, "buffalo_l") == [None, "buffalo_s"]
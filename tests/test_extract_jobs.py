@@ -0,0 +1,172 @@
+import asyncio
+import json
+import os
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("insightface")
+
+from core.tenant_scheduler import TenantScheduler
+from face_process import extract_jobs
+from face_process.extract_jobs import JobManager
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+def _image(seed: int) -> bytes:
+    frame = np.random.default_rng(seed).integers(0, 255, size=(32, 32, 3), dtype=np.uint8)
+    return cv2.imencode(".png", frame)[1].tobytes()
+
+
+async def _fake_detect(frame):
+    face = types.SimpleNamespace(
+        bbox=np.array([1, 2, 30, 31], dtype=np.float32),
+        embedding=np.full(8, float(frame[0, 0, 0]), dtype=np.float32) + 1,
+        model_version="buffalo_l",
+    )
+    return [face]
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch, set_config):
+    set_config("jobs.concurrency", 2)
+    set_config("jobs.max_running", 1)
+    set_config("jobs.retry_backoff", 0.01)
+    set_config("tenants.queue_timeout", 0.02)
+    set_config("tenants.quotas", {})
+    monkeypatch.setattr(extract_jobs, "detect_faces_async", _fake_detect)
+    monkeypatch.setattr(extract_jobs, "scheduler", TenantScheduler(slots=2))
+    return tmp_path / "jobs"
+
+
+async def _wait(manager: JobManager, job_id: str, timeout: float = 5.0) -> dict:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while manager.get(job_id).meta["status"] in extract_jobs.ACTIVE_STATES:
+        assert asyncio.get_running_loop().time() < deadline, "任务未在限定时间内结束"
+        await asyncio.sleep(0.01)
+    return manager.get(job_id).to_dict()
+
+
+def test_job_fails_after_scheduler_retries(jobs, set_config):
+    """推理调度持续拒绝时按 jobs.max_retries 重试后任务标记为失败，而不是无限重试"""
+    set_config("jobs.max_retries", 2)
+    set_config("jobs.concurrency", 1)
+    set_config("tenants.quotas", {"batch": {"max_concurrency": 0}})
+
+    async def main():
+        manager = JobManager(str(jobs))
+        await manager.start()
+        try:
+            job = await manager.submit("t", images=[_image(i) for i in range(4)])
+            return await _wait(manager, job.id)
+        finally:
+            await manager.stop()
+
+    data = asyncio.run(main())
+    assert data["status"] == "failed" and data["error"]
+    assert data["done"] == 0
+    rejected = extract_jobs.scheduler.stats()["tenants"]["batch"]["rejected"]
+    assert rejected == {"timeout": 3}  # 第一张图片尝试 1 + max_retries 次后任务失败
+
+
+def _results(job_dir) -> list:
+    with open(job_dir / "results.jsonl", "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_resume_continues_rows_after_restart(jobs, monkeypatch):
+    """中途停止（含半写的结果行和特征行）后重启恢复：每张图片恰好一条结果，特征行号连续且与图片对应"""
+    images = [_image(i) for i in range(8)]
+    processed = 0
+
+    async def stalling_detect(frame):
+        nonlocal processed
+        if processed >= 3:
+            await asyncio.Event().wait()  # 模拟服务在处理中被停止
+        processed += 1
+        return await _fake_detect(frame)
+
+    async def first_run():
+        manager = JobManager(str(jobs))
+        await manager.start()
+        job = await manager.submit("t", images=images, output="binary")
+        while manager.get(job.id).meta["done"] < 3:
+            await asyncio.sleep(0.01)
+        await manager.stop()
+        return job.id, manager.get(job.id).meta["status"]
+
+    monkeypatch.setattr(extract_jobs, "detect_faces_async", stalling_detect)
+    job_id, status = asyncio.run(first_run())
+    assert status == "running"
+    job_dir = jobs / job_id
+    # 停止瞬间的半写数据：结果行不完整、特征行只写了一半
+    with open(job_dir / "results.jsonl", "ab") as f:
+        f.write(b'{"index": 7, "co')
+    with open(job_dir / "embeddings.f32", "ab") as f:
+        f.write(b"\x00" * 10)
+
+    async def second_run():
+        manager = JobManager(str(jobs))
+        await manager.start()
+        try:
+            return await _wait(manager, job_id)
+        finally:
+            await manager.stop()
+
+    monkeypatch.setattr(extract_jobs, "detect_faces_async", _fake_detect)
+    data = asyncio.run(second_run())
+    assert data["status"] == "completed" and data["done"] == 8 and data["codes"] == {"200": 8}
+    results = _results(job_dir)
+    assert sorted(r["index"] for r in results) == list(range(8))
+    assert sorted(r["row"] for r in results) == list(range(8))
+    matrix = np.fromfile(job_dir / "embeddings.f32", dtype=np.float32).reshape(-1, data["dim"])
+    assert len(matrix) == 8
+    for r in results:
+        frame = cv2.imdecode(np.frombuffer(images[r["index"]], np.uint8), cv2.IMREAD_COLOR)
+        assert matrix[r["row"]][0] == float(frame[0, 0, 0]) + 1
+
+
+def test_local_paths_must_be_inside_allowed_roots(jobs, tmp_path, set_config):
+    allowed = tmp_path / "images"
+    outside = tmp_path / "private"
+    for d in (allowed / "sub", outside):
+        d.mkdir(parents=True)
+    (allowed / "sub" / "a.png").write_bytes(_image(1))
+    (allowed / "notes.txt").write_text("not an image")
+    (outside / "b.png").write_bytes(_image(2))
+    (allowed / "escape.png").symlink_to(outside / "b.png")
+    set_config("jobs.allowed_roots", [str(allowed)])
+
+    async def main():
+        manager = JobManager(str(jobs))
+        await manager.start()
+        try:
+            # 目录外路径、.. 跳出、目录内指向外部的符号链接均被拒绝
+            for kwargs in ({"path": str(outside)}, {"path": str(allowed / ".." / "private")}, {"path": str(allowed)}):
+                with pytest.raises(ValueError, match="allowed_roots"):
+                    await manager.submit("t", **kwargs)
+            manifest = allowed / "list.txt"
+            manifest.write_text("sub/a.png\nescape.png\n")
+            with pytest.raises(ValueError, match="allowed_roots"):
+                await manager.submit("t", manifest=str(manifest))
+            # 校验失败不留下任务目录
+            assert [p for p in os.listdir(jobs) if not p.startswith(".")] == []
+            manifest.write_text("sub/a.png\n")
+            by_manifest = await manager.submit("t", manifest=str(manifest))
+            (allowed / "escape.png").unlink()
+            by_path = await manager.submit("t", path=str(allowed))
+            return [await _wait(manager, job.id) for job in (by_manifest, by_path)]
+        finally:
+            await manager.stop()
+
+    for data in asyncio.run(main()):
+        assert data["status"] == "completed" and data["total"] == 1 and data["codes"] == {"200": 1}
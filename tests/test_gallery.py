@@ -0,0 +1,132 @@
+import numpy as np
+
+from core.gallery import Gallery, _medoids, _normalize
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+DIM = 16
+
+
+def _vec(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=DIM).astype(np.float32)
+
+
+def _expected_row(gallery: Gallery, identity_id: str, version) -> np.ndarray:
+    """从全部特征重新计算的模板行"""
+    ident = gallery._identities[identity_id]
+    vecs = np.stack([v for v, ver in zip(ident.embeddings, ident.versions) if ver == version])
+    row = np.empty((1 + gallery.exemplars, DIM), dtype=np.float32)
+    row[:] = _normalize(vecs.sum(axis=0))
+    exemplars = _medoids(vecs, gallery.exemplars)
+    row[1:1 + len(exemplars)] = exemplars
+    return row
+
+
+def _assert_templates_exact(gallery: Gallery):
+    gallery.search(_vec(999))  # 触发代表样本延迟重算
+    for version, table in gallery._tables.items():
+        for identity_id, idx in table.index.items():
+            np.testing.assert_allclose(table.templates[idx], _expected_row(gallery, identity_id, version), atol=1e-5)
+            assert gallery._ids[table.owners[idx]] == identity_id
+
+
+def test_incremental_templates_match_full_rebuild():
+    gallery = Gallery(dim=DIM, exemplars=2)
+    rng = np.random.default_rng(0)
+    for step in range(200):
+        identity_id = f"user-{rng.integers(8)}"
+        op = rng.integers(10)
+        ident = gallery._identities.get(identity_id)
+        if op == 0 and ident is not None:
+            gallery.remove(identity_id)
+        elif op < 3 and ident is not None:
+            index = int(rng.integers(len(ident.embeddings)))
+            gallery.replace(identity_id, index, _vec(step), rng.choice(["v1", "v2"]))
+        else:
+            gallery.enroll(identity_id, _vec(step), rng.choice(["v1", "v2"]))
+    _assert_templates_exact(gallery)
+    # 累加和中不残留已不存在的版本
+    for ident in gallery._identities.values():
+        assert set(ident.counts) == set(ident.versions)
+
+
+def test_replace_moves_identity_between_version_tables():
+    gallery = Gallery(dim=DIM)
+    gallery.enroll("alice", _vec(1), "v1")
+    gallery.replace("alice", 0, _vec(2), "v2")
+    assert "v1" not in gallery._tables and "alice" in gallery._tables["v2"].index
+    _assert_templates_exact(gallery)
+
+
+def test_search_ranks_enrolled_identity_first():
+    gallery = Gallery(dim=DIM, exemplars=2, shortlist=3)
+    rng = np.random.default_rng(1)
+    people = {f"user-{i}": _vec(i) for i in range(30)}
+    for identity_id, center in people.items():
+        for _ in range(4):
+            gallery.enroll(identity_id, center + rng.normal(scale=0.2, size=DIM), "v1")
+    probe = people["user-7"] + rng.normal(scale=0.2, size=DIM)
+    results = gallery.search(probe, top_k=2)
+    assert results[0]["identity_id"] == "user-7"
+    assert len(results) == 2 and 0 <= results[0]["best_index"] < 4
+    # 只注册了 v1 特征的人脸库对 v2 探针没有结果
+    assert gallery.search(probe, version="v2") == []
+
+
+def test_load_builds_same_templates_as_enroll():
+    records = [(f"user-{i % 3}", _vec(i), "v1" if i % 2 else None) for i in range(12)]
+    loaded, enrolled = Gallery(dim=DIM), Gallery(dim=DIM)
+    loaded.load(records)
+    for identity_id, vec, version in records:
+        enrolled.enroll(identity_id, vec, version)
+    _assert_templates_exact(loaded)
+    probe = _vec(3)
+    assert loaded.search(probe) == enrolled.search(probe)
+
+
+def test_replace_skips_identity_recreated_after_listing():
+    gallery = Gallery(dim=DIM)
+    gallery.enroll("alice", _vec(1), "v1")
+    (_, index, generation), = gallery.stale("v2")
+    gallery.remove("alice")
+    gallery.enroll("alice", _vec(2), "v2")
+    assert not gallery.replace("alice", index, _vec(3), "v2", expected_generation=generation)
+    np.testing.assert_allclose(gallery.get("alice")[0], _normalize(_vec(2)))
+    (_, _, current), = gallery.stale("v3")
+    assert current != generation
+    assert gallery.replace("alice", 0, _vec(3), "v3", expected_generation=current)
+
+
+def test_exemplars_recall_identity_missed_by_centroid():
+    """两种差异很大的姿态：均值模板偏离探针时，代表样本仍让身份进入候选"""
+    rng = np.random.default_rng(5)
+    front, side = _vec(100), _vec(101)
+    gallery = Gallery(dim=DIM, exemplars=2, shortlist=1)
+    for _ in range(6):
+        gallery.enroll("alice", front + rng.normal(scale=0.05, size=DIM), "v1")
+    gallery.enroll("alice", side, "v1")
+    # 干扰身份：接近 side 与 front 的中间方向，均值模板得分高于 alice 的均值模板
+    gallery.enroll("mallory", _normalize(side) + 0.6 * _normalize(front), "v1")
+    probe = side + rng.normal(scale=0.05, size=DIM)
+    table = gallery._tables["v1"]
+    gallery.search(probe)
+    centroids = {i: float(table.templates[table.index[i], 0] @ _normalize(probe)) for i in ("alice", "mallory")}
+    assert centroids["mallory"] > centroids["alice"]
+    result, = gallery.search(probe, top_k=1)
+    assert result["identity_id"] == "alice" and result["best_index"] == 6
+
+
+def test_search_during_migration_scores_only_matching_version():
+    gallery = Gallery(dim=DIM)
+    gallery.enroll("alice", _vec(1), "v1")
+    gallery.enroll("alice", _vec(2), "v2")
+    gallery.enroll("bob", _vec(3), "v1")
+    result, = gallery.search(_vec(1), version="v2")
+    # 与 v1 特征完全相同的探针在 v2 空间中只能与 alice 的 v2 特征比较，bob 不在 v2 表中
+    assert result["identity_id"] == "alice" and result["best_index"] == 1
+    assert {r["identity_id"] for r in gallery.search(_vec(1))} == {"alice", "bob"}
+    assert gallery.stats()["model_versions"] == {"v1": 2, "v2": 1}
@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+import pytest
+
+from core.gallery import Gallery
+from core.gallery_store import GalleryStore
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+DIM = 8
+
+
+def _vec(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=DIM).astype(np.float32)
+
+
+def _open(data_dir) -> GalleryStore:
+    store = GalleryStore(Gallery(dim=DIM), str(data_dir), group_commit_ms=1)
+    store.recover()
+    store.start()
+    return store
+
+
+def _reopen(data_dir):
+    gallery = Gallery(dim=DIM)
+    stats = GalleryStore(gallery, str(data_dir)).recover()
+    return gallery, stats
+
+
+def _segment(data_dir) -> str:
+    segments = sorted(p for p in os.listdir(data_dir) if p.startswith("wal-"))
+    return os.path.join(data_dir, segments[-1])
+
+
+def test_wal_replays_enroll_replace_remove(tmp_path):
+    store = _open(tmp_path)
+    for i in range(3):
+        store.enroll("alice", _vec(i), "buffalo_l")[1].result()
+    store.enroll("bob", _vec(10))[1].result()
+    store.replace("alice", 1, _vec(20), "antelopev2").result()
+    store.remove("bob").result()
+    store.close()
+
+    gallery, stats = _reopen(tmp_path)
+    assert stats["wal_records"] == 6
+    assert gallery.get("bob") is None
+    alice = gallery.get("alice")
+    assert len(alice) == 3
+    np.testing.assert_allclose(alice[1], _vec(20) / np.linalg.norm(_vec(20)), rtol=1e-6)
+    assert gallery.version_counts() == {"buffalo_l": 2, "antelopev2": 1}
+
+
+def test_replace_of_recreated_identity_is_not_logged(tmp_path):
+    """迁移期间身份被删除后重新注册：按旧 generation 的替换被拒绝，也不写入WAL"""
+    store = _open(tmp_path)
+    store.enroll("alice", _vec(1), "buffalo_l")[1].result()
+    (_, index, generation), = store.gallery.stale("antelopev2")
+    store.remove("alice").result()
+    store.enroll("alice", _vec(2), "antelopev2")[1].result()
+    seq = store.seq
+    assert store.replace("alice", index, _vec(3), "antelopev2", generation) is None
+    assert store.seq == seq
+    store.close()
+    gallery, _ = _reopen(tmp_path)
+    alice, = gallery.get("alice")
+    np.testing.assert_allclose(alice, _vec(2) / np.linalg.norm(_vec(2)), rtol=1e-6)
+
+
+def test_enroll_many_commits_together(tmp_path):
+    store = _open(tmp_path)
+    count, future = store.enroll_many("alice", [("buffalo_l", _vec(i)) for i in range(4)])
+    assert count == 4 and future.result(timeout=5)
+    assert store.seq == 4
+    store.close()
+    gallery, _ = _reopen(tmp_path)
+    assert len(gallery.get("alice")) == 4
+
+
+def test_enroll_many_is_one_queue_item(tmp_path):
+    """多条注册记录作为一个队列项入队（写线程未启动时检查队列内容）"""
+    store = GalleryStore(Gallery(dim=DIM), str(tmp_path))
+    store.recover()
+    store.enroll_many("alice", [(None, _vec(i)) for i in range(3)])
+    assert store._queue.qsize() == 1
+
+
+def test_enroll_many_rejects_whole_request(tmp_path):
+    """任一特征不合法（维度不符、零向量）时整个请求被拒绝，内存和WAL都不变"""
+    store = _open(tmp_path)
+    for bad in (np.zeros(DIM, np.float32), np.ones(DIM + 1, np.float32)):
+        with pytest.raises(ValueError):
+            store.enroll_many("alice", [(None, _vec(1)), (None, bad)])
+    assert store.gallery.get("alice") is None and store.seq == 0
+    store.close()
+    gallery, stats = _reopen(tmp_path)
+    assert stats["wal_records"] == 0 and len(gallery) == 0
+
+
+def test_torn_tail_is_ignored_and_truncated(tmp_path):
+    """崩溃留下的半写尾部记录在恢复时被丢弃并截断，之后追加的记录可以正常回放"""
+    store = _open(tmp_path)
+    store.enroll("alice", _vec(1))[1].result()
+    store.enroll("alice", _vec(2))[1].result()
+    store.close()
+    path = _segment(tmp_path)
+    valid = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    store = _open(tmp_path)
+    assert os.path.getsize(path) == valid
+    assert len(store.gallery.get("alice")) == 2
+    store.enroll("alice", _vec(3))[1].result()
+    store.close()
+
+    gallery, _ = _reopen(tmp_path)
+    assert len(gallery.get("alice")) == 3
+
+
+def test_corrupted_record_stops_replay(tmp_path):
+    store = _open(tmp_path)
+    store.enroll("alice", _vec(1))[1].result()
+    path = _segment(tmp_path)
+    first = os.path.getsize(path)
+    store.enroll("bob", _vec(2))[1].result()
+    store.close()
+
+    # 翻转第二条记录中的一个字节，CRC校验失败
+    with open(path, "r+b") as f:
+        f.seek(first + 12)
+        byte = f.read(1)
+        f.seek(first + 12)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    gallery, stats = _reopen(tmp_path)
+    assert stats["wal_records"] == 1
+    assert gallery.get("bob") is None
+    assert os.path.getsize(path) == first
+
+
+def test_snapshot_covers_old_segments(tmp_path):
+    store = _open(tmp_path)
+    for i in range(5):
+        store.enroll(f"user-{i}", _vec(i), "buffalo_l")[1].result()
+    result = store.snapshot()
+    store.enroll("user-5", _vec(5), "buffalo_l")[1].result()
+    store.remove("user-0").result()
+    store.close()
+
+    assert result == {"records": 5, "seq": 5, "elapsed_ms": result["elapsed_ms"]}
+    assert len([p for p in os.listdir(tmp_path) if p.startswith("wal-")]) == 1
+    gallery, stats = _reopen(tmp_path)
+    assert stats["snapshot_records"] == 5 and stats["wal_records"] == 2
+    assert len(gallery) == 5 and gallery.get("user-0") is None
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+grpc = pytest.importorskip("grpc")
+pytest.importorskip("torch")
+pytest.importorskip("insightface")
+
+from api.face_recognition_grpc import FaceRecognitionServicer
+from api.proto import face_recognition_pb2 as pb2
+from api.proto import face_recognition_pb2_grpc as pb2_grpc
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+async def _requests(count: int, error: Exception = None):
+    for i in range(count):
+        await asyncio.sleep(0)
+        yield f"req-{i}"
+    if error is not None:
+        raise error
+
+
+async def _echo(request, tenant):
+    await asyncio.sleep(0.001)
+    return request
+
+
+async def _collect(stream):
+    return [item async for item in stream]
+
+
+def test_stream_returns_all_results_then_ends():
+    servicer = FaceRecognitionServicer()
+    results = asyncio.run(asyncio.wait_for(_collect(servicer._stream(_requests(20), _echo, "t")), 5))
+    assert sorted(results) == sorted(f"req-{i}" for i in range(20))
+
+
+def test_stream_reader_error_is_raised_not_hung():
+    """请求流读取出错（如客户端断开）时响应生成器重新抛出异常，而不是一直等待结束标记"""
+    servicer = FaceRecognitionServicer()
+    received = []
+
+    async def main():
+        async for item in servicer._stream(_requests(3, ConnectionResetError("client gone")), _echo, "t"):
+            received.append(item)
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(asyncio.wait_for(main(), 5))
+    assert len(received) <= 3
+
+
+def test_stream_handler_error_is_raised():
+    servicer = FaceRecognitionServicer()
+
+    async def broken(request, tenant):
+        raise RuntimeError("handler bug")
+
+    with pytest.raises(RuntimeError, match="handler bug"):
+        asyncio.run(asyncio.wait_for(_collect(servicer._stream(_requests(2), broken, "t")), 5))
+
+
+def test_unary_errors_end_with_status(set_config):
+    """一元调用的错误返回码以 gRPC 状态结束，流式调用逐条返回码"""
+    set_config("tenants.require_key", False)
+
+    async def main():
+        server = grpc.aio.server()
+        pb2_grpc.add_FaceRecognitionServicer_to_server(FaceRecognitionServicer(), server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+        try:
+            async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                stub = pb2_grpc.FaceRecognitionStub(channel)
+                codes = {}
+                bad_image = pb2.ExtractRequest(request_id="x", image=b"not an image")
+                mismatch = pb2.CalculateRequest(
+                    request_id="m",
+                    current=pb2.Embedding(values=[1.0, 0.0], model_version="buffalo_l"),
+                    known=[pb2.Embedding(values=[1.0, 0.0], model_version="buffalo_s")],
+                )
+                wrong_dim = pb2.CalculateRequest(
+                    request_id="d", current=pb2.Embedding(values=[1.0, 0.0]), known=[pb2.Embedding(values=[1.0])]
+                )
+                for name, call in (("extract", stub.Extract(bad_image)), ("mismatch", stub.Calculate(mismatch)),
+                                   ("wrong_dim", stub.Calculate(wrong_dim))):
+                    with pytest.raises(grpc.aio.AioRpcError) as info:
+                        await call
+                    codes[name] = info.value.code()
+                streamed = [r async for r in stub.ExtractStream(iter([bad_image]))]
+                set_config("tenants.require_key", True)
+                with pytest.raises(grpc.aio.AioRpcError) as info:
+                    await stub.Extract(bad_image)
+                codes["no_key"] = info.value.code()
+                return codes, streamed
+        finally:
+            await server.stop(None)
+
+    codes, streamed = asyncio.run(main())
+    assert codes == {
+        "extract": grpc.StatusCode.INVALID_ARGUMENT,
+        "mismatch": grpc.StatusCode.FAILED_PRECONDITION,
+        "wrong_dim": grpc.StatusCode.INVALID_ARGUMENT,
+        "no_key": grpc.StatusCode.UNAUTHENTICATED,
+    }
+    assert [(r.request_id, r.code) for r in streamed] == [("x", 400)]
@@ -0,0 +1,75 @@
+import types
+
+import numpy as np
+import pytest
+
+from face_process.model_registry import ModelRegistry, ModelStats
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+def _face(bbox, embedding):
+    return types.SimpleNamespace(bbox=np.asarray(bbox, dtype=np.float32), embedding=embedding)
+
+
+def _people(n: int, dim: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_agreement_is_measured_in_each_models_own_space(set_config):
+    """主模型与影子模型特征空间不同（随机旋转、维度不同），同人/异人判定仍应完全一致"""
+    set_config("face_model.threshold", 0.5)
+    primary_ids, shadow_ids = _people(4, 512, 0), _people(4, 128, 1)
+    rng = np.random.default_rng(2)
+    stats = ModelStats(window=16)
+    for i in range(12):
+        person = i % 4
+        box = [10, 10, 60, 60]
+        p = primary_ids[person] + rng.normal(scale=0.1, size=512)
+        s = shadow_ids[person] + rng.normal(scale=0.1, size=128)
+        stats.record_agreement([_face(box, p)], [_face(box, s)], "buffalo_l", "buffalo_s")
+    shadow = stats.to_dict()["shadow"]
+    assert shadow["compared"] == 12 and shadow["face_count_agree_rate"] == 1.0
+    assert shadow["decision_pairs"] == 66
+    assert shadow["decision_agree_rate"] == 1.0
+    assert shadow["primary_match_rate"] == pytest.approx(12 / 66, abs=1e-4)
+
+
+def test_disagreeing_shadow_and_per_model_threshold(set_config):
+    set_config("face_model.threshold", 0.5)
+    # 影子模型阈值过低：把所有人都判为同一人
+    set_config("model_registry.thresholds", {"buffalo_s": -1.0})
+    ids = _people(3, 64, 0)
+    stats = ModelStats()
+    for i in range(3):
+        face = [_face([0, 0, 50, 50], ids[i])]
+        stats.record_agreement(face, [_face([1, 1, 50, 50], ids[i])], "buffalo_l", "buffalo_s")
+    shadow = stats.to_dict()["shadow"]
+    assert shadow["decision_pairs"] == 3
+    assert shadow["decision_agree_rate"] == 0.0
+    assert shadow["shadow_match_rate"] == 1.0
+
+
+def test_unpaired_faces_only_count_faces():
+    stats = ModelStats()
+    stats.record_agreement([_face([0, 0, 10, 10], np.ones(8))], [], "a", "b")
+    shadow = stats.to_dict()["shadow"]
+    assert shadow["face_count_agree_rate"] == 0.0 and shadow["decision_pairs"] == 0
+
+
+def test_registry_requires_name_and_switches_active():
+    registry = ModelRegistry(builder=lambda name: object())
+    with pytest.raises(ValueError):
+        registry.load(None)
+    registry.load("buffalo_l")
+    registry.load("buffalo_s")
+    assert registry.active == "buffalo_l"
+    registry.activate("buffalo_s")
+    assert registry.active == "buffalo_s"
+    with pytest.raises(KeyError):
+        registry.activate("antelopev2")
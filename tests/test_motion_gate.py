@@ -0,0 +1,125 @@
+import asyncio
+import types
+
+import numpy as np
+import pytest
+
+from face_process import motion_gate as motion_gate_module
+from face_process.motion_gate import MotionGate
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+class _Clock:
+    """可控时钟：monotonic 由测试推进，perf_counter 每次调用前进1毫秒"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.perf = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        self.perf += 0.001
+        return self.perf
+
+
+@pytest.fixture
+def clock(monkeypatch, set_config):
+    set_config("motion_gate.enabled", True)
+    set_config("motion_gate.hold_seconds", 2.0)
+    set_config("motion_gate.force_interval", 5.0)
+    set_config("motion_gate.sources", {})
+    clock = _Clock()
+    monkeypatch.setattr(motion_gate_module, "time", types.SimpleNamespace(
+        monotonic=clock.monotonic, perf_counter=clock.perf_counter
+    ))
+    return clock
+
+
+def _scene(box=None) -> np.ndarray:
+    """静止背景（固定噪声纹理），box 为归一化坐标的亮块（运动物体）"""
+    frame = np.random.default_rng(0).integers(40, 60, size=(240, 320, 3), dtype=np.uint8)
+    if box is not None:
+        x0, y0, x1, y1 = box
+        frame[int(y0 * 240):int(y1 * 240), int(x0 * 320):int(x1 * 320)] = 255
+    return frame
+
+
+def test_saved_ms_uses_measured_detect_time(clock):
+    gate = MotionGate()
+    static = _scene()
+    assert gate.check("cam", static)  # 首帧建立背景
+    with gate.measure("cam"):
+        clock.perf += 0.040  # 检测耗时约40毫秒
+    clock.now += 10
+    assert gate.check("cam", static)  # 超过 force_interval，强制检测
+    clock.now += 1
+    for _ in range(3):
+        assert not gate.check("cam", static)
+    stats = gate.stats()
+    source = stats["sources"]["cam"]
+    assert (stats["frames"], stats["skipped"]) == (5, 3)
+    assert source["detect_avg_ms"] == pytest.approx(41, abs=0.5)
+    assert stats["saved_ms"] == pytest.approx(3 * source["detect_avg_ms"] - stats["gate_ms"], abs=0.2)
+    # 未经过门控的视频源不计入
+    with gate.measure("other"):
+        pass
+    assert "other" not in gate.stats()["sources"]
+
+
+def test_hold_then_skip_then_force(clock):
+    """运动结束后 hold_seconds 内仍检测，之后静止帧跳过，每 force_interval 秒强制检测一次"""
+    gate = MotionGate()
+    static, moving = _scene(), _scene((0.3, 0.3, 0.6, 0.7))
+    assert gate.check("cam", static)
+    clock.now += 0.1
+    assert gate.check("cam", moving)  # 有运动
+    clock.now += 1.5
+    assert gate.check("cam", static)  # 运动结束后仍在 hold_seconds 内
+    clock.now += 2.5
+    assert not gate.check("cam", static)
+    clock.now += 1.0
+    assert not gate.check("cam", static)
+    clock.now += 2.0  # 距上次检测超过 force_interval
+    assert gate.check("cam", static)
+    assert not gate.check("cam", static)
+
+
+def test_motion_outside_roi_is_ignored(clock, set_config):
+    set_config("motion_gate.sources", {"door": {"roi": [[[0.0, 0.0], [0.5, 0.0], [0.5, 1.0], [0.0, 1.0]]]}})
+    gate = MotionGate()
+    static = _scene()
+    assert gate.check("door", static)
+    clock.now += 10
+    assert gate.check("door", static)  # 强制检测，之后进入静止
+    clock.now += 1
+    assert not gate.check("door", _scene((0.6, 0.2, 0.9, 0.8)))  # 运动在ROI右侧之外
+    clock.now += 0.1
+    assert gate.check("door", _scene((0.1, 0.2, 0.4, 0.8)))  # ROI内运动
+    # ROI变化时重建背景，本帧照常检测
+    set_config("motion_gate.sources", {"door": {"roi": [[[0.5, 0.0], [1.0, 0.0], [1.0, 1.0], [0.5, 1.0]]]}})
+    clock.now += 10
+    assert gate.check("door", static)
+
+
+def test_idle_skips_only_gated_sources(clock, set_config):
+    gate = MotionGate()
+    static = _scene()
+
+    def idle(source):
+        return asyncio.run(gate.idle(source, static))
+
+    assert not idle("cam")  # 首帧建立背景
+    clock.now += 3  # 超过 hold_seconds，未到 force_interval
+    assert idle("cam")
+    assert not idle(None)  # 未携带视频源不经过门控
+    set_config("motion_gate.enabled", False)
+    assert not idle("cam")
+    assert gate.stats()["sources"]["cam"]["frames"] == 2
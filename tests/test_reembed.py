@@ -0,0 +1,62 @@
+import asyncio
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("insightface")
+
+from core.gallery import Gallery
+from face_process import reembed
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+DIM = 8
+
+
+def _vec(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=DIM).astype(np.float32)
+
+
+class _Crops:
+    def get(self, identity_id, index):
+        return np.zeros((112, 112, 3), dtype=np.uint8), None
+
+
+def test_reembed_replaces_stale_and_skips_recreated(monkeypatch):
+    """迁移期间被删除后重新注册的身份不被旧的对齐人脸覆盖，其余旧版本特征全部替换"""
+    gallery = Gallery(dim=DIM)
+    gallery.enroll("alice", _vec(1), "v1")
+    gallery.enroll("alice", _vec(2), "v1")
+    gallery.enroll("bob", _vec(3), "v1")
+
+    async def embed_chips(chips, target):
+        # 提取期间 bob 被删除并用新模型重新注册
+        gallery.remove("bob")
+        gallery.enroll("bob", _vec(4), "v2")
+        return [_vec(10 + i) for i in range(len(chips))], None
+
+    registry = types.SimpleNamespace(active="v2", get=lambda name: object())
+    monkeypatch.setattr(reembed, "gallery", gallery)
+    monkeypatch.setattr(reembed, "store", None)
+    monkeypatch.setattr(reembed, "crop_store", _Crops())
+    monkeypatch.setattr(reembed, "registry", registry)
+    monkeypatch.setattr(reembed, "embed_chips_async", embed_chips)
+
+    async def run():
+        job = reembed.ReembedJob()
+        assert job.start("v2")
+        await job._task
+        return job.status()
+
+    status = asyncio.run(run())
+    assert status["state"] == "completed"
+    assert (status["total"], status["done"], status["failed"]) == (3, 2, 1)
+    assert gallery.version_counts() == {"v2": 3}
+    bob, = gallery.get("bob")
+    np.testing.assert_allclose(bob, _vec(4) / np.linalg.norm(_vec(4)), rtol=1e-6)
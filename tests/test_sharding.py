@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from core.sharding import ShardCoordinator, check_shards, owns, shard_of
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+def test_shard_of_is_stable_and_covers_all_shards():
+    ids = [f"user-{i}" for i in range(1000)]
+    first = [shard_of(i, 4) for i in ids]
+    assert first == [shard_of(i, 4) for i in ids]
+    assert set(first) == {0, 1, 2, 3}
+
+
+def test_owns_follows_environment(monkeypatch):
+    monkeypatch.setenv("FACE_SHARD_COUNT", "3")
+    for index in range(3):
+        monkeypatch.setenv("FACE_SHARD_INDEX", str(index))
+        assert owns("alice") == (shard_of("alice", 3) == index)
+    monkeypatch.setenv("FACE_SHARD_COUNT", "1")
+    assert owns("alice")
+
+
+def test_search_merges_top_k_and_marks_partial(monkeypatch):
+    """慢分片超时、异常分片报错时仍返回其余分片合并后的top-k，并标记 partial"""
+    monkeypatch.setenv("FACE_SHARD_NODES", "http://a,http://b,http://c")
+    monkeypatch.setenv("FACE_SHARD_COUNT", "3")
+    coordinator = ShardCoordinator()
+    calls = []
+
+    async def fake_post(node, path, payload, timeout, headers=None):
+        calls.append((node, headers))
+        if node == "http://a":
+            return 200, {"code": 200, "data": {"results": [
+                {"identity_id": "a1", "score": 0.9}, {"identity_id": "a2", "score": 0.4}
+            ]}}
+        if node == "http://b":
+            return 200, {"code": 200, "data": {"results": [{"identity_id": "b1", "score": 0.7}]}}
+        raise asyncio.TimeoutError()
+
+    monkeypatch.setattr(coordinator, "_post", fake_post)
+    data = asyncio.run(coordinator.search("x", top_k=2, headers={"X-API-Key": "k"}))
+    assert [r["identity_id"] for r in data["results"]] == ["a1", "b1"]
+    assert [r["shard"] for r in data["results"]] == [0, 1]
+    assert data["partial"]
+    assert [s["status"] for s in data["shards"]] == ["ok", "ok", "timeout"]
+    assert all(h == {"X-API-Key": "k"} for _, h in calls)
+
+
+def test_mismatched_topology_is_refused(monkeypatch):
+    """分片地址数量与分片总数不一致时，启动校验和转发都拒绝，不按两种分片数各算一套"""
+    monkeypatch.setenv("FACE_SHARD_NODES", "http://a,http://b,http://c")
+    monkeypatch.setenv("FACE_SHARD_COUNT", "2")
+    monkeypatch.setenv("FACE_SHARD_INDEX", "0")
+    with pytest.raises(ValueError):
+        check_shards()
+    with pytest.raises(ValueError):
+        asyncio.run(ShardCoordinator().route("alice", "DELETE", "/api/gallery/alice"))
+    monkeypatch.setenv("FACE_SHARD_COUNT", "3")
+    check_shards()
+    monkeypatch.setenv("FACE_SHARD_INDEX", "3")
+    with pytest.raises(ValueError):
+        check_shards()
+
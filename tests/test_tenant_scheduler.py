@@ -0,0 +1,161 @@
+import asyncio
+import collections
+
+import pytest
+
+from core.tenant_scheduler import TenantRejected, TenantScheduler, resolve_tenant
+
+"""
+______________________________
+  Author: wen_l
+   Time : 2024-11-01
+______________________________
+"""
+
+
+@pytest.fixture
+def quotas(set_config):
+    set_config("tenants.default", {"weight": 1, "max_concurrency": 4, "rate": 0, "burst": 0})
+    set_config("tenants.quotas", {
+        "heavy": {"weight": 3},
+        "light": {"weight": 1},
+        "capped": {"max_concurrency": 1},
+    })
+    set_config("tenants.max_queue", 100)
+    set_config("tenants.queue_timeout", 10)
+    return set_config
+
+
+def _run_backlog(scheduler, backlog: dict, grants: int) -> collections.Counter:
+    """单槽位下各租户同时排满请求，统计前 grants 次放行的租户分布"""
+    order = []
+
+    async def main():
+        async with scheduler.slot("warmup"):
+            tasks = [
+                asyncio.create_task(worker(tenant))
+                for tenant, count in backlog.items() for _ in range(count)
+            ]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    async def worker(tenant):
+        async with scheduler.slot(tenant):
+            order.append(tenant)
+            await asyncio.sleep(0)
+
+    asyncio.run(main())
+    return collections.Counter(order[:grants])
+
+
+def test_weighted_shares(quotas):
+    counts = _run_backlog(TenantScheduler(slots=1), {"heavy": 40, "light": 40}, grants=40)
+    assert counts["heavy"] == 30 and counts["light"] == 10
+
+
+def test_idle_tenant_does_not_bank_credit(quotas):
+    """长期空闲的租户回来后不能凭累积额度独占槽位"""
+    scheduler = TenantScheduler(slots=1)
+    _run_backlog(scheduler, {"heavy": 30}, grants=30)
+    counts = _run_backlog(scheduler, {"heavy": 20, "light": 20}, grants=20)
+    assert counts["light"] <= 6
+
+
+def test_max_concurrency_cap(quotas):
+    scheduler = TenantScheduler(slots=4)
+    peak = 0
+
+    async def worker():
+        nonlocal peak
+        async with scheduler.slot("capped"):
+            peak = max(peak, scheduler._tenants["capped"].active)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*[worker() for _ in range(5)])
+
+    asyncio.run(main())
+    assert peak == 1
+    assert scheduler.stats()["tenants"]["capped"]["completed"] == 5
+
+
+def test_queue_timeout(quotas):
+    quotas("tenants.queue_timeout", 0.05)
+    scheduler = TenantScheduler(slots=1)
+
+    async def main():
+        async with scheduler.slot("light"):
+            with pytest.raises(TenantRejected) as info:
+                await scheduler.acquire("heavy")
+            assert info.value.reason == "timeout"
+        # 超时请求已出队，槽位归还后调度器空闲
+        assert scheduler.busy == 0
+        async with scheduler.slot("heavy"):
+            pass
+
+    asyncio.run(main())
+    assert scheduler.stats()["tenants"]["heavy"]["rejected"] == {"timeout": 1}
+
+
+def test_queue_limit(quotas):
+    quotas("tenants.max_queue", 2)
+    scheduler = TenantScheduler(slots=1)
+
+    async def main():
+        async with scheduler.slot("light"):
+            waiters = [asyncio.create_task(scheduler.acquire("heavy")) for _ in range(2)]
+            await asyncio.sleep(0)
+            with pytest.raises(TenantRejected) as info:
+                await scheduler.acquire("heavy")
+            assert info.value.reason == "queue"
+        for task in waiters:
+            await task
+            scheduler.release("heavy", 0.0)
+
+    asyncio.run(main())
+
+
+def test_rate_limit(quotas):
+    quotas("tenants.quotas", {"limited": {"rate": 1, "burst": 2}})
+    scheduler = TenantScheduler(slots=4)
+
+    async def main():
+        for _ in range(2):
+            async with scheduler.slot("limited"):
+                pass
+        with pytest.raises(TenantRejected) as info:
+            await scheduler.acquire("limited")
+        assert info.value.reason == "rate"
+
+    asyncio.run(main())
+
+
+def test_run_retries_with_backoff(quotas):
+    """后台任务被拒绝时按退避重试：重试次数用完仍被拒绝则抛出，槽位空出后成功执行"""
+    quotas("tenants.max_queue", 0)
+    scheduler = TenantScheduler(slots=1)
+
+    async def infer(value):
+        return value * 2
+
+    async def main():
+        async with scheduler.slot("light"):
+            with pytest.raises(TenantRejected):
+                await scheduler.run("batch", infer, 1, retries=2, backoff=0.01)
+            assert scheduler.stats()["tenants"]["batch"]["rejected"] == {"queue": 3}
+            retry = asyncio.create_task(scheduler.run("batch", infer, 2, retries=5, backoff=0.02))
+            await asyncio.sleep(0.01)
+        return await retry
+
+    assert asyncio.run(main()) == 4
+
+
+def test_resolve_tenant(quotas):
+    quotas("tenants.keys", {"key-a": "java_service"})
+    assert resolve_tenant("key-a") == "java_service"
+    assert resolve_tenant("unknown") == "default"
+    quotas("tenants.require_key", True)
+    for key in (None, "unknown"):
+        with pytest.raises(TenantRejected) as info:
+            resolve_tenant(key)
+        assert info.value.reason == "unauthorized"